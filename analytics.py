@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+from array import array
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from autosave import Autosaver
+
+logger = logging.getLogger(__name__)
+
+# One file per day plus the app names, so a save only rewrites the days that changed
+ANALYTICS_DIR = 'analytics'
+APP_NAMES_FILE = 'app_names.json'
+
+# Bump when the saved layout changes
+ANALYTICS_VERSION = 1
+
+KEEP_DAYS = 400
+TERMS_PER_DAY = 50  # Matched terms kept per day, most frequent first
+DEFAULT_RANGE = 7  # Days
+TOP = 10
+SAVE_INTERVAL = 60
+
+
+def parse_range(value):
+    """'30d' or '4w' (or a bare number of days) to a number of days, or raise ValueError."""
+    value = str(value or '').strip().lower()
+    if not value:
+        return DEFAULT_RANGE
+    if value[-1] in 'dw':
+        days = int(value[:-1]) * (7 if value[-1] == 'w' else 1)
+    else:
+        days = int(value)
+    if not 1 <= days <= KEEP_DAYS:
+        raise ValueError(f"range must be between 1d and {KEEP_DAYS}d")
+    return days
+
+
+def hours_of(typecode):
+    return array(typecode, [0]) * 24
+
+
+class DayRollup:
+    """One day's totals: play seconds and blocks per hour for each (app, device), and matched terms."""
+
+    __slots__ = ('play', 'blocks', 'terms')
+
+    def __init__(self):
+        self.play = {}  # (app_id, device) -> 24 hourly seconds
+        self.blocks = {}  # (app_id, device) -> 24 hourly counts
+        self.terms = Counter()
+
+    def add_play(self, key, hour, seconds):
+        hours = self.play.get(key)
+        if hours is None:
+            hours = self.play[key] = hours_of('f')
+        hours[hour] += seconds
+
+    def add_block(self, key, hour, term):
+        hours = self.blocks.get(key)
+        if hours is None:
+            hours = self.blocks[key] = hours_of('I')
+        hours[hour] += 1
+        if term:
+            self.terms[term] += 1
+
+    def to_json(self):
+        return {
+            'play': [[app_id, device, [round(value, 1) for value in hours]]
+                     for (app_id, device), hours in self.play.items()],
+            'blocks': [[app_id, device, list(hours)]
+                       for (app_id, device), hours in self.blocks.items()],
+            'terms': dict(self.terms.most_common(TERMS_PER_DAY)),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        rollup = cls()
+        for app_id, device, hours in data.get('play', []):
+            rollup.play[app_id, device] = array('f', hours)
+        for app_id, device, hours in data.get('blocks', []):
+            rollup.blocks[app_id, device] = array('I', hours)
+        rollup.terms.update(data.get('terms', {}))
+        return rollup
+
+
+class Analytics:
+    """
+    Viewing statistics kept up to date as events happen.
+
+    Every stretch of playback and every block is added to a fixed-size
+    24-slot array for its day, app and device the moment it is published,
+    so /api/stats only sums a few arrays per day instead of scanning raw
+    events. Play time is spread over the hours it covered. Rollups are kept
+    for KEEP_DAYS, one file per day in the path directory; now and then and
+    on shutdown only the days that changed are written out.
+    """
+
+    def __init__(self, path=ANALYTICS_DIR, keep_days=KEEP_DAYS):
+        self.path = path
+        self.keep_days = keep_days
+        self.lock = threading.Lock()
+        self.days = {}  # 'YYYY-MM-DD' -> DayRollup
+        self.app_names = {}  # app_id -> display name last seen
+        self.dirty_days = set()  # Days changed since the last save
+        self.dropped = set()  # Days past keep_days whose files are still on disk
+        self.names_dirty = False
+        self.autosaver = Autosaver(self.save, 'analytics-saver')
+
+    def _day(self, day):
+        """The rollup for a date, creating it (and dropping the oldest) as needed. Call with the lock held."""
+        key = day.isoformat()
+        rollup = self.days.get(key)
+        if rollup is None:
+            rollup = self.days[key] = DayRollup()
+            self._prune()
+        return rollup
+
+    def _prune(self):
+        """Drop days older than keep_days. Call with the lock held."""
+        cutoff = (date.today() - timedelta(days=self.keep_days)).isoformat()
+        for old in [old for old in self.days if old < cutoff]:
+            del self.days[old]
+            self.dirty_days.discard(old)
+            self.dropped.add(old)
+
+    # Recording
+
+    def record(self, kind, data):
+        """Event bus listener: fold watched, detection and app events into the rollups."""
+        if kind == 'watched':
+            self.add_play(data.get('app_id'), data.get('device'), data['started'], data['seconds'])
+        elif kind == 'detection':
+            self.add_block(data.get('app_id'), data.get('device'), data['time'], data.get('term'))
+        elif kind == 'app' and data.get('app_id') and data.get('display_name'):
+            if self.app_names.get(data['app_id']) != data['display_name']:
+                self.app_names[data['app_id']] = data['display_name']
+                self.names_dirty = True
+
+    def add_play(self, app_id, device, started, seconds):
+        """Spread a stretch of playback over the hours it covered."""
+        moment = datetime.fromtimestamp(started)
+        end = moment + timedelta(seconds=max(0.0, seconds))
+        key = (app_id or '', device or '')
+        with self.lock:
+            while moment < end:
+                next_hour = moment.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+                until = min(end, next_hour)
+                self._day(moment.date()).add_play(key, moment.hour,
+                                                  (until - moment).total_seconds())
+                self.dirty_days.add(moment.date().isoformat())
+                moment = until
+
+    def add_block(self, app_id, device, when, term=None):
+        moment = datetime.fromtimestamp(when)
+        with self.lock:
+            self._day(moment.date()).add_block((app_id or '', device or ''), moment.hour, term)
+            self.dirty_days.add(moment.date().isoformat())
+
+    # Reading
+
+    def stats(self, days=DEFAULT_RANGE):
+        """Totals for the last days days (today included), by app, device, hour and day."""
+        today = date.today()
+        first = today - timedelta(days=days - 1)
+        by_app = {}
+        by_device = {}
+        by_hour = [[0.0, 0] for _ in range(24)]
+        by_day = []
+        terms = Counter()
+        with self.lock:
+            for offset in range(days):
+                day = (first + timedelta(days=offset)).isoformat()
+                rollup = self.days.get(day)
+                play = blocks = 0
+                if rollup is not None:
+                    for (app_id, device), hours in rollup.play.items():
+                        seconds = sum(hours)
+                        play += seconds
+                        by_app.setdefault(app_id, [0.0, 0])[0] += seconds
+                        by_device.setdefault(device, [0.0, 0])[0] += seconds
+                        for hour, value in enumerate(hours):
+                            by_hour[hour][0] += value
+                    for (app_id, device), hours in rollup.blocks.items():
+                        count = sum(hours)
+                        blocks += count
+                        by_app.setdefault(app_id, [0.0, 0])[1] += count
+                        by_device.setdefault(device, [0.0, 0])[1] += count
+                        for hour, value in enumerate(hours):
+                            by_hour[hour][1] += value
+                    terms.update(rollup.terms)
+                by_day.append({'day': day, 'play_minutes': round(play / 60, 1), 'blocks': blocks})
+            app_names = dict(self.app_names)
+
+        def ranked(totals, name):
+            rows = [{name: key, 'play_minutes': round(play / 60, 1), 'blocks': blocks}
+                    for key, (play, blocks) in totals.items()]
+            rows.sort(key=lambda row: (row['blocks'], row['play_minutes']), reverse=True)
+            return rows
+
+        apps = ranked(by_app, 'app_id')
+        for row in apps:
+            row['name'] = app_names.get(row['app_id'], row['app_id'] or 'Unknown')
+        return {
+            'range_days': days,
+            'since': first.isoformat(),
+            'play_minutes': round(sum(play for play, _ in by_hour) / 60, 1),
+            'blocks': sum(day['blocks'] for day in by_day),
+            'by_app': apps,
+            'by_device': ranked(by_device, 'device'),
+            'by_hour': [{'hour': hour, 'play_minutes': round(play / 60, 1), 'blocks': blocks}
+                        for hour, (play, blocks) in enumerate(by_hour)],
+            'by_day': by_day,
+            'top_terms': [{'term': term, 'count': count} for term, count in terms.most_common(TOP)],
+        }
+
+    # Persistence
+
+    def load(self):
+        """Read rollups saved by an earlier run."""
+        if self.path is None:
+            return
+        days, app_names = self._load_dir()
+        with self.lock:
+            # Anything recorded since startup goes on top
+            for day, rollup in self.days.items():
+                stored = days.setdefault(day, DayRollup())
+                for key, hours in rollup.play.items():
+                    for hour, value in enumerate(hours):
+                        stored.add_play(key, hour, value)
+                for key, hours in rollup.blocks.items():
+                    target = stored.blocks.setdefault(key, hours_of('I'))
+                    for hour, value in enumerate(hours):
+                        target[hour] += value
+                stored.terms.update(rollup.terms)
+            self.days = days
+            app_names.update(self.app_names)
+            self.app_names = app_names
+            self._prune()
+        logger.info(f"Loaded analytics for {len(days)} day(s)")
+
+    def _load_dir(self):
+        days = {}
+        app_names = {}
+        if not os.path.isdir(self.path):
+            return days, app_names
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.path, name), 'r') as f:
+                    data = json.load(f)
+                if data.get('version') != ANALYTICS_VERSION:
+                    logger.info(f"Ignoring analytics from another version in {name}")
+                elif name == APP_NAMES_FILE:
+                    app_names = dict(data.get('app_names', {}))
+                else:
+                    days[name[:-len('.json')]] = DayRollup.from_json(data.get('rollup', {}))
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logger.error(f"Error loading analytics from {name}: {e}")
+        return days, app_names
+
+    def save(self):
+        """Write out the days (and app names) that changed since the last save."""
+        if self.path is None:
+            return
+        with self.lock:
+            if not (self.dirty_days or self.dropped or self.names_dirty):
+                return
+            days = {day: self.days[day].to_json() for day in self.dirty_days}
+            dropped = self.dropped
+            app_names = dict(self.app_names) if self.names_dirty else None
+            self.dirty_days, self.dropped, self.names_dirty = set(), set(), False
+        written = set()
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            for day, rollup in days.items():
+                self._write(day + '.json', {'version': ANALYTICS_VERSION, 'rollup': rollup})
+                written.add(day)
+            if app_names is not None:
+                self._write(APP_NAMES_FILE, {'version': ANALYTICS_VERSION, 'app_names': app_names})
+                app_names = None
+            for day in list(dropped):
+                try:
+                    os.remove(os.path.join(self.path, day + '.json'))
+                except FileNotFoundError:
+                    pass
+                dropped.discard(day)
+        except Exception as e:
+            logger.error(f"Error saving analytics: {e}")
+            # Try again on the next save
+            with self.lock:
+                self.dirty_days.update(day for day in days if day not in written and day in self.days)
+                self.dropped.update(dropped)
+                self.names_dirty = self.names_dirty or app_names is not None
+
+    def _write(self, name, data):
+        path = os.path.join(self.path, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def start_autosave(self, interval=SAVE_INTERVAL):
+        if self.path is not None:
+            self.autosaver.start(interval)
+
+    def stop_autosave(self):
+        self.autosaver.stop()
+        self.save()
+
+
+rollups = Analytics()
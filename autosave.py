@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Autosaver:
+    """
+    Call save() from a background thread every interval seconds.
+
+    Used by the stores that keep their state in memory and write it out
+    only when something changed (the verdict cache, the metadata cache,
+    watch time and the rollups); their save() returns at once when nothing
+    is dirty, so an idle store costs one wakeup per interval.
+    """
+
+    def __init__(self, save, name):
+        self.save = save
+        self.name = name
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, interval):
+        """Start saving every interval seconds; does nothing if already running."""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(interval,), name=self.name,
+                                       daemon=True)
+        self.thread.start()
+
+    def _run(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Error in {self.name}: {e}")
+
+    def stop(self):
+        """Stop the thread, waiting for a save in progress; the caller saves one last time."""
+        thread, self.thread = self.thread, None
+        self.stop_event.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
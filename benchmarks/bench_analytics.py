@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark the viewing statistics with a year of synthetic rollups.
+
+Feeds watched, detection and app events through the same event bus listener
+the blocker uses, then times /api/stats-style reads and reports:
+
+- how long recording an event takes
+- latency of a 7, 30 and 365 day range
+- whether the totals match the events fed in, including play time that
+  crosses an hour boundary
+- whether the rollups survive a save and reload
+- how much a save writes once the year is on disk and one more event comes in
+
+Runs offline. Fails (exit status 1) if p95 latency is above the threshold, a
+save after one event rewrites more than that event's day, or a check does not
+hold:
+
+    python3 benchmarks/bench_analytics.py [--per-day 500] [--max-p95-ms 50]
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+
+DAY = 24 * 3600
+DEVICES = ['Living Room TV', 'Kitchen speaker', 'Bedroom TV']
+APPS = [('233637DE', 'YouTube'), ('CC32E753', 'Spotify'), ('B3419EF5', 'Netflix')]
+TERMS = ['minecraft', 'creeper', 'roblox', 'fortnite']
+
+
+def fill(rollups, per_day, days, now):
+    """Record per_day events a day for days days. Returns (events, play seconds, blocks)."""
+    random.seed(1)
+    for app_id, name in APPS:
+        rollups.record('app', {'app_id': app_id, 'display_name': name})
+    started = now - days * DAY
+    total = per_day * days
+    step = (days * DAY) / total
+    play = 0.0
+    blocks = 0
+    for index in range(total):
+        app_id, _ = random.choice(APPS)
+        data = {'time': started + index * step, 'device': random.choice(DEVICES), 'app_id': app_id}
+        if index % 2:
+            seconds = random.uniform(10, 1800)
+            play += seconds
+            rollups.record('watched', dict(data, started=data['time'], seconds=seconds))
+        else:
+            blocks += 1
+            term = random.choice(TERMS)
+            rollups.record('detection', dict(
+                data, reason=f"Minecraft (title: Some {term} video; matched '{term}')", term=term))
+    return total, play, blocks
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def check_hour_split(failures):
+    """Twenty minutes from 10:50 should land as 10 in hour 10 and 10 in hour 11."""
+    rollups = analytics.Analytics(path=None)
+    started = datetime.now().replace(hour=10, minute=50, second=0, microsecond=0)
+    rollups.add_play('233637DE', 'TV', started.timestamp(), 20 * 60)
+    hours = rollups.stats(1)['by_hour']
+    right = hours[10]['play_minutes'] == 10 and hours[11]['play_minutes'] == 10
+    print(f"hour split:            {'right' if right else 'WRONG'} "
+          f"({hours[10]['play_minutes']} + {hours[11]['play_minutes']} min)")
+    if not right:
+        failures.append("play time across an hour boundary split wrongly")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--per-day', type=int, default=500, help='Events a day')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--queries', type=int, default=50, help='Repetitions of each query')
+    parser.add_argument('--max-p95-ms', type=float, default=50.0,
+                        help='Fail if any query p95 is higher')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    failures = []
+    try:
+        path = os.path.join(tmp, 'analytics')
+        rollups = analytics.Analytics(path)
+        # Start of tomorrow, so the whole year falls inside a 366 day range
+        now = (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+               + timedelta(days=1)).timestamp() - 1
+        started = time.perf_counter()
+        total, play, blocks = fill(rollups, args.per_day, args.days, now)
+        elapsed = time.perf_counter() - started
+        print(f"events:                {total} over {args.days} days, "
+              f"{elapsed / total * 1e6:.1f} us each to record")
+
+        for days in (7, 30, args.days + 1):
+            samples = []
+            for _ in range(args.queries):
+                started = time.perf_counter()
+                stats = rollups.stats(days)
+                samples.append((time.perf_counter() - started) * 1000)
+            p95 = percentile(samples, 0.95)
+            print(f"{f'range {days}d:':22} p50 {percentile(samples, 0.5):.2f} ms, p95 {p95:.2f} ms")
+            if p95 > args.max_p95_ms:
+                failures.append(f"range {days}d p95 {p95:.2f} ms > {args.max_p95_ms} ms")
+
+        # The widest range covers every event fed in, less play running on past midnight tonight
+        right = stats['blocks'] == blocks and abs(stats['play_minutes'] - play / 60) < play / 60 * 1e-4
+        print(f"totals:                {stats['blocks']}/{blocks} blocks, "
+              f"{stats['play_minutes']:.0f}/{play / 60:.0f} minutes")
+        if not right:
+            failures.append("totals do not match the events recorded")
+        names = {row['name'] for row in stats['by_app']}
+        if names != {name for _, name in APPS}:
+            failures.append(f"apps named {sorted(names)}")
+        if {term['term'] for term in stats['top_terms']} != set(TERMS):
+            failures.append("matched terms missing from the top terms")
+
+        check_hour_split(failures)
+
+        started = time.perf_counter()
+        rollups.save()
+        saved = time.perf_counter() - started
+        reloaded = analytics.Analytics(path)
+        reloaded.load()
+        # Play time is saved to a tenth of a second per hour
+        after = reloaded.stats(args.days + 1)
+        same = (after['blocks'] == stats['blocks'] and after['top_terms'] == stats['top_terms']
+                and abs(after['play_minutes'] - stats['play_minutes']) < 1
+                and [row['app_id'] for row in after['by_app']]
+                == [row['app_id'] for row in stats['by_app']])
+        files = os.listdir(path)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in files)
+        print(f"restart:               rollups {'kept' if same else 'LOST'} "
+              f"({len(files)} files, {size / 1024:.0f} KiB, saved in {saved * 1000:.0f} ms)")
+        if not same:
+            failures.append("rollups changed over a save and reload")
+
+        # What the autosave does every minute while something plays
+        before = {name: os.stat(os.path.join(path, name)).st_ino for name in files}
+        reloaded.add_play('233637DE', 'TV', time.time(), 30)
+        started = time.perf_counter()
+        reloaded.save()
+        saved = time.perf_counter() - started
+        rewritten = [name for name in os.listdir(path)
+                     if before.get(name) != os.stat(os.path.join(path, name)).st_ino]
+        print(f"one more event:        {len(rewritten)} file(s) rewritten, saved in {saved * 1000:.1f} ms")
+        if len(rewritten) != 1:
+            failures.append(f"a save after one event rewrote {len(rewritten)} files")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
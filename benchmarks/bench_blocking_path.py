@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the blocking path in main.py.
+
+Drives the blocker against an in-process fake Chromecast and reports, per
+detection mode:
+
+- title change to mute latency (p50 / p95 / max) over flagged titles,
+  including obfuscated spellings, and how many were caught
+- false positives: clean titles that were muted anyway
+- CPU seconds per hour while replaying a scripted session of app and title
+  changes
+
+Runs offline. Pass thresholds to fail (exit status 1) on a regression:
+
+    python3 benchmarks/bench_blocking_path.py [--modes events poll] [--session 30]
+        [--max-p95-ms 2500] [--max-false-positives 0] [--min-detected 1.0]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import web_server  # noqa: E402
+from config_store import ConfigStore  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+FLAGGED_TITLES = [
+    'Minecraft survival episode 1',
+    'MINECRAFT Hardcore 100 days',
+    'M1n3cr4ft speedrun world record',
+    'm i n e c r a f t  building tips',
+    'Mine craft lets play part 4',
+    'Мinecraft but every block is random',  # Cyrillic M
+    'Creeper aw man (song)',
+    'Ender Dragon fight in 60 seconds',
+    'Minecarft castle tutorial',
+    'Enderman pranks compilation',
+]
+
+CLEAN_TITLES = [
+    'Peppa Pig full episodes',
+    'Bluey - the whole season',
+    'Lofi beats to study to',
+    'Cooking pasta at home',
+    'Mining the ocean floor documentary',
+    'Minecart ride at the fair',
+    'Crafting with paper for kids',
+    'Skeletal system explained',
+    'Dragon dance for Lunar New Year',
+    'The Creative Process with Rick Rubin',
+    'Mojave desert road trip',
+    'Stevie Wonder live in concert',
+    'How engines work',
+    'Tower defense strategy guide',
+    'Nature sounds: rain on a tent',
+]
+
+APPS = [
+    ('233637DE', 'YouTube'),
+    ('CA5E8412', 'Netflix'),
+    ('CC1AD845', 'Default Media Receiver'),
+]
+
+
+def start_monitor(monitor_function):
+    chromecast = FakeChromecast()
+    lifecycle.supervisor.start_monitoring(monitor_function, chromecast)
+    time.sleep(0.5)
+    return chromecast
+
+
+def stop_monitor():
+    lifecycle.supervisor.stop_monitoring()
+
+
+def reset(chromecast, mode):
+    chromecast.stop_media()
+    # The polling loop only re-reads the device's mute state every 5 seconds
+    time.sleep(6 if mode == 'poll' else 0.05)
+
+
+def measure_latency(chromecast, mode):
+    latencies = []
+    missed = []
+    for title in FLAGGED_TITLES:
+        # Land title changes at random points of the polling cycle
+        time.sleep(random.uniform(0, 2) if mode == 'poll' else 0.01)
+        changed_at = chromecast.play_title(title)
+        if chromecast.muted_event.wait(10):
+            latencies.append((chromecast.muted_at - changed_at) * 1000)
+        else:
+            missed.append(title)
+        reset(chromecast, mode)
+    return latencies, missed
+
+
+def measure_false_positives(chromecast, mode):
+    # Long enough for a full polling pass plus the pause before muting
+    window = 3.0 if mode == 'poll' else 1.0
+    muted = []
+    for title in CLEAN_TITLES:
+        chromecast.play_title(title)
+        if chromecast.muted_event.wait(window):
+            muted.append(title)
+            reset(chromecast, mode)
+    chromecast.stop_media()
+    return muted
+
+
+def measure_cpu(chromecast, session_seconds):
+    """Replay app switches and clean titles every few seconds; return CPU seconds per hour."""
+    steps = []
+    offset = 0.0
+    while offset < session_seconds:
+        app_id, display_name = random.choice(APPS)
+        steps.append((offset, 'launch_app', (app_id, display_name)))
+        steps.append((offset + 0.1, 'play_title', (random.choice(CLEAN_TITLES),)))
+        offset += random.uniform(2, 8)
+
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    script, _ = chromecast.play_script(steps)
+    script.join()
+    remaining = session_seconds - (time.monotonic() - wall_start)
+    if remaining > 0:
+        time.sleep(remaining)
+    wall = time.monotonic() - wall_start
+    return (time.process_time() - cpu_start) / wall * 3600
+
+
+def run_mode(mode, session_seconds):
+    monitor_function = {'poll': main.monitor_and_control_chromecast,
+                        'events': main.monitor_chromecast_events}[mode]
+    chromecast = start_monitor(monitor_function)
+    try:
+        latencies, missed = measure_latency(chromecast, mode)
+        false_positives = measure_false_positives(chromecast, mode)
+        cpu_per_hour = measure_cpu(chromecast, session_seconds)
+    finally:
+        stop_monitor()
+    return latencies, missed, false_positives, cpu_per_hour
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=['events', 'poll'],
+                        default=['events', 'poll'])
+    parser.add_argument('--session', type=float, default=30.0,
+                        help='Seconds of scripted activity to measure CPU over')
+    parser.add_argument('--max-p95-ms', type=float,
+                        help='Fail if p95 title-to-mute latency is higher')
+    parser.add_argument('--max-false-positives', type=int,
+                        help='Fail if more clean titles than this are muted')
+    parser.add_argument('--min-detected', type=float,
+                        help='Fail if a smaller fraction of flagged titles is muted')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    # Keep the benchmark's keywords out of the real config file
+    web_server.config = ConfigStore(None)
+    web_server.config.update(keywords=main.DEFAULT_MINECRAFT_KEYWORDS)
+
+    results = {}
+    for mode in args.modes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[mode] = run_mode(mode, args.session)
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'detected':>9} "
+          f"{'false +':>8} {'CPU s/h':>8}")
+    failures = []
+    for mode, (latencies, missed, false_positives, cpu_per_hour) in results.items():
+        p95 = percentile(latencies, 0.95)
+        detected = len(latencies) / len(FLAGGED_TITLES)
+        print(f"{mode:<8} {percentile(latencies, 0.5):>8.1f} {p95:>8.1f} "
+              f"{max(latencies, default=float('nan')):>8.1f} "
+              f"{len(latencies):>4}/{len(FLAGGED_TITLES):<4} "
+              f"{len(false_positives):>3}/{len(CLEAN_TITLES):<4} {cpu_per_hour:>8.2f}")
+        for title in missed:
+            print(f"  missed: {title}")
+        for title in false_positives:
+            print(f"  false positive: {title}")
+
+        if args.max_p95_ms is not None and not p95 <= args.max_p95_ms:
+            failures.append(f"{mode}: p95 {p95:.1f} ms > {args.max_p95_ms} ms")
+        if args.max_false_positives is not None and len(false_positives) > args.max_false_positives:
+            failures.append(f"{mode}: {len(false_positives)} false positives")
+        if args.min_detected is not None and detected < args.min_detected:
+            failures.append(f"{mode}: detected {detected:.0%} of flagged titles")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Measure `main.py classify` on a large generated corpus of titles.
+
+Writes --rows JSONL rows (about 10% of them flagged) and classifies them with
+one worker and with one per CPU, each run in a fresh process. Reports:
+
+- rows/s and the speed-up of the pool over a single process
+- peak RSS of the main process, for the full corpus and for a quarter of it
+- whether every run wrote the same verdicts
+
+Small samples of the CSV, watch-history.json and watch-history.html
+formats are checked for the titles and channels they should yield, a JSON
+lines sample with a broken line for the row it skips, and a set of rules
+with an allow rule for the rule that decides each row.
+
+Runs offline. Fails (exit status 1) if the runs disagree, the formats are
+misread, a row is decided by the wrong rule or peak RSS grows with the size
+of the input:
+
+    python3 benchmarks/bench_bulk_classify.py [--rows 400000] [--workers N]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bulk_classify  # noqa: E402
+import main  # noqa: E402
+import memory_profile  # noqa: E402
+import rule_engine  # noqa: E402
+
+FLAGGED = ['Minecraft hardcore day', 'Creeper compilation', 'The Ender Dragon fight', 'M1necraft build']
+HARMLESS = ['Peppa Pig episode', 'Lofi beats to study to', 'Bluey season', 'Cooking pasta at home',
+            'Premier League highlights', 'How volcanoes work', 'Relaxing rain sounds']
+CHANNELS = ['Kids TV', 'Cooking Corner', 'Gaming Den', 'Science Now']
+
+CSV_SAMPLE = 'title,channel\nMinecraft speedrun,Gaming Den\n"Bluey, the movie",Kids TV\n'
+JSON_SAMPLE = json.dumps([
+    {'header': 'YouTube', 'title': 'Watched Creeper facts', 'titleUrl': 'https://www.youtube.com/watch?v=a',
+     'subtitles': [{'name': 'Science Now'}], 'time': '2024-01-01T00:00:00Z'},
+    {'header': 'YouTube', 'title': 'Watched a video that has been removed', 'time': '2024-01-01T00:00:00Z'},
+])
+HTML_SAMPLE = (
+    '<html><body><div class="content-cell">Watched\xa0<a href="https://www.youtube.com/watch?v=a">'
+    'Creeper facts</a><br><a href="https://www.youtube.com/channel/x">Science Now</a><br>Jan 1</div>'
+    '<div class="content-cell">Watched\xa0<a href="https://www.youtube.com/watch?v=b">Bluey</a><br>'
+    'Jan 2</div></body></html>')
+JSONL_SAMPLE = ('{"title": "Minecraft speedrun"}\n{"title": "cut off\n'
+                '{"title": "Creeper facts", "channel": "Science Now"}\n')
+
+DEFAULT_RULES = rule_engine.default_rules(main.DEFAULT_MINECRAFT_KEYWORDS)
+# Science Now is trusted, and pausing beats blocking for speedruns
+CUSTOM_RULES = [
+    {'name': 'Trusted channel', 'field': 'channel', 'match': 'equals', 'value': 'Science Now',
+     'action': 'allow', 'priority': 10},
+    {'name': 'Speedruns', 'field': 'title', 'match': 'contains', 'value': 'speedrun',
+     'action': 'pause', 'priority': 5},
+] + DEFAULT_RULES
+
+
+def write_corpus(path, rows):
+    rng = random.Random(3)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            title = rng.choice(FLAGGED if rng.random() < 0.1 else HARMLESS)
+            f.write(json.dumps({'title': f'{title} {i}', 'channel': rng.choice(CHANNELS)}) + '\n')
+
+
+def child(path, output, workers):
+    """Classify in this process and print the summary with peak RSS."""
+    with open(output, 'w', encoding='utf-8') as f:
+        summary = bulk_classify.classify_file(path, f, DEFAULT_RULES, workers=workers)
+    summary['peak_kib'] = memory_profile.process_memory().get('VmHWM')
+    print(json.dumps(summary))
+
+
+def run(path, output, workers):
+    result = subprocess.run([sys.executable, __file__, '--child', path, output, str(workers)],
+                            capture_output=True, text=True, check=True)
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    with open(output, 'rb') as f:
+        summary['digest'] = hashlib.sha1(f.read()).hexdigest()
+    return summary
+
+
+def classify_sample(fmt, text, rules):
+    """Classify a sample in this process; returns (title, channel, verdict, rule) per row and the skipped count."""
+    bulk_classify.init_worker(rules)
+    records = bulk_classify.READERS[fmt](io.StringIO(text, newline=''))
+    got = []
+    skipped = 0
+    for batch in bulk_classify.read_batches(records, bulk_classify.DEFAULT_FIELDS):
+        lines, _, _, batch_skipped, _, _, _ = bulk_classify.classify_batch(batch)
+        skipped += batch_skipped
+        for line in lines.splitlines():
+            verdict = json.loads(line)
+            if 'skipped' not in verdict:
+                got.append((verdict.get('title'), verdict.get('channel'), verdict['verdict'],
+                            verdict['rule']))
+    return got, skipped
+
+
+def check_formats():
+    """Classify the small samples; returns a list of failures."""
+    failures = []
+    expected = {
+        'csv': (CSV_SAMPLE, DEFAULT_RULES, 0,
+                [('Minecraft speedrun', 'Gaming Den', 'block', 'Keywords'),
+                 ('Bluey, the movie', 'Kids TV', 'allow', None)]),
+        'json': (JSON_SAMPLE, DEFAULT_RULES, 0,
+                 [('Creeper facts', 'Science Now', 'block', 'Keywords'),
+                  ('a video that has been removed', None, 'allow', None)]),
+        'html': (HTML_SAMPLE, DEFAULT_RULES, 0,
+                 [('Creeper facts', 'Science Now', 'block', 'Keywords'),
+                  ('Bluey', None, 'allow', None)]),
+        'jsonl': (JSONL_SAMPLE, DEFAULT_RULES, 1,
+                  [('Minecraft speedrun', None, 'block', 'Keywords'),
+                   ('Creeper facts', 'Science Now', 'block', 'Keywords')]),
+        'rules': (JSONL_SAMPLE, CUSTOM_RULES, 1,
+                  [('Minecraft speedrun', None, 'pause', 'Speedruns'),
+                   ('Creeper facts', 'Science Now', 'allow', 'Trusted channel')]),
+    }
+    for name, (text, rules, skips, rows) in expected.items():
+        got, skipped = classify_sample('jsonl' if name == 'rules' else name, text, rules)
+        right = got == rows and skipped == skips
+        print(f"{name + ':':9} {len(got)} rows, {skipped} skipped, {'ok' if right else 'WRONG'}")
+        if not right:
+            failures.append(f"{name} sample gave {got} with {skipped} skipped")
+    return failures
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=400000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], int(args.child[2]))
+        return
+
+    failures = check_formats()
+    tmp = tempfile.mkdtemp()
+    try:
+        corpus = os.path.join(tmp, 'corpus.jsonl')
+        quarter = os.path.join(tmp, 'quarter.jsonl')
+        write_corpus(corpus, args.rows)
+        write_corpus(quarter, args.rows // 4)
+        output = os.path.join(tmp, 'verdicts.jsonl')
+
+        results = {}
+        for workers in dict.fromkeys((1, args.workers)):
+            summary = results[workers] = run(corpus, output, workers)
+            rate = summary['rows'] / summary['seconds']
+            print(f"{workers:2} worker(s): {summary['rows']} rows in {summary['seconds']:6.2f}s "
+                  f"({rate:8.0f} rows/s), {summary['blocked'] / summary['rows'] * 100:5.2f}% blocked, "
+                  f"peak RSS {summary['peak_kib'] / 1024:5.1f} MiB")
+        single, pooled = results[1], results[args.workers]
+        if args.workers > 1:
+            print(f"speed-up:  {single['seconds'] / pooled['seconds']:.2f}x with {args.workers} workers")
+        if len({summary['digest'] for summary in results.values()}) > 1:
+            failures.append("runs with different worker counts wrote different verdicts")
+
+        small = run(quarter, output, args.workers)
+        print(f"quarter:   peak RSS {small['peak_kib'] / 1024:5.1f} MiB for {small['rows']} rows")
+        growth = (pooled['peak_kib'] - small['peak_kib']) / 1024
+        if growth > 20:
+            failures.append(f"peak RSS grew by {growth:.1f} MiB with four times the input")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
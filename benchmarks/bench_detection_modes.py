@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the polling monitor with the event-driven monitor.
+
+Runs both modes against an in-process fake Chromecast and reports the time
+from a title change arriving to the mute command, plus CPU used while idle.
+
+    python3 benchmarks/bench_detection_modes.py [--trials 5] [--idle 20]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import web_server  # noqa: E402
+from config_store import ConfigStore  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+
+def run_mode(monitor_function, trials, idle_seconds):
+    # Keep the benchmark's keywords out of the real config file
+    web_server.config = ConfigStore(None)
+    web_server.config.update(keywords=main.DEFAULT_MINECRAFT_KEYWORDS)
+    chromecast = FakeChromecast()
+    lifecycle.supervisor.start_monitoring(monitor_function, chromecast)
+    time.sleep(0.5)
+
+    # Idle: nothing changes on the device
+    cpu_start = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = (time.process_time() - cpu_start) / idle_seconds * 100
+
+    latencies = []
+    for i in range(trials):
+        # Land title changes at random points of the polling cycle
+        time.sleep(random.uniform(0, 2))
+        changed_at = chromecast.play_title(f'Minecraft survival episode {i}')
+        if chromecast.muted_event.wait(10):
+            latencies.append((chromecast.muted_at - changed_at) * 1000)
+        # Let the title go away and give the polling loop time to resync
+        # its mute state (it only re-reads the volume every 5 seconds)
+        chromecast.stop_media()
+        time.sleep(6)
+
+    lifecycle.supervisor.stop_monitoring()
+    return latencies, idle_cpu
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--idle', type=float, default=20.0,
+                        help='Seconds of idle time to measure CPU over')
+    args = parser.parse_args()
+
+    results = {}
+    for name, function in (('poll', main.monitor_and_control_chromecast),
+                           ('events', main.monitor_chromecast_events)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = run_mode(function, args.trials, args.idle)
+
+    print(f"{'mode':<8} {'mean ms':>9} {'max ms':>9} {'idle CPU %':>11}")
+    for name, (latencies, idle_cpu) in results.items():
+        mean = statistics.mean(latencies) if latencies else float('nan')
+        worst = max(latencies) if latencies else float('nan')
+        print(f"{name:<8} {mean:>9.1f} {worst:>9.1f} {idle_cpu:>11.3f}")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Run the device supervisor against a simulated fleet of cast devices.
+
+Attaches N fake devices whose titles change on a schedule, then reports
+aggregate and per-device CPU, memory and thread counts, and how long it took
+from a flagged title arriving to the mute.
+
+    python3 benchmarks/bench_device_fleet.py [--devices 1 10 30 60] [--seconds 10]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import rule_engine  # noqa: E402
+from device_supervisor import DeviceSupervisor  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+TITLES = [
+    'Minecraft hardcore day 100', 'Peppa Pig full episodes', 'Lofi beats to study to',
+    'Creeper compilation', 'Bluey - the whole season', 'Cooking pasta at home',
+]
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_fleet(count, seconds):
+    keywords = list(main.DEFAULT_MINECRAFT_KEYWORDS)
+    table = rule_engine.DecisionTable(rule_engine.default_rules(keywords))
+    supervisor = DeviceSupervisor(main.EventDrivenMonitor, lambda: table)
+    lifecycle.supervisor.start_monitoring(supervisor.run)
+
+    threads_before = threading.active_count()
+    rss_before = rss_kb()
+    devices = [FakeChromecast(f'Device {i}') for i in range(count)]
+    for device in devices:
+        supervisor.attach(device)
+
+    rng = random.Random(count)
+    latencies = []
+    cpu_start = time.process_time()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        # About one title change per device every two seconds
+        for device in rng.sample(devices, max(1, count // 20)):
+            title = rng.choice(TITLES)
+            device.stop_media()
+            changed_at = device.play_title(title)
+            if table.decide({'title': title})[0] == 'block' and device.muted_event.wait(2):
+                latencies.append((device.muted_at - changed_at) * 1000)
+        time.sleep(0.1)
+    cpu = time.process_time() - cpu_start
+
+    result = {
+        'devices': count,
+        'cpu_percent': cpu / seconds * 100,
+        'rss_kb': rss_kb() - rss_before,
+        'threads': threading.active_count() - threads_before,
+        'latency_ms': statistics.median(latencies) if latencies else float('nan'),
+    }
+    supervisor.shutdown()
+    lifecycle.supervisor.stop_monitoring()
+    return result
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 10, 30, 60])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+    logging.getLogger('device_supervisor').setLevel(logging.WARNING)
+
+    print(f"{'devices':>8} {'CPU %':>7} {'CPU %/dev':>10} {'RSS +KB':>8} {'KB/dev':>7} "
+          f"{'threads +':>10} {'mute p50 ms':>12}")
+    for count in args.devices:
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = run_fleet(count, args.seconds)
+        print(f"{r['devices']:>8} {r['cpu_percent']:>7.2f} {r['cpu_percent'] / count:>10.3f} "
+              f"{r['rss_kb']:>8} {r['rss_kb'] / count:>7.1f} {r['threads']:>10} {r['latency_ms']:>12.1f}")
+    print("Real devices also run one pychromecast socket thread each, which is not simulated here.")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark YouTube metadata lookups against a local stand-in endpoint.
+
+Starts an HTTP server on localhost that answers like a metadata endpoint
+(with a configurable delay), points the enricher at it, and reports:
+
+- status-to-verdict latency for untitled YouTube videos, which are held
+  until their metadata arrives instead of being blocked outright
+- how many untitled videos were blocked / let through correctly, by the
+  event monitor and by the polling loop (which looks up in the background
+  and decides on its next pass)
+- coalescing: how many requests reached the server for a burst of lookups
+  of the same video, and the most it ever saw at once
+- how many TCP connections the keep-alive session opened
+
+Runs offline. Fails (exit status 1) if p95 latency exceeds the 2-second
+polling interval or any check does not hold:
+
+    python3 benchmarks/bench_enrichment.py [--delay-ms 150] [--max-p95-ms 2000]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import enrichment  # noqa: E402
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import web_server  # noqa: E402
+from config_store import ConfigStore  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+# video ID -> (title, channel, tags); all played without a title
+VIDEOS = {
+    'mcSurvival1': ('Survival episode 1', 'Minecraft Daily', ['minecraft', 'survival']),
+    'creeperSong': ('Aw man (official video)', 'Block Tunes', ['creeper', 'song']),
+    'hardcore100': ('100 days hardcore', 'Cube Builders', ['minecraft', 'hardcore']),
+    'blueyEp0001': ('Bluey - Keepy Uppy', 'Bluey', ['kids', 'cartoon']),
+    'pastaNight1': ('Weeknight pasta', 'Home Cooking', ['food', 'recipe']),
+    'lofiBeats01': ('Beats to study to', 'Lofi Girl', ['music', 'study']),
+}
+FLAGGED = {'mcSurvival1', 'creeperSong', 'hardcore100'}
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay):
+        super().__init__(('127.0.0.1', 0), MetadataHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+        self.connections = set()
+
+
+class MetadataHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.connections.add(self.client_address)
+        try:
+            time.sleep(server.delay)
+            video = self.path.rsplit('/', 1)[-1]
+            if video in VIDEOS:
+                title, channel, tags = VIDEOS[video]
+                body = json.dumps({'title': title, 'channel': channel, 'tags': tags,
+                                   'category': 'Gaming' if video in FLAGGED else 'Entertainment'})
+                self.send_response(200)
+            else:
+                body = '{}'
+                self.send_response(404)
+            data = body.encode()
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure_untitled(chromecast, timeout=3):
+    """Play each video without a title; return (latencies ms, wrong verdicts)."""
+    latencies = []
+    wrong = []
+    for video in VIDEOS:
+        changed_at = chromecast.play_video(video)
+        muted = chromecast.muted_event.wait(timeout)
+        if muted:
+            latencies.append((chromecast.muted_at - changed_at) * 1000)
+        if muted != (video in FLAGGED):
+            wrong.append(video)
+        chromecast.stop_media()
+        time.sleep(0.05)
+    return latencies, wrong
+
+
+def measure_coalescing(enricher, server, burst):
+    """Look up one uncached video from many threads at once."""
+    before = server.requests
+    video = 'lofiBeats01'
+    with enricher.lock:
+        enricher.entries.pop(video, None)
+    threads = [threading.Thread(target=enricher.lookup, args=(video,)) for _ in range(burst)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return server.requests - before
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--delay-ms', type=float, default=150.0,
+                        help='How long the stand-in endpoint takes to answer')
+    parser.add_argument('--burst', type=int, default=20,
+                        help='Concurrent lookups of one video for the coalescing check')
+    parser.add_argument('--max-p95-ms', type=float, default=2000.0,
+                        help='Fail if p95 status-to-mute latency is higher')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    server = StandInServer(args.delay_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    enrichment.enricher = enrichment.MetadataEnricher(
+        endpoint=f'http://127.0.0.1:{server.server_port}/videos/{{video_id}}', path=None)
+    # Keep the benchmark's rules out of the real config file
+    web_server.config = ConfigStore(None)
+    web_server.config.update(keywords=main.DEFAULT_MINECRAFT_KEYWORDS)
+
+    chromecast = FakeChromecast()
+    chromecast.launch_app('233637DE', 'YouTube')
+    with contextlib.redirect_stdout(io.StringIO()):
+        lifecycle.supervisor.start_monitoring(main.monitor_chromecast_events, chromecast)
+        time.sleep(0.5)
+        latencies, wrong = measure_untitled(chromecast)
+        requests_for_burst = measure_coalescing(enrichment.enricher, server, args.burst)
+        lifecycle.supervisor.stop_monitoring()
+
+        # The polling loop, with nothing cached yet
+        enrichment.enricher.entries.clear()
+        lifecycle.supervisor.start_monitoring(main.monitor_and_control_chromecast, chromecast)
+        time.sleep(0.5)
+        poll_latencies, poll_wrong = measure_untitled(chromecast, timeout=5)
+        lifecycle.supervisor.stop_monitoring()
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))] if latencies else 0
+    print(f"untitled videos:       {len(VIDEOS) - len(wrong)}/{len(VIDEOS)} judged correctly")
+    print(f"status-to-mute:        p50 {latencies[len(latencies) // 2] if latencies else 0:.1f} ms, "
+          f"p95 {p95:.1f} ms (endpoint delay {args.delay_ms:.0f} ms)")
+    print(f"polling loop:          {len(VIDEOS) - len(poll_wrong)}/{len(VIDEOS)} judged correctly, "
+          f"max {max(poll_latencies, default=0):.0f} ms")
+    print(f"coalescing:            {args.burst} lookups -> {requests_for_burst} request(s)")
+    print(f"server requests:       {server.requests}, at most {server.peak} at once")
+    print(f"TCP connections:       {len(server.connections)}")
+
+    failures = []
+    for video in wrong:
+        failures.append(f"{video} was {'not ' if video in FLAGGED else ''}blocked")
+    for video in poll_wrong:
+        failures.append(f"{video} was {'not ' if video in FLAGGED else ''}blocked by the polling loop")
+    if p95 > args.max_p95_ms:
+        failures.append(f"p95 {p95:.1f} ms > {args.max_p95_ms} ms")
+    if requests_for_burst != 1:
+        failures.append(f"{requests_for_burst} requests for one video")
+    if server.peak > enrichment.MAX_WORKERS:
+        failures.append(f"{server.peak} requests in flight at once")
+    if len(server.connections) > enrichment.MAX_WORKERS:
+        failures.append(f"{len(server.connections)} connections opened")
+
+    server.shutdown()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
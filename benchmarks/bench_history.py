@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark the detection history with a year of synthetic events.
+
+Fills a temporary database through the same record/flush path the blocker
+uses, then times /api/history-style queries and reports:
+
+- transactions and bytes on disk per event written
+- latency of the newest page, a page a year back (by cursor and by time
+  range), a one-week range and a kind filter
+- whether walking a range page by page returns every event exactly once,
+  including events still waiting in memory
+
+Runs offline. Fails (exit status 1) if p95 query latency is above the
+threshold or a check does not hold:
+
+    python3 benchmarks/bench_history.py [--per-day 500] [--max-p95-ms 50]
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history  # noqa: E402
+
+DAY = 24 * 3600
+DEVICES = ['Living Room TV', 'Kitchen speaker', 'Bedroom TV']
+TITLES = ['Minecraft survival', 'Weeknight pasta', 'Bluey', 'Lofi beats', 'Creeper song']
+
+
+def fill(store, per_day, days, now):
+    """Record per_day events a day for days days, flushing as the writer would."""
+    random.seed(1)
+    started = now - days * DAY
+    total = per_day * days
+    step = (days * DAY) / total
+    for index in range(total):
+        kind = random.choice(history.KINDS)
+        store.record(kind, {
+            'time': started + index * step,
+            'device': random.choice(DEVICES),
+            'app_id': '233637DE',
+            'title': random.choice(TITLES),
+            'action': 'block' if kind == 'detection' else None,
+            'reason': 'Keywords' if kind in ('detection', 'mute') else None,
+            'muted': True if kind == 'mute' else None,
+        })
+        if len(store.pending) >= store.flush_size:
+            store.flush()
+    store.flush()
+    return total
+
+
+def timed(samples, function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    samples.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--per-day', type=int, default=500, help='Events a day')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--queries', type=int, default=50, help='Repetitions of each query')
+    parser.add_argument('--max-p95-ms', type=float, default=50.0,
+                        help='Fail if any query p95 is higher')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    failures = []
+    try:
+        store = history.HistoryStore(os.path.join(tmp, 'history.db'),
+                                     retention=(args.days + 30) * DAY)
+        store.open()
+        now = time.time()
+        started = time.perf_counter()
+        total = fill(store, args.per_day, args.days, now)
+        fill_seconds = time.perf_counter() - started
+        on_disk = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+        print(f"events:                {total} over {args.days} days, written in "
+              f"{fill_seconds:.1f} s")
+        print(f"writes:                {store.flushes} transactions "
+              f"({total / max(1, store.flushes):.0f} events each), "
+              f"{on_disk / total:.0f} bytes on disk per event")
+
+        # A few events still in memory, as between flushes
+        for offset in range(5):
+            store.record('mute', {'time': now + offset, 'device': DEVICES[0], 'muted': True})
+
+        results = {}
+        samples = []
+        for _ in range(args.queries):
+            events, cursor = timed(samples, store.query)
+        results['newest page'] = samples
+        if events[0]['time'] < now:
+            failures.append("newest page missed events still in memory")
+
+        year_ago = now - (args.days - 1) * DAY
+        samples = []
+        cursor = f'{year_ago!r}:{2 ** 62}'
+        for _ in range(args.queries):
+            timed(samples, store.query, cursor=cursor)
+        results['page a year back'] = samples
+
+        samples = []
+        for _ in range(args.queries):
+            timed(samples, store.query, until=year_ago)
+        results['until a year ago'] = samples
+
+        samples = []
+        week_start = now - 200 * DAY
+        for _ in range(args.queries):
+            timed(samples, store.query, since=week_start, until=week_start + 7 * DAY)
+        results['one week'] = samples
+
+        samples = []
+        for _ in range(args.queries):
+            timed(samples, store.query, kinds=['detection'], device=DEVICES[1])
+        results['kind and device'] = samples
+
+        for name, samples in results.items():
+            p95 = percentile(samples, 0.95)
+            print(f"{name + ':':22} p50 {percentile(samples, 0.5):.2f} ms, p95 {p95:.2f} ms")
+            if p95 > args.max_p95_ms:
+                failures.append(f"{name} p95 {p95:.2f} ms > {args.max_p95_ms} ms")
+
+        # Walk the last two days page by page, across the memory/disk boundary
+        since = now - 2 * DAY
+        expected = store._reader().execute('SELECT COUNT(*) FROM events WHERE time >= ?',
+                                           (since,)).fetchone()[0] + 5
+        seen = []
+        cursor = None
+        while True:
+            events, cursor = store.query(since=since, cursor=cursor, limit=250)
+            seen.extend(event['id'] for event in events)
+            if cursor is None:
+                break
+        complete = len(seen) == expected and len(set(seen)) == len(seen)
+        print(f"pagination:            {len(seen)}/{expected} events over two days, "
+              f"{'no' if len(set(seen)) == len(seen) else 'with'} duplicates")
+        if not complete:
+            failures.append("paging through a range did not return every event once")
+        store.stop()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
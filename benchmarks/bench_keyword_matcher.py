@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare the title matcher rules use with the original substring scan.
+
+Both columns measure the same TitleMatcher: the time to build it and the
+time per title to search with it. The matcher normalizes every title and
+looks its words up for typos, which the original scan never did, so with a
+handful of keywords it costs a few times more per title (tens of
+microseconds); it pulls ahead once the list grows.
+
+    python3 benchmarks/bench_keyword_matcher.py
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import TitleMatcher  # noqa: E402
+
+TITLES = [
+    "Minecraft Survival Let's Play Episode 42 - Building a Castle",
+    "Top 10 Goals of the Season | Premier League Highlights",
+    "Lofi hip hop radio - beats to relax/study to",
+    "How to make sourdough bread at home (beginner friendly)",
+    "Peppa Pig Full Episodes | Muddy Puddles and more",
+    "Speedrunning the Ender Dragon in under 10 minutes",
+    "Relaxing rain sounds for sleeping - 10 hours",
+    "Science for kids: Why is the sky blue?",
+]
+
+
+def legacy_match(text, keywords):
+    """The original is_minecraft_related check."""
+    text = text.lower()
+    return any(keyword in text for keyword in keywords)
+
+
+def make_keywords(count, rng):
+    keywords = ['minecraft', 'creeper', 'ender dragon']
+    while len(keywords) < count:
+        length = rng.randint(4, 12)
+        keywords.append(''.join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    return keywords[:count]
+
+
+def per_call_us(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for title in TITLES:
+            function(title)
+    return (time.perf_counter() - start) / (repeat * len(TITLES)) * 1e6
+
+
+def main():
+    rng = random.Random(1)
+    print(f"{'keywords':>9} {'compile ms':>11} {'legacy us':>10} {'matcher us':>11} {'speedup':>8}")
+    for count in (10, 1000, 50000):
+        keywords = make_keywords(count, rng)
+
+        start = time.perf_counter()
+        matcher = TitleMatcher(keywords)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        repeat = max(1, 20000 // count)
+        legacy = per_call_us(lambda title: legacy_match(title, keywords), repeat)
+        compiled = per_call_us(lambda title: matcher.search(title) is not None, repeat * 10)
+        assert all(legacy_match(t, keywords) == (matcher.search(t) is not None) for t in TITLES)
+
+        print(f"{count:>9} {compile_ms:>11.1f} {legacy:>10.1f} {compiled:>11.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
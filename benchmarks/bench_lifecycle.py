@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Measure how quickly monitoring starts and stops, and how quickly the blocker exits.
+
+For the event monitor, the polling loop and the device supervisor with a
+small fleet, monitoring is started and stopped repeatedly through the
+lifecycle supervisor, as the web interface's Start and Stop buttons do. The
+device is muted before every stop, so stopping includes unmuting it. Reports
+p50/max of:
+
+- start: from start_monitoring() to the mute of a flagged title played 50 ms later
+- stop: how long stop_monitoring() takes to return
+
+and any thread of ours still alive afterwards. Then `main.py --web` is
+started in a temporary directory and sent SIGTERM; the time to exit and the
+exit status are reported.
+
+Runs offline. Fails (exit status 1) if a stop takes longer than the
+threshold, a thread is left behind or the blocker does not exit cleanly:
+
+    python3 benchmarks/bench_lifecycle.py [--cycles 10] [--max-stop-ms 500]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import web_server  # noqa: E402
+from config_store import ConfigStore  # noqa: E402
+from device_supervisor import DeviceSupervisor  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def cycle(make_target, devices, cycles):
+    """Start and stop monitoring cycles times; returns (start ms, stop ms, leftover threads)."""
+    before = set(threading.enumerate())
+    starts = []
+    stops = []
+    for i in range(cycles):
+        for device in devices:
+            device.stop_media()
+            device.set_volume_muted(False)
+            device.muted_event.clear()
+        started = time.perf_counter()
+        lifecycle.supervisor.start_monitoring(*make_target())
+        time.sleep(0.05)
+        devices[0].play_title(f'Minecraft survival episode {i}')
+        if devices[0].muted_event.wait(5):
+            starts.append((devices[0].muted_at - started) * 1000)
+        started = time.perf_counter()
+        lifecycle.supervisor.stop_monitoring()
+        stops.append((time.perf_counter() - started) * 1000)
+    # Pool workers of a supervisor that is still attached are not leftovers
+    leftover = [thread.name for thread in set(threading.enumerate()) - before
+                if not thread.name.startswith(('cast-io', 'timer', 'fake-cast'))]
+    return starts, stops, leftover
+
+
+def web_exit(timeout=20):
+    """Start main.py --web, wait for it to answer, send SIGTERM; returns (seconds to exit, status)."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    tmp = tempfile.mkdtemp()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--web',
+                                '--port', str(port)],
+                               cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/status', timeout=1) as r:
+                    json.load(r)
+                break
+            except OSError:
+                time.sleep(0.05)
+        # An open event stream has to end too
+        stream = urllib.request.urlopen(f'http://127.0.0.1:{port}/api/events', timeout=5)
+        started = time.monotonic()
+        process.send_signal(signal.SIGTERM)
+        try:
+            status = process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return None, None
+        stream.close()
+        return time.monotonic() - started, status
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--devices', type=int, default=5, help='Fleet size for the device supervisor')
+    parser.add_argument('--max-stop-ms', type=float, default=500.0,
+                        help='Fail if stopping monitoring takes longer than this')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    # Keep the benchmark's keywords out of the real config file
+    web_server.config = ConfigStore(None)
+    web_server.config.update(keywords=main.DEFAULT_MINECRAFT_KEYWORDS)
+    rules = main.get_rules_function()
+
+    single = [FakeChromecast()]
+    fleet = [FakeChromecast(f'Device {i}') for i in range(args.devices)]
+    supervisor = DeviceSupervisor(main.EventDrivenMonitor, rules)
+    cases = [
+        ('events', lambda: (main.monitor_chromecast_events, single[0]), single),
+        ('poll', lambda: (main.monitor_and_control_chromecast, single[0]), single),
+        (f'{args.devices} devices', lambda: (supervisor.run,), fleet),
+    ]
+
+    failures = []
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for device in fleet:
+            supervisor.attach(device)
+    for name, make_target, devices in cases:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            starts, stops, leftover = cycle(make_target, devices, args.cycles)
+        print(f"{name + ':':12} start-to-mute p50 {percentile(starts, 0.5) if starts else float('nan'):6.1f} ms, "
+              f"stop p50 {percentile(stops, 0.5):6.1f} ms, max {max(stops):6.1f} ms, "
+              f"{len(starts)}/{args.cycles} muted, {len(leftover)} thread(s) left")
+        if max(stops) > args.max_stop_ms:
+            failures.append(f"{name} stop took {max(stops):.0f} ms > {args.max_stop_ms:.0f}")
+        if len(starts) < args.cycles:
+            failures.append(f"{name} muted {len(starts)}/{args.cycles} times")
+        if leftover:
+            failures.append(f"{name} left threads behind: {', '.join(sorted(leftover))}")
+    supervisor.shutdown()
+
+    seconds, status = web_exit()
+    if seconds is None:
+        failures.append("main.py --web did not exit after SIGTERM")
+    else:
+        print(f"{'--web exit:':12} {seconds * 1000:6.0f} ms after SIGTERM, exit status {status}")
+        if status != 0:
+            failures.append(f"main.py --web exited with status {status}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
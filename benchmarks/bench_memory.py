@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Track steady-state memory with and without the low-memory profile.
+
+Each profile runs in its own fresh process, both at once: a fleet of fake devices under the
+device supervisor plays an endless stream of new titles, so every cache
+and buffer fills up to its bound, with history and analytics listening on
+the event bus as in the blocker. After a warm-up, RSS is sampled every
+second and the report gives:
+
+- RSS at the end of the warm-up and at the end of the run
+- growth over the measured stretch (median of its last third against its
+  first third), which should be close to zero once every bound is reached
+- threads and fill levels of the bounded buffers
+
+Runs offline. Fails (exit status 1) if RSS keeps growing by more than the
+threshold in either profile:
+
+    python3 benchmarks/bench_memory.py [--devices 10] [--warmup 150] [--seconds 60] [--max-growth-kb 1024]
+
+The warm-up is long because SQLite's page cache for the history keeps
+growing towards its bound for a couple of minutes at this event rate.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TITLES = ['Minecraft hardcore day', 'Peppa Pig episode', 'Lofi beats to study to',
+          'Creeper compilation', 'Bluey season', 'Cooking pasta at home']
+
+
+def run_profile(args):
+    """Child process: run the fleet and print one JSON line of results."""
+    logging.disable(logging.WARNING)
+    import analytics
+    import event_bus
+    import history
+    import lifecycle
+    import main
+    import memory_profile
+    import rule_engine
+    import web_server  # noqa: F401  Loaded in the blocker too
+    from device_supervisor import DeviceSupervisor
+    from fake_chromecast import FakeChromecast
+
+    if args.profile == 'low-memory':
+        memory_profile.apply_low_memory()
+        workers = memory_profile.LOW_MEMORY['device_workers']
+    else:
+        workers = main.DEVICE_WORKERS
+    tmp = tempfile.mkdtemp()
+    try:
+        history.store.path = os.path.join(tmp, 'history.db')
+        analytics.rollups.path = None
+        event_bus.bus.add_listener(history.store.record)
+        event_bus.bus.add_listener(analytics.rollups.record)
+        history.store.start()
+        if memory_profile.low_memory:
+            memory_profile.settle()
+
+        table = rule_engine.DecisionTable(rule_engine.default_rules(list(main.DEFAULT_MINECRAFT_KEYWORDS)))
+        supervisor = DeviceSupervisor(main.EventDrivenMonitor, lambda: table, max_workers=workers)
+        lifecycle.supervisor.start_monitoring(supervisor.run)
+        devices = [FakeChromecast(f'Device {i}') for i in range(args.devices)]
+        # The monitors print every title; keeping that output would be a leak of our own
+        quiet = open(os.devnull, 'w')
+        with contextlib.redirect_stdout(quiet):
+            for device in devices:
+                supervisor.attach(device)
+
+        rng = random.Random(1)
+        serial = 0
+        samples = []
+        started = time.monotonic()
+        warmed_up = started + args.warmup
+        deadline = warmed_up + args.seconds
+        next_sample = warmed_up
+        with contextlib.redirect_stdout(quiet):
+            while time.monotonic() < deadline:
+                for device in rng.sample(devices, max(1, len(devices) // 2)):
+                    serial += 1
+                    device.stop_media()
+                    # Always a title never seen before, so the caches keep filling
+                    device.play_title(f'{rng.choice(TITLES)} {serial}')
+                now = time.monotonic()
+                if now >= next_sample:
+                    samples.append(memory_profile.process_memory()['VmRSS'])
+                    next_sample += 1
+                time.sleep(0.05)
+        third = max(1, len(samples) // 3)
+        report = memory_profile.report()
+        print(json.dumps({
+            'profile': args.profile,
+            'titles': serial,
+            'rss_start_kb': samples[0],
+            'rss_end_kb': samples[-1],
+            'growth_kb': statistics.median(samples[-third:]) - statistics.median(samples[:third]),
+            'threads': report['threads']['count'],
+            'buffers': report['buffers'],
+        }))
+        supervisor.shutdown()
+        lifecycle.supervisor.stop_monitoring()
+        history.store.stop()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--warmup', type=float, default=150.0,
+                        help='Seconds to let caches and buffers fill before measuring')
+    parser.add_argument('--seconds', type=float, default=60.0, help='Seconds to measure for')
+    parser.add_argument('--max-growth-kb', type=float, default=1024.0,
+                        help='Fail if RSS grows more than this while measuring')
+    parser.add_argument('--profile', choices=['default', 'low-memory'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    failures = []
+    runs = {}
+    for profile in ('default', 'low-memory'):
+        command = [sys.executable, os.path.abspath(__file__), '--profile', profile,
+                   '--devices', str(args.devices), '--warmup', str(args.warmup),
+                   '--seconds', str(args.seconds)]
+        runs[profile] = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         text=True)
+    for profile, process in runs.items():
+        stdout, stderr = process.communicate()
+        lines = [line for line in stdout.splitlines() if line.startswith('{')]
+        if not lines:
+            failures.append(f"{profile} run failed: {stderr.strip()[-300:]}")
+            continue
+        result = json.loads(lines[-1])
+        print(f"{profile + ':':12} RSS {result['rss_start_kb'] / 1024:.1f} -> "
+              f"{result['rss_end_kb'] / 1024:.1f} MiB, growth {result['growth_kb']:+.0f} KiB "
+              f"over {args.seconds:.0f} s, {result['threads']} threads, {result['titles']} titles")
+        print(f"{'':12} " + ', '.join(f"{name} {used}/{bound}" if bound else f"{name} {used}"
+                                      for name, (used, bound) in sorted(result['buffers'].items())))
+        if result['growth_kb'] > args.max_growth_kb:
+            failures.append(f"{profile} RSS grew {result['growth_kb']:.0f} KiB > {args.max_growth_kb:.0f}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Measure what the sampling profiler behind /api/debug/profile costs.
+
+A fleet of fake devices under the device supervisor plays a steady stream
+of titles from a 'fake-devices' thread, so there is real classification
+work to find. CPU is measured over the same stretch without profiling,
+then while profiling in CPU mode and in wall-clock mode. Reports:
+
+- the profiler's own CPU time as a share of one core, per mode
+- the thread with the most CPU and whether its hottest stack reaches the
+  monitor's classification code
+- threads and trace/profile hooks left behind afterwards (there should be none)
+
+Runs offline. Fails (exit status 1) if the profiler costs more than the
+threshold in CPU mode, misses the hot path or leaves anything behind:
+
+    python3 benchmarks/bench_profiler.py [--devices 20] [--seconds 5] [--interval-ms 10] [--max-overhead 5]
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import profiler  # noqa: E402
+import rule_engine  # noqa: E402
+from device_supervisor import DeviceSupervisor  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+TITLES = ['Minecraft hardcore day', 'Peppa Pig episode', 'Lofi beats to study to',
+          'Creeper compilation', 'Bluey season', 'Cooking pasta at home']
+
+
+def drive(devices, stop):
+    """Keep every device changing titles, each one new so nothing is cached."""
+    rng = random.Random(1)
+    serial = 0
+    while not stop.is_set():
+        for device in rng.sample(devices, max(1, len(devices) // 4)):
+            serial += 1
+            device.stop_media()
+            device.play_title(f'{rng.choice(TITLES)} {serial}')
+        time.sleep(0.005)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--interval-ms', type=float, default=profiler.DEFAULT_INTERVAL_MS)
+    parser.add_argument('--max-overhead', type=float, default=5.0,
+                        help='Fail if CPU-mode profiling costs more than this percent of one core')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    table = rule_engine.DecisionTable(rule_engine.default_rules(list(main.DEFAULT_MINECRAFT_KEYWORDS)))
+    supervisor = DeviceSupervisor(main.EventDrivenMonitor, lambda: table)
+    devices = [FakeChromecast(f'Device {i}') for i in range(args.devices)]
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(quiet):
+        lifecycle.supervisor.start_monitoring(supervisor.run)
+        for device in devices:
+            supervisor.attach(device)
+
+    stop = threading.Event()
+    driver = threading.Thread(target=drive, args=(devices, stop), name='fake-devices', daemon=True)
+    failures = []
+    with contextlib.redirect_stdout(quiet):
+        driver.start()
+        time.sleep(1)
+        threads_before = set(threading.enumerate())
+
+        started = time.process_time()
+        time.sleep(args.seconds)
+        baseline = (time.process_time() - started) / args.seconds * 100
+
+        results = {mode: profiler.profile(args.seconds, args.interval_ms, wall=mode == 'wall')
+                   for mode in ('cpu', 'wall')}
+
+        threads_after = set(threading.enumerate())
+        stop.set()
+        driver.join(5)
+    print(f"{'no profiler:':14} process {baseline:5.1f}% of a core")
+    for mode, result in results.items():
+        overhead = result['profiler_cpu_seconds'] / result['seconds'] * 100
+        process = result['process_cpu_seconds'] / result['seconds'] * 100
+        hottest = result['threads'][0]
+        top = result['collapsed'][0] if result['collapsed'] else ''
+        print(f"{mode + ' mode:':14} process {process:5.1f}%, profiler {overhead:4.1f}% of a core, "
+              f"{result['samples']} samples, {len(result['collapsed'])} stacks")
+        print(f"{'':14} busiest thread {hottest['name']} ({hottest['cpu_percent']}%), "
+              f"top stack ends in {top.rsplit(';', 1)[-1][:70]}")
+        if mode == 'cpu':
+            if overhead > args.max_overhead:
+                failures.append(f"CPU-mode profiling cost {overhead:.1f}% > {args.max_overhead}%")
+            monitor_stacks = [line for line in result['collapsed']
+                              if line.startswith('fake-devices;') and 'EventDrivenMonitor' in line]
+            if not monitor_stacks:
+                failures.append("no stack of the busy thread reaches EventDrivenMonitor")
+
+    # The fleet's own pool workers and in-flight fake replies come and go
+    leftover = [thread.name for thread in threads_after - threads_before
+                if not thread.name.startswith(('cast-io', 'timer', 'fake-cast'))]
+    hooks = [name for name, hook in (('trace', sys.gettrace()), ('profile', sys.getprofile())) if hook]
+    print(f"{'afterwards:':14} {len(leftover)} new thread(s), hooks: {', '.join(hooks) or 'none'}")
+    if leftover:
+        failures.append(f"{len(leftover)} thread(s) left behind")
+    if hooks:
+        failures.append(f"{', '.join(hooks)} hook left installed")
+
+    with contextlib.redirect_stdout(quiet):
+        supervisor.shutdown()
+        lifecycle.supervisor.stop_monitoring()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Run the real pychromecast client path against simulated devices.
+
+For each fleet size, starts cast_simulator.py in a separate process, lets the
+device supervisor (what `main.py --all-devices` runs) discover and connect to
+every device over TLS, then reports connect time, threads, sockets, memory
+and CPU in this process, plus the mutes it issued as titles changed.
+
+    python3 benchmarks/bench_protocol_fleet.py [--devices 1 10 50 100] [--seconds 20] [--no-mdns]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import metrics  # noqa: E402
+import web_server  # noqa: E402
+from config_store import ConfigStore  # noqa: E402
+from connection_manager import ConnectionManager  # noqa: E402
+from device_supervisor import DeviceSupervisor  # noqa: E402
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cast_simulator.py')
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def open_sockets():
+    count = 0
+    for fd in os.listdir('/proc/self/fd'):
+        with contextlib.suppress(OSError):
+            if os.readlink(f'/proc/self/fd/{fd}').startswith('socket:'):
+                count += 1
+    return count
+
+
+def start_simulator(devices, interval, mdns):
+    command = [sys.executable, SIMULATOR, '--devices', str(devices), '--interval', str(interval)]
+    if not mdns:
+        command.append('--no-mdns')
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    cast_infos = []
+    for line in process.stdout:
+        if line.strip() == 'READY':
+            break
+        # "<name> at <host>:<port> (<uuid>)"
+        name, _, rest = line.partition(' at ')
+        address, _, device_uuid = rest.partition(' (')
+        host, _, port = address.rpartition(':')
+        cast_infos.append((name, host, int(port), uuid.UUID(device_uuid.strip(')\n'))))
+    return process, cast_infos
+
+
+def connected_count(supervisor):
+    with supervisor.lock:
+        chromecasts = [chromecast for chromecast, _ in supervisor.devices.values()]
+    return sum(ConnectionManager.for_chromecast(chromecast).connected for chromecast in chromecasts)
+
+
+def run_fleet(size, seconds, interval, mdns):
+    from pychromecast.models import CastInfo, HostServiceInfo
+
+    process, devices = start_simulator(size, interval, mdns)
+    baseline_threads = threading.active_count()
+    baseline_rss = rss_kb()
+    baseline_sockets = open_sockets()
+    mutes_before = metrics.COMMAND_RESULTS['mute', True].value
+
+    supervisor = DeviceSupervisor(main.EventDrivenMonitor, web_server.get_rule_table)
+    started = time.monotonic()
+    if mdns:
+        supervisor.start_discovery()
+    else:
+        import zeroconf
+        supervisor.zconf = zeroconf.Zeroconf()
+        for name, host, port, device_uuid in devices:
+            supervisor.executor.submit(supervisor._attach_cast_info, CastInfo(
+                {HostServiceInfo(host, port)}, device_uuid, 'Chromecast', name,
+                host, port, 'cast', 'Google Inc.'))
+    lifecycle.supervisor.start_monitoring(supervisor.run)
+
+    connect_seconds = None
+    deadline = started + 60
+    while time.monotonic() < deadline:
+        if connected_count(supervisor) >= size:
+            connect_seconds = time.monotonic() - started
+            break
+        time.sleep(0.05)
+
+    cpu_start = time.process_time()
+    time.sleep(seconds)
+    cpu = (time.process_time() - cpu_start) / seconds * 100
+
+    result = {
+        'connected': connected_count(supervisor),
+        'connect_seconds': connect_seconds,
+        'threads': threading.active_count() - baseline_threads,
+        'sockets': open_sockets() - baseline_sockets,
+        'rss_kb': rss_kb() - baseline_rss,
+        'cpu': cpu,
+        'mutes': metrics.COMMAND_RESULTS['mute', True].value - mutes_before,
+    }
+
+    supervisor.shutdown()
+    lifecycle.supervisor.stop_monitoring()
+    if supervisor.zconf:
+        supervisor.zconf.close()
+    process.terminate()
+    process.wait(10)
+    return result
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--seconds', type=float, default=20.0,
+                        help='Seconds to measure each fleet for once connected')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='Mean seconds between title changes on each simulated device')
+    parser.add_argument('--no-mdns', action='store_true',
+                        help='Connect to the simulated devices directly instead of discovering them')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    # Keep the benchmark's keywords out of the real config file
+    web_server.config = ConfigStore(None)
+    web_server.config.update(keywords=main.DEFAULT_MINECRAFT_KEYWORDS)
+
+    print(f"{'devices':>8} {'connected':>10} {'connect s':>10} {'threads +':>10} "
+          f"{'sockets +':>10} {'RSS +KB':>9} {'KB/dev':>7} {'CPU %':>7} {'mutes':>6}")
+    for size in args.devices:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_fleet(size, args.seconds, args.interval, not args.no_mdns)
+        connect = result['connect_seconds']
+        print(f"{size:>8} {result['connected']:>10} "
+              f"{(f'{connect:.2f}' if connect is not None else 'timeout'):>10} "
+              f"{result['threads']:>10} {result['sockets']:>10} {result['rss_kb']:>9} "
+              f"{result['rss_kb'] / size:>7.1f} {result['cpu']:>7.2f} {result['mutes']:>6}")
+
+
+if __name__ == '__main__':
+    main_benchmark()
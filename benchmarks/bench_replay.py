@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Record a session of status messages and replay it through the rules.
+
+A fleet of fake devices under the device supervisor plays a mix of flagged
+and harmless titles while the recorder is on. The recording is then replayed
+as fast as possible and at --speed times the recorded pace. Reports:
+
+- recording size: bytes per status message
+- whether the replay acted on the same titles as the live monitors did,
+  with an all-day block window and some watch time on the live scheduler,
+  which a replay must neither follow nor change
+- events/s and p50/p99 status-to-verdict time, for the session and for a
+  larger synthetic corpus of --corpus messages
+- how long the paced replay took against the recorded duration
+
+Runs offline. Fails (exit status 1) if the replay acts differently from the
+live session or a paced replay drifts by more than 20%:
+
+    python3 benchmarks/bench_replay.py [--devices 5] [--titles 200] [--corpus 100000] [--speed 4]
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import event_bus  # noqa: E402
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import recording  # noqa: E402
+import rule_engine  # noqa: E402
+import schedules  # noqa: E402
+from device_supervisor import DeviceSupervisor  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+
+FLAGGED = ['Minecraft hardcore day', 'Creeper compilation', 'Enderman facts', 'Mojang live']
+HARMLESS = ['Peppa Pig episode', 'Lofi beats to study to', 'Bluey season', 'Cooking pasta at home']
+
+
+def record_session(path, devices, titles, get_rules):
+    """Play titles on a fleet while recording; returns the set of (device, title) the monitors acted on."""
+    supervisor = DeviceSupervisor(main.EventDrivenMonitor, get_rules)
+    fleet = [FakeChromecast(f'Device {i}', round_trip=0.002) for i in range(devices)]
+    acted = set()
+    event_bus.bus.add_listener(
+        lambda kind, data: kind == 'detection' and acted.add((data['device'], data['title'])))
+    rng = random.Random(7)
+    recording.recorder.start(path)
+    lifecycle.supervisor.start_monitoring(supervisor.run)
+    for device in fleet:
+        supervisor.attach(device)
+    for i in range(titles):
+        device = rng.choice(fleet)
+        device.stop_media()
+        device.play_title(f'{rng.choice(FLAGGED if rng.random() < 0.3 else HARMLESS)} {i}')
+        time.sleep(0.01)
+    time.sleep(0.2)  # Let the last commands be answered
+    lifecycle.supervisor.stop_monitoring()
+    supervisor.shutdown()
+    recording.recorder.stop()
+    return acted
+
+
+def write_corpus(path, events, devices):
+    """A recording of events media statuses, written straight through the recorder."""
+    rng = random.Random(11)
+    recording.recorder.start(path)
+    for i in range(events):
+        title = f'{rng.choice(FLAGGED if rng.random() < 0.1 else HARMLESS)} {i % 5000}'
+        recording.recorder.media_status(f'Device {i % devices}', SimpleNamespace(
+            media_metadata={'title': title}, content_id=None, player_state='PLAYING'))
+    recording.recorder.stop()
+
+
+def run_replay(path, get_rules, speed=0):
+    acted = set()
+
+    def on_verdict(verdict):
+        if verdict['enforced']:
+            acted.add((verdict['device'], verdict['title']))
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        summary = recording.replay(path, main.EventDrivenMonitor, get_rules, speed, on_verdict)
+    return summary, acted
+
+
+def report(name, summary):
+    latency = summary['latency_ms']
+    print(f"{name + ':':10} {summary['events']:7} events, {summary['events_per_second']:7} events/s, "
+          f"status to verdict p50 {latency['p50']:.3f} ms, p99 {latency['p99']:.3f} ms, "
+          f"enforced {summary['enforced']}")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--titles', type=int, default=200)
+    parser.add_argument('--corpus', type=int, default=100000)
+    parser.add_argument('--speed', type=float, default=4.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    table = rule_engine.DecisionTable(rule_engine.default_rules(list(main.DEFAULT_MINECRAFT_KEYWORDS)))
+    get_rules = lambda: table  # noqa: E731
+    tmp = tempfile.mkdtemp()
+    failures = []
+    try:
+        session = os.path.join(tmp, 'session.jsonl.gz')
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            live = record_session(session, args.devices, args.titles, get_rules)
+        recorded = sum(1 for _ in recording.read(session))
+        print(f"{'recorded:':10} {recorded} events, {os.path.getsize(session) / recorded:.1f} bytes each "
+              f"gzipped, live monitors acted on {len(live)} titles")
+
+        # Blocks everything live; a replay goes by the rules alone
+        schedules.scheduler.configure([{'name': 'All day', 'start': '00:00', 'end': '00:00'}], [])
+        schedules.scheduler.usage['233637DE'] = 600.0
+        usage = dict(schedules.scheduler.usage)
+        try:
+            summary, replayed = run_replay(session, get_rules)
+        finally:
+            schedules.scheduler.configure([], [])
+        report('replay', summary)
+        if replayed != live:
+            failures.append(f"replay acted on {len(replayed - live)} titles the live session did not "
+                            f"and missed {len(live - replayed)}")
+        if schedules.scheduler.usage != usage:
+            failures.append("replay changed the live watch time")
+
+        summary, _ = run_replay(session, get_rules, args.speed)
+        expected = summary['recorded_seconds'] / args.speed
+        print(f"{'paced:':10} {summary['replay_seconds']:.2f}s at {args.speed:g}x "
+              f"for {summary['recorded_seconds']}s recorded (expected {expected:.2f}s)")
+        if abs(summary['replay_seconds'] - expected) > max(0.2 * expected, 0.05):
+            failures.append(f"paced replay took {summary['replay_seconds']:.2f}s, expected {expected:.2f}s")
+
+        corpus = os.path.join(tmp, 'corpus.jsonl.gz')
+        write_corpus(corpus, args.corpus, args.devices)
+        summary, _ = run_replay(corpus, get_rules)
+        report('corpus', summary)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
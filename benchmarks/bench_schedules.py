@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Check block windows, daily watch-time limits and timed unmutes against a fake device.
+
+Drives an event-driven monitor through:
+
+- a daily limit of a few seconds of YouTube, with a pause in the middle that
+  must not count, reporting how far from the expected moment the mute came
+- lifting the limit, which must unmute straight away
+- a rule mute that must end after the mute duration, from the timer queue
+- a block window covering the current time, applied as soon as it is saved
+  and lifted as soon as it is removed
+- window arithmetic for a window that runs past midnight
+- watch time surviving a save and reload, including a session still
+  playing when the process dies, and a used-up limit applying again at once
+
+Runs offline. Fails (exit status 1) if any check does not hold:
+
+    python3 benchmarks/bench_schedules.py [--limit-s 3] [--tolerance-ms 150]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lifecycle  # noqa: E402
+import main  # noqa: E402
+import schedules  # noqa: E402
+import web_server  # noqa: E402
+from config_store import ConfigStore  # noqa: E402
+from fake_chromecast import FakeChromecast  # noqa: E402
+from timer_queue import timers  # noqa: E402
+
+YOUTUBE = '233637DE'
+
+
+def wait_for_mute(chromecast, muted, timeout=5):
+    """Return when the device's mute state became muted, or None."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if chromecast.status.volume_muted == muted:
+            return time.monotonic()
+        time.sleep(0.002)
+    return None
+
+
+def set_schedules(windows=(), quotas=()):
+    changed_at = time.monotonic()
+    web_server.config.update(schedules=[schedules.validate_window(w) for w in windows],
+                             quotas=[schedules.validate_quota(q) for q in quotas])
+    return changed_at
+
+
+def check_limit(chromecast, limit, failures, tolerance):
+    """Play, pause for a while, play again; the mute should come after limit seconds of playing."""
+    set_schedules(quotas=[{'name': 'YouTube', 'app_id': YOUTUBE, 'minutes': limit / 60}])
+    started = chromecast.play_title('Weeknight pasta')
+    time.sleep(limit / 3)
+    chromecast.media_controller.pause()
+    paused = time.monotonic()
+    time.sleep(limit / 2)
+    resumed = chromecast.resume()
+    muted_at = wait_for_mute(chromecast, True, timeout=limit * 2)
+    if muted_at is None:
+        failures.append("daily limit never muted")
+        return None
+    expected = resumed + limit - (paused - started)
+    error = (muted_at - expected) * 1000
+    print(f"daily limit:           muted {error:+.0f} ms from the expected moment "
+          f"({limit:.1f} s of play, {resumed - paused:.1f} s paused in between)")
+    if abs(error) > tolerance:
+        failures.append(f"daily limit muted {error:+.0f} ms off")
+    if YOUTUBE not in schedules.scheduler.status()['exhausted']:
+        failures.append("daily limit not reported as reached")
+    return muted_at
+
+
+def check_lift(chromecast, failures):
+    """Removing the limit should unmute without waiting for the mute duration."""
+    changed_at = set_schedules()
+    unmuted_at = wait_for_mute(chromecast, False)
+    if unmuted_at is None:
+        failures.append("removing the limit did not unmute")
+        return
+    print(f"limit removed:         unmuted after {(unmuted_at - changed_at) * 1000:.1f} ms")
+
+
+def check_timed_unmute(chromecast, mute_duration, failures, tolerance):
+    """A rule mute should end after the mute duration, with nothing polling for it."""
+    chromecast.play_title('Minecraft survival')
+    muted_at = wait_for_mute(chromecast, True)
+    if muted_at is None:
+        failures.append("rule did not mute")
+        return
+    # Stop playing without touching the volume, so the mute has to expire
+    chromecast.set_media(SimpleNamespace(media_metadata={}, player_state='IDLE'))
+    unmuted_at = wait_for_mute(chromecast, False, timeout=mute_duration * 3)
+    if unmuted_at is None:
+        failures.append("mute never expired")
+        return
+    error = (unmuted_at - muted_at - mute_duration) * 1000
+    print(f"timed unmute:          {error:+.0f} ms from the mute duration ({mute_duration:.1f} s)")
+    if abs(error) > tolerance:
+        failures.append(f"timed unmute {error:+.0f} ms off")
+
+
+def check_window(chromecast, failures):
+    """A window covering now blocks as soon as it is saved and lets go once removed."""
+    chromecast.play_title('Weeknight pasta')
+    now = datetime.now()
+    window = {'name': 'Now', 'start': now.strftime('%H:%M'),
+              'end': (now + timedelta(minutes=2)).strftime('%H:%M'), 'app_id': YOUTUBE}
+    changed_at = set_schedules(windows=[window])
+    muted_at = wait_for_mute(chromecast, True)
+    if muted_at is None:
+        failures.append("block window did not mute")
+        return
+    print(f"block window:          muted {(muted_at - changed_at) * 1000:.1f} ms after saving")
+    changed_at = set_schedules()
+    unmuted_at = wait_for_mute(chromecast, False)
+    if unmuted_at is None:
+        failures.append("removing the window did not unmute")
+        return
+    print(f"window removed:        unmuted after {(unmuted_at - changed_at) * 1000:.1f} ms")
+
+
+def check_overnight(failures):
+    window = schedules.Window(schedules.validate_window(
+        {'name': 'Bedtime', 'days': 'fri', 'start': '20:30', 'end': '07:00'}))
+    friday = datetime(2024, 5, 3)  # a Friday
+    cases = [
+        (friday.replace(hour=20, minute=29), False),
+        (friday.replace(hour=20, minute=30), True),
+        (friday + timedelta(days=1, hours=6, minutes=59), True),   # Saturday morning
+        (friday + timedelta(days=1, hours=7), False),
+        (friday - timedelta(days=1) + timedelta(hours=21), False),  # Thursday night
+    ]
+    wrong = [moment for moment, active in cases if window.active_at(moment) != active]
+    boundary = window.next_boundary(friday.replace(hour=21))
+    if boundary != friday + timedelta(days=1, hours=7):
+        wrong.append(f"next boundary {boundary}")
+    print(f"overnight window:      {len(cases) + 1 - len(wrong)}/{len(cases) + 1} checks right")
+    for moment in wrong:
+        failures.append(f"overnight window wrong at {moment}")
+
+
+def check_persistence(path, failures):
+    schedules.scheduler.save()
+    reloaded = schedules.Scheduler(path)
+    reloaded.load()
+    before = schedules.scheduler.usage
+    after = reloaded.usage
+    same = set(before) == set(after) and all(abs(before[app] - after[app]) < 0.01 for app in before)
+    print(f"restart:               watch time {'kept' if same else 'LOST'} "
+          f"({', '.join(f'{app} {seconds:.1f} s' for app, seconds in after.items())})")
+    if not same:
+        failures.append("watch time lost over a restart")
+
+    # Power cut: an autosave while 90 s of a 1 minute limit are playing, then no shutdown
+    crashed_path = path + '.crashed'
+    quota = [{'app_id': YOUTUBE, 'minutes': 1}]
+    crashed = schedules.Scheduler(crashed_path)
+    crashed.configure([], quota)
+    crashed.playback('TV', YOUTUBE, True)
+    crashed.sessions['TV'] = (YOUTUBE, time.monotonic() - 90)
+    crashed.save()
+    restarted = schedules.Scheduler(crashed_path)
+    restarted.configure([], quota)
+    restarted.load()
+    used = restarted.usage.get(YOUTUBE, 0)
+    blocked = restarted.verdict(YOUTUBE) is not None
+    print(f"power cut:             {used:.0f} s of the playing session kept, "
+          f"limit {'applies' if blocked else 'NOT applied'} after restart")
+    if used < 89:
+        failures.append(f"only {used:.0f} s of a session in progress survived a power cut")
+    if not blocked:
+        failures.append("a limit used up before a restart did not apply after it")
+    for scheduler in (crashed, restarted):
+        scheduler.configure([], [])
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--limit-s', type=float, default=3.0,
+                        help='Daily limit to test with, in seconds')
+    parser.add_argument('--mute-duration-s', type=float, default=1.0,
+                        help='How long rule mutes last')
+    parser.add_argument('--tolerance-ms', type=float, default=150.0,
+                        help='Fail if a mute or unmute is further than this from when it is due')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    usage_path = os.path.join(tmp, 'quota_usage.json')
+    schedules.scheduler = schedules.Scheduler(usage_path)
+    # Keep the benchmark's settings out of the real config file
+    web_server.config = ConfigStore(None)
+    web_server.config.subscribe(web_server.on_config_change)
+    web_server.config.update(keywords=main.DEFAULT_MINECRAFT_KEYWORDS)
+
+    chromecast = FakeChromecast()
+    chromecast.launch_app(YOUTUBE, 'YouTube')
+    monitor = main.EventDrivenMonitor(chromecast, web_server.get_rule_table,
+                                      mute_duration=args.mute_duration_s)
+    chromecast.register_status_listener(monitor)
+    chromecast.media_controller.register_status_listener(monitor)
+    failures = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.start()
+        lifecycle.supervisor.start_monitoring(monitor.run)
+
+    def step(check, *check_args):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            result = check(*check_args)
+        for line in output.getvalue().splitlines():
+            if not line.startswith('['):
+                print(line)
+        return result
+
+    step(check_limit, chromecast, args.limit_s, failures, args.tolerance_ms)
+    step(check_lift, chromecast, failures)
+    step(check_timed_unmute, chromecast, args.mute_duration_s, failures, args.tolerance_ms)
+    step(check_window, chromecast, failures)
+    check_overnight(failures)
+    chromecast.set_media(SimpleNamespace(media_metadata={}, player_state='IDLE'))
+    check_persistence(usage_path, failures)
+    print(f"timers while idle:     {timers.pending()}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        lifecycle.supervisor.stop_monitoring()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
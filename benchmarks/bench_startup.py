@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Measure how quickly the blocker comes up.
+
+Reports, each the median of a few fresh interpreters:
+
+- import time of main, web_server and pychromecast on their own
+- time from launching `main.py --web` to the first answer from /api/status,
+  and what it says about discovery at that point
+
+Runs in a temporary directory so no state files are touched. Discovery
+itself needs a network with Chromecasts; without one the page must still
+answer straight away. Fails (exit status 1) if the first response takes
+longer than the threshold:
+
+    python3 benchmarks/bench_startup.py [--runs 5] [--max-first-response-s 5]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_seconds(module):
+    """Seconds a fresh interpreter takes to import module."""
+    code = (f"import time; started = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - started)")
+    tmp = tempfile.mkdtemp()
+    try:
+        output = subprocess.run([sys.executable, '-c', code], cwd=tmp, capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=ROOT), timeout=60)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def first_response(timeout):
+    """Launch main.py --web; return (seconds to the first /api/status answer, the answer)."""
+    port = free_port()
+    tmp = tempfile.mkdtemp()
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--web',
+                                '--port', str(port)],
+                               cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.monotonic() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/status', timeout=1) as r:
+                    return time.monotonic() - started, json.load(r)
+            except OSError:
+                time.sleep(0.01)
+        return None, None
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-first-response-s', type=float, default=5.0,
+                        help='Fail if the web interface takes longer to answer')
+    args = parser.parse_args()
+
+    for module in ('main', 'web_server', 'pychromecast'):
+        seconds = statistics.median(import_seconds(module) for _ in range(args.runs))
+        print(f"{'import ' + module + ':':26} {seconds * 1000:6.0f} ms")
+
+    samples = []
+    status = None
+    for _ in range(args.runs):
+        seconds, answer = first_response(args.max_first_response_s * 4)
+        if seconds is None:
+            print("FAIL web interface never answered")
+            sys.exit(1)
+        samples.append(seconds)
+        status = status or answer
+    first = statistics.median(samples)
+    print(f"{'first /api/status:':26} {first * 1000:6.0f} ms (discovery: {status.get('discovery')})")
+    if first > args.max_first_response_s:
+        print(f"FAIL first response after {first:.2f} s > {args.max_first_response_s} s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Measure the obfuscation-tolerant title matcher with a large keyword list.
+
+Reports build time, index size and time per title with random filler
+keywords. The budget is 1 ms per title on a Pi Zero 2 W, which runs this
+roughly 8-10x slower than a desktop CPU.
+
+With the default keyword list, checks that common obfuscations of a keyword
+are caught and that none of a set of everyday titles is, including ones a
+letter away from a keyword ("Stove", "Creepier"). Fails (exit status 1) on
+any miss or false positive:
+
+    python3 benchmarks/bench_title_matcher.py [--keywords 5000]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import TitleMatcher  # noqa: E402
+from main import DEFAULT_MINECRAFT_KEYWORDS  # noqa: E402
+
+OBFUSCATED = [
+    "M1n3craft survival let's play",
+    "m i n e c r a f t but every block is TNT",
+    "ＭＩＮＥＣＲＡＦＴ speedrun",
+    "Мinecraft 🔥🔥 hardcore",
+    "mine-craft building tips",
+    "Minecrsft hunger games",
+    "m.i.n.e.c.r.a.f.t parkour",
+    "mïnecraft redstone tutorial",
+    "Cr33per jump scares",
+    "$teve and Alex build a house",
+    "Skeletn army vs Enderm4n",
+]
+
+CLEAN = [
+    "Top 10 Goals of the Season | Premier League Highlights",
+    "Lofi hip hop radio - beats to relax/study to",
+    "How to make sourdough bread at home (beginner friendly)",
+    "Peppa Pig Full Episodes | Muddy Puddles and more",
+    "Relaxing rain sounds for sleeping - 10 hours",
+    "Science for kids: Why is the sky blue?",
+    "Learn colours with trucks and diggers 2024",
+    "BBC Earth: The most dangerous animals in the ocean",
+    "Cast iron stove cooking for beginners",
+    "Reading music: the stave and the treble clef",
+    "Creepier stories to tell around the campfire",
+    "Bombie the Bumblebee - kids song",
+    "Minecart ride through the old gold mine",
+    "The skeletal system explained for kids",
+    "Underwater volcano documentary",
+    "Stevie Wonder - Superstition (Live)",
+    "Mojave desert road trip vlog",
+    "Gordon Ramsay makes the perfect steak",
+    "Bluey - Keepy Uppy | Full Episode",
+    "Taylor Swift - Shake It Off (Official Video)",
+    "Fortnite-free family game night ideas",
+    "Paw Patrol rescue compilation",
+    "NASA live: Earth views from the space station",
+    "Sleeping beauty bedtime story read aloud",
+    "Cocomelon - Wheels on the Bus",
+    "Mr Beast tries the world's spiciest pepper",
+    "Jurassic World dinosaur facts for kids",
+    "How to solve a Rubik's cube in 5 minutes",
+    "Monster trucks at the stadium",
+    "Crafting paper flowers for Mother's Day",
+    "Mining for gemstones in North Carolina",
+    "Creative Lego city build timelapse",
+    "Skater tricks for beginners: ollie tutorial",
+    "Dragon boat racing championship final",
+    "Ender's Game official trailer",
+    "Morning yoga for kids",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    keywords = ['minecraft', 'creeper', 'ender dragon']
+    while len(keywords) < args.keywords:
+        keywords.append(''.join(rng.choice(string.ascii_lowercase)
+                                for _ in range(rng.randint(4, 14))))
+
+    start = time.perf_counter()
+    matcher = TitleMatcher(keywords)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    default = TitleMatcher(DEFAULT_MINECRAFT_KEYWORDS)
+    missed = [title for title in OBFUSCATED if default.search(title) is None]
+    false_positives = [(title, default.search(title)[0]) for title in CLEAN
+                       if default.search(title) is not None]
+
+    titles = OBFUSCATED + CLEAN
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for title in titles:
+            matcher.find_all(title)
+    per_title_us = (time.perf_counter() - start) / (args.repeat * len(titles)) * 1e6
+
+    # Clean titles are the worst case: the exact pass finds nothing and
+    # every word goes through the fuzzy index
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for title in CLEAN:
+            matcher.search(title)
+    clean_us = (time.perf_counter() - start) / (args.repeat * len(CLEAN)) * 1e6
+
+    print(f"keywords:            {len(matcher)}")
+    print(f"build:               {build_ms:.0f} ms")
+    print(f"fuzzy index entries: {len(matcher._index)}")
+    print(f"find_all per title:  {per_title_us:.1f} us")
+    print(f"search, clean title: {clean_us:.1f} us")
+    print(f"obfuscations missed: {len(missed)}/{len(OBFUSCATED)} {missed if missed else ''}")
+    print(f"false positives:     {len(false_positives)}/{len(CLEAN)} {false_positives if false_positives else ''}")
+    if missed or false_positives:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
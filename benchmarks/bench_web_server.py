@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Compare Flask's development server with the production setup (waitress).
+
+Starts the web interface in a child process with each server in turn and
+hits it from keep-alive client threads, reporting requests per second and
+p50/p99 latency for:
+
+- the dashboard page, as a browser fetches it the first time (gzip)
+- the dashboard page again with its ETag (a 304)
+- /api/status, as the fallback poller asks for it
+
+Then it opens more /api/events streams than the server has threads, as that
+many open pages would, and checks that every stream gets its snapshot and a
+published event and that /api/status still answers, and that an open stream
+ends when the server shuts down. Fails (exit status 1) if a stream or that
+request hangs, if shutdown leaves a stream open, or if the installed waitress
+is not the one event_streams was tested against.
+
+Run it on the Pi itself for numbers that mean anything there. Runs offline;
+waitress is skipped if it is not installed:
+
+    python3 benchmarks/bench_web_server.py [--clients 8] [--requests 300] [--streams 20]
+"""
+
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def serve(server, port):
+    """Child process: run the web interface the way main.py does, minus the devices."""
+    import logging
+    logging.disable(logging.WARNING)
+    import event_bus
+    import web_server
+    from config_store import ConfigStore
+    web_server.config = ConfigStore(None)
+
+    def tick():
+        while True:
+            time.sleep(0.5)
+            event_bus.publish('tick')
+
+    threading.Thread(target=tick, daemon=True).start()
+    # Shut down as main.py does on SIGTERM, off the signal handler's thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=web_server.shutdown).start())
+    web_server.serve('127.0.0.1', port, production=server == 'waitress')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_listening(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def load(port, path, headers, clients, requests):
+    """Every client sends requests requests over one connection. Returns (req/s, latencies, bytes)."""
+    latencies = []
+    sizes = []
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        mine = []
+        size = 0
+        for _ in range(requests):
+            started = time.perf_counter()
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            size = len(response.read())
+            mine.append((time.perf_counter() - started) * 1000)
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            sizes.append(size)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, latencies, max(sizes)
+
+
+def etag_for(port, path, headers):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('GET', path, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.getheader('ETag')
+
+
+def read_until(response, marker):
+    """Read a stream line by line until a line starts with marker."""
+    while True:
+        line = response.readline()
+        if not line:
+            raise EOFError('stream ended')
+        if line.startswith(marker):
+            return
+
+
+def check_streams(server, port, streams, timeout=5):
+    """Hold streams event streams open while asking for /api/status. Returns a failure or None."""
+    connections = []
+    responses = []
+    try:
+        started = time.perf_counter()
+        for _ in range(streams):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            connections.append(connection)
+            connection.request('GET', '/api/events')
+            responses.append(connection.getresponse())
+            read_until(responses[-1], b'event: snapshot')
+        opened = time.perf_counter() - started
+
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        connection.request('GET', '/api/status')
+        connection.getresponse().read()
+        connection.close()
+        status_ms = (time.perf_counter() - started) * 1000
+
+        for response in responses:
+            read_until(response, b'event: tick')
+    except (OSError, EOFError, http.client.HTTPException) as e:
+        return f"{server} with {len(connections)} event streams open: {e!r}"
+    finally:
+        for connection in connections:
+            connection.close()
+    print(f"{server + ' streams:':26} {streams} open in {opened * 1000:.0f} ms, /api/status in "
+          f"{status_ms:.2f} ms, every stream got a published event")
+    return None
+
+
+def check_shutdown(server, port, process, timeout=5):
+    """Shut the server down with a stream open; returns a failure or None."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', '/api/events')
+        response = connection.getresponse()
+        read_until(response, b'event: tick')
+        started = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        read_until(response, b'no such line')
+    except EOFError:
+        pass
+    except (OSError, http.client.HTTPException) as e:
+        return f"{server} left an event stream open on shutdown: {e!r}"
+    finally:
+        connection.close()
+    try:
+        status = process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        return f"{server} did not exit after SIGTERM"
+    print(f"{server + ' shutdown:':26} open stream ended in {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"exit status {status}")
+    return None
+
+
+def run_server(server, args):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', server,
+                                '--port', str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_listening(port):
+            return f"{server} did not start"
+        gzip = {'Accept-Encoding': 'gzip'}
+        cases = [('page', '/', gzip),
+                 ('page, 304', '/', dict(gzip, **{'If-None-Match': etag_for(port, '/', gzip) or ''})),
+                 ('status', '/api/status', gzip)]
+        for name, path, headers in cases:
+            rate, latencies, size = load(port, path, headers, args.clients, args.requests)
+            print(f"{server + ' ' + name + ':':26} {rate:7.0f} req/s, p50 "
+                  f"{percentile(latencies, 0.5):6.2f} ms, p99 {percentile(latencies, 0.99):6.2f} ms, "
+                  f"{size} bytes")
+        return check_streams(server, port, args.streams) or check_shutdown(server, port, process)
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            process.wait(10)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent keep-alive clients')
+    parser.add_argument('--requests', type=int, default=300, help='Requests per client per case')
+    parser.add_argument('--streams', type=int, default=20,
+                        help='Event streams held open at once; more than the server has threads')
+    parser.add_argument('--serve', choices=['flask', 'waitress'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    servers = ['flask']
+    failures = []
+    try:
+        import event_streams
+    except ImportError:
+        print("waitress is not installed; only measuring Flask's development server")
+    else:
+        servers.append('waitress')
+        print(f"waitress {event_streams.waitress_version()}, event streams tested with "
+              f"{event_streams.TESTED_WAITRESS}")
+        if not event_streams.supported():
+            failures.append("the installed waitress is not the version event_streams was tested with")
+    failures += [failure for failure in (run_server(server, args) for server in servers) if failure]
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
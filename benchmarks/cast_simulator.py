@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Simulate a fleet of Chromecasts that speak the real cast protocol.
+
+Each virtual device listens for TLS on port 8009 of its own loopback address
+(127.0.0.2, 127.0.0.3, ...), frames CastMessage protobufs the way a device
+does, answers the heartbeat, receiver and media namespaces, and advertises
+itself as _googlecast._tcp over zeroconf. Titles change on a schedule so the
+blocker has something to react to. Everything runs on one asyncio loop.
+
+    python3 benchmarks/cast_simulator.py --devices 20 [--interval 10] [--no-mdns]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import ssl
+import struct
+import subprocess
+import tempfile
+import uuid
+
+from pychromecast.generated.cast_channel_pb2 import CastMessage
+
+logger = logging.getLogger(__name__)
+
+NS_CONNECTION = 'urn:x-cast:com.google.cast.tp.connection'
+NS_HEARTBEAT = 'urn:x-cast:com.google.cast.tp.heartbeat'
+NS_RECEIVER = 'urn:x-cast:com.google.cast.receiver'
+NS_MEDIA = 'urn:x-cast:com.google.cast.media'
+
+PLATFORM_ID = 'receiver-0'
+CAST_PORT = 8009
+
+TITLES = [
+    'Minecraft hardcore day 100', 'Peppa Pig full episodes', 'Lofi beats to study to',
+    'Creeper compilation', 'Bluey - the whole season', 'Cooking pasta at home',
+]
+
+APPS = [
+    ('233637DE', 'YouTube'),
+    ('CC1AD845', 'Default Media Receiver'),
+]
+
+
+def device_host(index):
+    """Loopback address for the index-th device; all of 127/8 routes to lo on Linux."""
+    return f'127.0.{(index + 2) // 256}.{(index + 2) % 256}'
+
+
+def tls_context(directory=None):
+    """Server TLS context with a throwaway self-signed certificate."""
+    directory = directory or os.path.join(tempfile.gettempdir(), 'cast-simulator')
+    os.makedirs(directory, exist_ok=True)
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    if not (os.path.exists(cert) and os.path.exists(key)):
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                        '-keyout', key, '-out', cert, '-days', '365',
+                        '-subj', '/CN=cast-simulator'],
+                       check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class Connection:
+    """One client socket, with the virtual connections it opened inside it."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.media_subscribers = set()  # client source ids connected to our transport
+
+    def send(self, source_id, destination_id, namespace, payload):
+        message = CastMessage()
+        message.protocol_version = CastMessage.CASTV2_1_0
+        message.source_id = source_id
+        message.destination_id = destination_id
+        message.namespace = namespace
+        message.payload_type = CastMessage.STRING
+        message.payload_utf8 = json.dumps(payload)
+        data = message.SerializeToString()
+        self.writer.write(struct.pack('>I', len(data)) + data)
+
+    async def receive(self):
+        header = await self.reader.readexactly(4)
+        (length,) = struct.unpack('>I', header)
+        message = CastMessage()
+        message.ParseFromString(await self.reader.readexactly(length))
+        return message
+
+
+class VirtualDevice:
+    """A single simulated Chromecast."""
+
+    def __init__(self, index, titles=TITLES, interval=10.0):
+        self.index = index
+        self.uuid = uuid.uuid4()
+        self.name = f'Simulated Chromecast {index + 1}'
+        self.host = device_host(index)
+        self.titles = titles
+        self.interval = interval
+        self.connections = set()
+
+        self.app_id, self.display_name = random.choice(APPS)
+        self.session_id = str(uuid.uuid4())
+        self.transport_id = f'web-{index}'
+        self.volume_level = 0.5
+        self.muted = False
+        self.title = random.choice(titles)
+        self.player_state = 'PLAYING'
+        self.media_session_id = 1
+        self.commands = {'mute': 0, 'unmute': 0, 'pause': 0}
+
+    # Status payloads
+
+    def receiver_status(self, request_id=0):
+        return {
+            'type': 'RECEIVER_STATUS',
+            'requestId': request_id,
+            'status': {
+                'applications': [{
+                    'appId': self.app_id,
+                    'displayName': self.display_name,
+                    'isIdleScreen': False,
+                    'namespaces': [{'name': NS_MEDIA}],
+                    'sessionId': self.session_id,
+                    'statusText': self.title,
+                    'transportId': self.transport_id,
+                }],
+                'isActiveInput': True,
+                'isStandBy': False,
+                'volume': {'controlType': 'attenuation', 'level': self.volume_level,
+                           'muted': self.muted, 'stepInterval': 0.05},
+            },
+        }
+
+    def media_status(self, request_id=0):
+        return {
+            'type': 'MEDIA_STATUS',
+            'requestId': request_id,
+            'status': [{
+                'mediaSessionId': self.media_session_id,
+                'playbackRate': 1,
+                'playerState': self.player_state,
+                'currentTime': 0,
+                'supportedMediaCommands': 274447,
+                'volume': {'level': 1, 'muted': False},
+                'media': {
+                    'contentId': f'sim-{self.index}-{self.media_session_id}',
+                    'streamType': 'BUFFERED',
+                    'contentType': 'video/mp4',
+                    'metadata': {'metadataType': 0, 'title': self.title},
+                },
+            }],
+        }
+
+    def broadcast_receiver_status(self):
+        for connection in self.connections:
+            connection.send(PLATFORM_ID, '*', NS_RECEIVER, self.receiver_status())
+
+    def broadcast_media_status(self):
+        for connection in self.connections:
+            for subscriber in connection.media_subscribers:
+                connection.send(self.transport_id, subscriber, NS_MEDIA, self.media_status())
+
+    # Protocol
+
+    async def serve(self, context):
+        return await asyncio.start_server(self.handle, self.host, CAST_PORT, ssl=context)
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        self.connections.add(connection)
+        try:
+            while True:
+                message = await connection.receive()
+                self.dispatch(connection, message)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            self.connections.discard(connection)
+            writer.close()
+
+    def dispatch(self, connection, message):
+        try:
+            data = json.loads(message.payload_utf8)
+        except ValueError:
+            return
+        kind = data.get('type')
+        request_id = data.get('requestId', 0)
+        source, destination = message.source_id, message.destination_id
+
+        if message.namespace == NS_HEARTBEAT:
+            if kind == 'PING':
+                connection.send(destination, source, NS_HEARTBEAT, {'type': 'PONG'})
+
+        elif message.namespace == NS_CONNECTION:
+            if destination == self.transport_id:
+                if kind == 'CONNECT':
+                    connection.media_subscribers.add(source)
+                elif kind == 'CLOSE':
+                    connection.media_subscribers.discard(source)
+
+        elif message.namespace == NS_RECEIVER:
+            if kind == 'SET_VOLUME':
+                volume = data.get('volume', {})
+                if 'muted' in volume:
+                    self.muted = bool(volume['muted'])
+                    self.commands['mute' if self.muted else 'unmute'] += 1
+                if 'level' in volume:
+                    self.volume_level = float(volume['level'])
+                connection.send(PLATFORM_ID, source, NS_RECEIVER, self.receiver_status(request_id))
+                # Other clients hear about the change too
+                for other in self.connections:
+                    if other is not connection:
+                        other.send(PLATFORM_ID, '*', NS_RECEIVER, self.receiver_status())
+            elif kind in ('GET_STATUS', 'LAUNCH', 'STOP'):
+                connection.send(PLATFORM_ID, source, NS_RECEIVER, self.receiver_status(request_id))
+            elif kind == 'GET_APP_AVAILABILITY':
+                availability = {app: 'APP_AVAILABLE' for app in data.get('appId', [])}
+                connection.send(PLATFORM_ID, source, NS_RECEIVER,
+                                {'requestId': request_id, 'availability': availability})
+
+        elif message.namespace == NS_MEDIA and destination == self.transport_id:
+            if kind in ('PAUSE', 'PLAY', 'STOP'):
+                self.player_state = {'PAUSE': 'PAUSED', 'PLAY': 'PLAYING', 'STOP': 'IDLE'}[kind]
+                if kind == 'PAUSE':
+                    self.commands['pause'] += 1
+                self.broadcast_media_status()
+            if kind in ('GET_STATUS', 'PAUSE', 'PLAY', 'STOP'):
+                connection.send(self.transport_id, source, NS_MEDIA, self.media_status(request_id))
+
+    # Scheduled activity
+
+    async def play_schedule(self):
+        """Change title every interval seconds, sometimes switching app as well."""
+        await asyncio.sleep(random.uniform(0, self.interval))
+        while True:
+            if random.random() < 0.2:
+                self.app_id, self.display_name = random.choice(APPS)
+                self.session_id = str(uuid.uuid4())
+                self.broadcast_receiver_status()
+            self.title = random.choice(self.titles)
+            self.player_state = 'PLAYING'
+            self.media_session_id += 1
+            self.broadcast_media_status()
+            await asyncio.sleep(self.interval * random.uniform(0.8, 1.2))
+
+    def service_info(self):
+        from zeroconf import ServiceInfo
+
+        return ServiceInfo(
+            '_googlecast._tcp.local.',
+            f'Chromecast-{self.uuid.hex}._googlecast._tcp.local.',
+            addresses=[socket.inet_aton(self.host)],
+            port=CAST_PORT,
+            properties={'id': self.uuid.hex, 'md': 'Chromecast', 'fn': self.name,
+                        've': '05', 'ca': '4101', 'st': '0', 'rs': ''},
+            server=f'{self.uuid.hex}.local.',
+        )
+
+    def cast_info(self):
+        """CastInfo for connecting without mDNS."""
+        from pychromecast.models import CastInfo, HostServiceInfo
+
+        return CastInfo({HostServiceInfo(self.host, CAST_PORT)}, self.uuid, 'Chromecast',
+                        self.name, self.host, CAST_PORT, 'cast', 'Google Inc.')
+
+
+async def run_fleet(devices, advertise=True, ready=None):
+    """Serve every device until cancelled; ready() is called once they are listening."""
+    context = tls_context()
+    servers = [await device.serve(context) for device in devices]
+    schedules = [asyncio.create_task(device.play_schedule()) for device in devices]
+
+    zeroconf = None
+    if advertise:
+        from zeroconf.asyncio import AsyncZeroconf
+
+        zeroconf = AsyncZeroconf()
+        await asyncio.gather(*(zeroconf.async_register_service(device.service_info())
+                               for device in devices))
+    if ready:
+        ready()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for task in schedules:
+            task.cancel()
+        for server in servers:
+            server.close()
+        if zeroconf:
+            await zeroconf.async_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='Mean seconds between title changes on each device')
+    parser.add_argument('--no-mdns', action='store_true',
+                        help='Do not advertise the devices over zeroconf')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    # Stop cleanly on SIGTERM too, so the zeroconf records are withdrawn
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    devices = [VirtualDevice(i, interval=args.interval) for i in range(args.devices)]
+    for device in devices:
+        print(f'{device.name} at {device.host}:{CAST_PORT} ({device.uuid})', flush=True)
+    try:
+        asyncio.run(run_fleet(devices, advertise=not args.no_mdns,
+                              ready=lambda: print('READY', flush=True)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""In-process stand-in for pychromecast.Chromecast used by the benchmarks."""
+
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+class FakeMediaController:
+    def __init__(self, cast):
+        self.cast = cast
+        self.status = SimpleNamespace(media_metadata={}, player_state='IDLE', media_session_id=None)
+        self.listeners = []
+
+    def register_status_listener(self, listener):
+        self.listeners.append(listener)
+
+    def pause(self):
+        # A real device answers with a fresh media status
+        self.cast.set_media(SimpleNamespace(**{**vars(self.status), 'player_state': 'PAUSED'}))
+
+    def send_message(self, data, inc_session_id=False, callback_function=None):
+        if data['type'] == 'PAUSE':
+            self.cast.respond(self.pause, callback_function, {'type': 'MEDIA_STATUS'})
+
+
+class FakeReceiverController:
+    def __init__(self, cast):
+        self.cast = cast
+
+    def send_message(self, data, inc_session_id=False, callback_function=None):
+        if data['type'] == 'SET_VOLUME':
+            self.cast.respond(lambda: self.cast.set_volume_muted(data['volume']['muted']),
+                              callback_function, {'type': 'RECEIVER_STATUS'})
+
+    def stop_app(self, callback_function=None):
+        self.cast.respond(self.cast.stop_media, callback_function, {'type': 'RECEIVER_STATUS'})
+
+
+class FakeChromecast:
+    """Just enough of pychromecast.Chromecast for the monitors and the supervisor."""
+
+    def __init__(self, name='Fake Chromecast', round_trip=0.02):
+        self.name = name
+        self.round_trip = round_trip
+        self.uuid = uuid.uuid4()
+        self.status = SimpleNamespace(app_id='CC1AD845', display_name='Default Media Receiver',
+                                      volume_level=0.5, volume_muted=False)
+        self.media_controller = FakeMediaController(self)
+        self.socket_client = SimpleNamespace(is_connected=True, retry_wait=5,
+                                             heartbeat_controller=None,
+                                             receiver_controller=FakeReceiverController(self))
+        self.listeners = []
+        self.connection_listeners = []
+        self.muted_event = threading.Event()
+        self.muted_at = None
+
+    def start(self):
+        pass
+
+    def wait(self, timeout=None):
+        pass
+
+    def disconnect(self, timeout=None):
+        pass
+
+    def register_handler(self, handler):
+        pass
+
+    def register_status_listener(self, listener):
+        self.listeners.append(listener)
+
+    def register_connection_listener(self, listener):
+        self.connection_listeners.append(listener)
+
+    def set_connection_status(self, status):
+        """Report a connection state change as the socket client would."""
+        self.socket_client.is_connected = status == 'CONNECTED'
+        for listener in self.connection_listeners:
+            listener.new_connection_status(SimpleNamespace(status=status, address=None))
+
+    def respond(self, apply, callback, reply):
+        """Carry out a command half a round trip from now and acknowledge it after a full one."""
+        def run():
+            time.sleep(self.round_trip / 2)
+            apply()
+            time.sleep(self.round_trip / 2)
+            if callback:
+                callback(True, reply)
+
+        threading.Thread(target=run, name='fake-cast-reply', daemon=True).start()
+
+    def set_volume_muted(self, muted):
+        if muted:
+            self.muted_at = time.monotonic()
+            self.muted_event.set()
+        # A real device answers volume changes with a fresh receiver status
+        self.status = SimpleNamespace(**{**vars(self.status), 'volume_muted': muted})
+        for listener in self.listeners:
+            listener.new_cast_status(self.status)
+
+    def play_title(self, title):
+        """Switch to a new title and deliver the status as the socket thread would."""
+        self.muted_event.clear()
+        return self.set_media(SimpleNamespace(media_metadata={'title': title}, player_state='PLAYING'))
+
+    def play_video(self, video_id, title=None):
+        """Play a YouTube video the way the YouTube receiver reports it, maybe without a title."""
+        self.muted_event.clear()
+        return self.set_media(SimpleNamespace(media_metadata={'title': title} if title else {},
+                                              player_state='PLAYING', content_id=video_id))
+
+    def resume(self):
+        """Carry on playing whatever is paused."""
+        status = self.media_controller.status
+        return self.set_media(SimpleNamespace(**{**vars(status), 'player_state': 'PLAYING'}))
+
+    def stop_media(self):
+        self.set_media(SimpleNamespace(media_metadata={}, player_state='IDLE'))
+        self.set_volume_muted(False)
+
+    def set_media(self, status):
+        if not hasattr(status, 'media_session_id'):
+            status.media_session_id = None if status.player_state == 'IDLE' else 1
+        self.media_controller.status = status
+        changed_at = time.monotonic()
+        for listener in self.media_controller.listeners:
+            listener.new_media_status(status)
+        return changed_at
+
+    def launch_app(self, app_id, display_name):
+        """Switch to another app and deliver the receiver status."""
+        self.status = SimpleNamespace(**{**vars(self.status), 'app_id': app_id,
+                                         'display_name': display_name})
+        changed_at = time.monotonic()
+        for listener in self.listeners:
+            listener.new_cast_status(self.status)
+        return changed_at
+
+    def play_script(self, steps):
+        """
+        Replay (offset_seconds, method_name, args) steps at their offsets on a
+        background thread, the way status messages arrive on the socket thread.
+        Returns the thread and a list that fills with (step, changed_at).
+        """
+        timeline = []
+
+        def run():
+            started = time.monotonic()
+            for offset, method, args in sorted(steps, key=lambda step: step[0]):
+                delay = started + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                timeline.append(((offset, method, args), getattr(self, method)(*args)))
+
+        thread = threading.Thread(target=run, name='fake-cast-script', daemon=True)
+        thread.start()
+        return thread, timeline
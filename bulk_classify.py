@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+import collections
+import csv
+import gzip
+import html.parser
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import rule_engine
+
+# Titles per task sent to a worker; large enough that pickling is cheap next to matching
+BATCH_SIZE = 2000
+
+# Batches queued per worker; together with BATCH_SIZE this bounds memory
+BATCHES_PER_WORKER = 4
+
+# Seconds between progress lines on stderr
+PROGRESS_INTERVAL = 10
+
+# Fields classified unless --field says otherwise; missing ones are skipped
+DEFAULT_FIELDS = ('title', 'channel')
+
+# Rows are past plays, so rules limited to playing media apply to them
+ROW_PLAYER_STATE = 'PLAYING'
+
+FORMATS = ('jsonl', 'csv', 'json', 'html')
+
+# The watch history export puts this in front of every title
+WATCHED_PREFIX = 'Watched '
+
+# Compiled once per worker process by init_worker()
+table = None
+
+
+def detect_format(path):
+    """Guess the input format from the file name: .jsonl/.ndjson, .csv, .json or .html, maybe .gz."""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for extension, fmt in (('.jsonl', 'jsonl'), ('.ndjson', 'jsonl'), ('.csv', 'csv'),
+                           ('.json', 'json'), ('.html', 'html'), ('.htm', 'html')):
+        if name.endswith(extension):
+            return fmt
+    return 'jsonl'
+
+
+def open_text(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    return open(path, encoding='utf-8', errors='replace', newline='')
+
+
+def watch_entry(entry):
+    """A record from one entry of the YouTube watch history export (JSON)."""
+    title = entry.get('title') or ''
+    if title.startswith(WATCHED_PREFIX):
+        title = title[len(WATCHED_PREFIX):]
+    subtitles = entry.get('subtitles') or [{}]
+    return {'title': title, 'channel': subtitles[0].get('name'), 'time': entry.get('time'),
+            'url': entry.get('titleUrl')}
+
+
+def read_jsonl(f):
+    """Yield a record per line; a line that is not valid JSON yields None and is skipped."""
+    for line in f:
+        line = line.strip()
+        if line:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield record if isinstance(record, dict) else {'title': str(record)}
+
+
+def read_csv(f):
+    yield from csv.DictReader(f)
+
+
+def read_json_array(f, chunk_size=1 << 16):
+    """
+    Yield the items of a JSON array one at a time, reading chunk_size
+    characters at once, so a watch history of any length fits in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array, as in watch-history.json')
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            if position == len(buffer):
+                raise json.JSONDecodeError('Need more', buffer, position)
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError('The JSON array ends early')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if isinstance(item, dict) and ('titleUrl' in item or 'header' in item):
+            yield watch_entry(item)
+        else:
+            yield item if isinstance(item, dict) else {'title': str(item)}
+
+
+class WatchHistoryParser(html.parser.HTMLParser):
+    """
+    Pull the video and channel links out of watch-history.html. Each entry
+    links the video, then (unless it was removed) its channel.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = collections.deque()
+        self.current = None
+        self.link = None
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self.link = dict(attrs).get('href') or ''
+            self.text = []
+
+    def handle_data(self, data):
+        if self.link is not None:
+            self.text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag != 'a' or self.link is None:
+            return
+        text = ''.join(self.text).strip()
+        if '/watch?' in self.link:
+            self.flush()
+            self.current = {'title': text, 'channel': None, 'url': self.link}
+        elif self.current is not None and self.current['channel'] is None:
+            self.current['channel'] = text
+        self.link = None
+
+    def flush(self):
+        if self.current is not None:
+            self.records.append(self.current)
+            self.current = None
+
+
+def read_html(f, chunk_size=1 << 16):
+    parser = WatchHistoryParser()
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            parser.close()
+            parser.flush()
+        else:
+            parser.feed(chunk)
+        while parser.records:
+            yield parser.records.popleft()
+        if not chunk:
+            return
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv, 'json': read_json_array, 'html': read_html}
+
+
+def read_batches(records, fields, size=BATCH_SIZE):
+    """
+    Group records into lists of (row, {field: text}) with only the fields
+    asked for. A record the reader could not parse comes out as (row, None).
+    """
+    batch = []
+    for row, record in enumerate(records, 1):
+        if record is None:
+            batch.append((row, None))
+        else:
+            batch.append((row, {field: str(record[field]) for field in fields if record.get(field)}))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def init_worker(rules):
+    global table
+    table = rule_engine.DecisionTable(rules)
+
+
+def classify_batch(batch):
+    """
+    Run every row of a batch through the rules. Returns (JSON lines, rows,
+    rows acted on, rows skipped, rows per action, per rule and per matched
+    term), so only text and small counts travel back from the worker.
+    """
+    lines = []
+    blocked = 0
+    skipped = 0
+    per_action = collections.Counter()
+    per_rule = collections.Counter()
+    per_term = collections.Counter()
+    for row, texts in batch:
+        if texts is None:
+            skipped += 1
+            lines.append(json.dumps({'row': row, 'skipped': 'not valid JSON'}))
+            continue
+        action, rule, reason, term = table.explain({'player_state': ROW_PLAYER_STATE, **texts})
+        action = action or 'allow'
+        per_action[action] += 1
+        if action != 'allow':
+            blocked += 1
+        if reason:
+            per_rule[rule or reason] += 1
+        if term:
+            per_term[term] += 1
+        lines.append(json.dumps({'row': row, **texts, 'verdict': action, 'rule': rule,
+                                 'reason': reason or None, 'matched': term}, ensure_ascii=False))
+    lines.append('')
+    return '\n'.join(lines), len(batch) - skipped, blocked, skipped, per_action, per_rule, per_term
+
+
+def classify_file(path, output, rules, fmt=None, fields=DEFAULT_FIELDS, workers=None,
+                  progress=None):
+    """
+    Stream the records in path through the rules (plain dicts, as from
+    web_server.get_rules()) and write a JSON line per record to output,
+    with the action, the rule that decided it and the term it matched.
+    Rows that cannot be parsed are counted and skipped. Work is spread
+    over a pool of worker processes (os.cpu_count() by default; 1
+    classifies in this process) and at most BATCHES_PER_WORKER batches per
+    worker are in flight, so memory stays flat however long the input is.
+    progress(summary) is called every PROGRESS_INTERVAL seconds. Returns
+    the summary.
+    """
+    fmt = fmt or detect_format(path)
+    workers = workers or os.cpu_count() or 1
+    summary = {'rows': 0, 'blocked': 0, 'skipped': 0, 'actions': collections.Counter(),
+               'rules': collections.Counter(), 'terms': collections.Counter(), 'seconds': 0.0}
+    started = time.perf_counter()
+    reported = started
+
+    def collect(result):
+        nonlocal reported
+        lines, rows, blocked, skipped, per_action, per_rule, per_term = result
+        output.write(lines)
+        summary['rows'] += rows
+        summary['blocked'] += blocked
+        summary['skipped'] += skipped
+        summary['actions'].update(per_action)
+        summary['rules'].update(per_rule)
+        summary['terms'].update(per_term)
+        now = time.perf_counter()
+        summary['seconds'] = now - started
+        if progress and now - reported >= PROGRESS_INTERVAL:
+            reported = now
+            progress(summary)
+
+    with open_text(path) as f:
+        batches = read_batches(READERS[fmt](f), fields)
+        if workers == 1:
+            init_worker(rules)
+            for batch in batches:
+                collect(classify_batch(batch))
+        else:
+            # Workers start from a clean process rather than a fork of this
+            # one, which may already be running threads (the config watcher)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                     initargs=(rules,)) as pool:
+                pending = collections.deque()
+                for batch in batches:
+                    pending.append(pool.submit(classify_batch, batch))
+                    if len(pending) >= workers * BATCHES_PER_WORKER:
+                        collect(pending.popleft().result())
+                while pending:
+                    collect(pending.popleft().result())
+    summary['seconds'] = time.perf_counter() - started
+    return summary
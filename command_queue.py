@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import logging
+import random
+import threading
+import time
+
+import metrics
+from timer_queue import timers
+
+logger = logging.getLogger(__name__)
+
+# Commands each rule action sends, all at once
+ACTION_COMMANDS = {
+    'block': ('pause', 'mute'),
+    'mute': ('mute',),
+    'pause': ('pause',),
+    'quit': ('quit',),
+}
+
+# Commands that undo each other; sending one drops the other
+OPPOSITES = {'mute': 'unmute', 'unmute': 'mute'}
+
+# Replies that answer the request but mean it failed
+ERROR_REPLIES = ('INVALID_REQUEST', 'INVALID_PLAYER_STATE', 'LOAD_FAILED', 'LOAD_CANCELLED')
+
+ACK_TIMEOUT = 5.0
+MAX_ATTEMPTS = 4
+BASE_DELAY = 0.25
+
+# One queue per device, shared by every monitor that talks to it
+queues = {}
+queues_lock = threading.Lock()
+
+
+class NothingToDo(Exception):
+    """The command does not apply to what the device is doing, so it is not retried."""
+
+
+class Command:
+    """One command on its way to a device, and everyone waiting to hear how it went."""
+
+    __slots__ = ('name', 'attempt', 'submitted_at', 'callbacks', 'done', 'ok', 'timer')
+
+    def __init__(self, name):
+        self.name = name
+        self.attempt = 0
+        self.submitted_at = time.monotonic()
+        self.callbacks = []
+        self.done = threading.Event()
+        self.ok = None
+        self.timer = None
+
+    def wait(self, timeout=None):
+        """Block until the command is acknowledged or given up on. Returns ok."""
+        self.done.wait(timeout)
+        return self.ok
+
+
+class CommandQueue:
+    """
+    Send mute, unmute, pause and quit to one device without waiting for it.
+
+    Commands go out as soon as they are submitted, each with a pychromecast
+    response callback, so pausing and muting together costs one round trip
+    rather than two plus a sleep. Submitting a command that is already on
+    its way joins it instead of sending it again, and mute and unmute cancel
+    each other. Failed or unanswered commands are retried with exponential
+    backoff on the shared timer queue; nothing here ever blocks the caller.
+    """
+
+    __slots__ = ('chromecast', 'ack_timeout', 'max_attempts', 'base_delay', 'lock', 'pending')
+
+    def __init__(self, chromecast, ack_timeout=ACK_TIMEOUT, max_attempts=MAX_ATTEMPTS,
+                 base_delay=BASE_DELAY):
+        self.chromecast = chromecast
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.lock = threading.Lock()
+        self.pending = {}  # name -> Command
+
+    @classmethod
+    def for_chromecast(cls, chromecast):
+        """Return the device's queue, creating it on first use."""
+        key = getattr(chromecast, 'uuid', None) or id(chromecast)
+        with queues_lock:
+            queue = queues.get(key)
+            if queue is None or queue.chromecast is not chromecast:
+                queue = queues[key] = cls(chromecast)
+            return queue
+
+    def submit(self, name, callback=None):
+        """
+        Send a command unless it is already on its way. callback(command) runs
+        once it is acknowledged or given up on. Returns the Command.
+        """
+        superseded = None
+        with self.lock:
+            command = self.pending.get(name)
+            joined = command is not None
+            if not joined:
+                command = self.pending[name] = Command(name)
+                superseded = self.pending.pop(OPPOSITES.get(name), None)
+            if callback:
+                command.callbacks.append(callback)
+        if superseded:
+            self._finish(superseded, False, superseded.attempt)
+        if not joined:
+            self._send(command)
+        return command
+
+    def submit_all(self, names, callback=None):
+        """Send several commands back to back; callback(results) runs once all are settled."""
+        names = list(names)
+        results = {}
+        lock = threading.Lock()
+
+        def settled(command):
+            with lock:
+                results[command.name] = command.ok
+                finished = len(results) == len(names)
+            if finished and callback:
+                callback(results)
+
+        if not names and callback:
+            callback(results)
+        return [self.submit(name, settled) for name in names]
+
+    def is_pending(self, name):
+        return name in self.pending
+
+    # Talking to the device
+
+    def _send(self, command):
+        attempt = command.attempt
+        answered = lambda sent, response: self._answered(command, attempt, sent, response)
+        command.timer = timers.call_later(self.ack_timeout, self._answered,
+                                          command, attempt, False, None)
+        try:
+            self._transmit(command.name, answered)
+        except NothingToDo as e:
+            logger.info(f"[{self.chromecast.name}] Not sending {command.name}: {e}")
+            self._finish(command, False, attempt)
+        except Exception as e:
+            # pychromecast has usually called back with a failure already
+            logger.debug(f"[{self.chromecast.name}] Sending {command.name} failed: {e}")
+            self._answered(command, attempt, False, None)
+
+    def _transmit(self, name, callback):
+        chromecast = self.chromecast
+        if name in ('mute', 'unmute'):
+            chromecast.socket_client.receiver_controller.send_message(
+                {'type': 'SET_VOLUME', 'volume': {'muted': name == 'mute'}},
+                callback_function=callback)
+        elif name == 'pause':
+            media = chromecast.media_controller
+            if media.status is None or media.status.media_session_id is None:
+                raise NothingToDo("no media session")
+            media.send_message({'type': 'PAUSE', 'mediaSessionId': media.status.media_session_id},
+                               inc_session_id=True, callback_function=callback)
+        elif name == 'quit':
+            chromecast.socket_client.receiver_controller.stop_app(callback_function=callback)
+        else:
+            raise ValueError(f"Unknown command {name}")
+
+    def _answered(self, command, attempt, sent, response):
+        """pychromecast's response callback, or the ack timeout firing."""
+        if command.done.is_set() or command.attempt != attempt:
+            return  # A late answer to an earlier attempt
+        ok = bool(sent) and not (response and response.get('type') in ERROR_REPLIES)
+        if ok or attempt + 1 >= self.max_attempts:
+            self._finish(command, ok, attempt)
+            return
+        with self.lock:
+            if self.pending.get(command.name) is not command:
+                return  # Superseded meanwhile
+            command.attempt += 1
+        if command.timer:
+            command.timer.cancel()
+        delay = self.base_delay * 2 ** attempt * random.uniform(0.8, 1.2)
+        metrics.command_retries_total.labels(command.name).inc()
+        logger.info(f"[{self.chromecast.name}] {command.name} failed, retrying in {delay:.2f}s")
+        timers.call_later(delay, self._send, command)
+
+    def _finish(self, command, ok, attempt):
+        with self.lock:
+            if command.done.is_set() or command.attempt != attempt:
+                return
+            command.ok = ok
+            command.done.set()
+            if self.pending.get(command.name) is command:
+                del self.pending[command.name]
+        if command.timer:
+            command.timer.cancel()
+        metrics.count_command(command.name, ok)
+        if ok:
+            metrics.command_ack_seconds.labels(command.name).observe(
+                time.monotonic() - command.submitted_at)
+        for callback in command.callbacks:
+            try:
+                callback(command)
+            except Exception as e:
+                logger.error(f"Error in {command.name} callback: {e}")
+
+
+def forget(chromecast):
+    """Drop a device's queue, e.g. when it goes away."""
+    key = getattr(chromecast, 'uuid', None) or id(chromecast)
+    with queues_lock:
+        queues.pop(key, None)
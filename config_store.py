@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the config file for edits made outside the web interface
+WATCH_INTERVAL = 2.0
+
+
+def freeze(value):
+    """Return a read-only copy of a JSON value: dicts become mappings, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Inverse of freeze(), for writing back to JSON."""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class ConfigSnapshot:
+    """
+    One immutable generation of the configuration.
+    Readers grab store.snapshot once and use it without locking; a change
+    produces a new snapshot instead of modifying this one.
+    """
+
+    __slots__ = ('generation', 'settings')
+
+    def __init__(self, generation, settings):
+        self.generation = generation
+        self.settings = freeze(settings)
+
+    @property
+    def keywords(self):
+        return self.settings.get('keywords', ())
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+
+class ConfigStore:
+    """
+    Blocker configuration backed by a JSON file.
+
+    Saves write a temporary file, fsync it and rename it over the old one, so a
+    crash leaves either the old or the new config, never half of one, and
+    unchanged settings are never rewritten. Every change bumps a generation
+    counter that consumers can compare to rebuild derived state only when
+    needed. Edits made to the file by hand are picked up by a cheap mtime check.
+    """
+
+    def __init__(self, path, defaults=None):
+        self.path = path
+        self.defaults = dict(defaults or {})
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.snapshot = ConfigSnapshot(0, self.defaults)
+        self._file_state = None
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def subscribe(self, callback):
+        """Call callback(snapshot) after every change, from the thread that made it."""
+        self.listeners.append(callback)
+
+    def _notify(self, snapshot):
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Error in config listener: {e}")
+
+    # Reading
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def load(self):
+        """Read the file, publishing a new snapshot if it differs. Returns the snapshot."""
+        if self.path is None:
+            return self.snapshot
+        with self.lock:
+            state = self._stat()
+            if state is None or state == self._file_state:
+                return self.snapshot
+            # Whatever happens, do not read this version of the file again
+            self._file_state = state
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                if not isinstance(data, dict):
+                    raise ValueError("config must be a JSON object")
+                generation = int(data.pop('generation', 0))
+            except (OSError, ValueError, TypeError) as e:
+                # Most likely a half-finished manual edit; keep what we have
+                logger.error(f"Error loading config: {e}")
+                return self.snapshot
+
+            current = self.snapshot
+            settings = {**self.defaults, **data}
+            if freeze(settings) == current.settings and current.generation:
+                return current
+            # A hand edit does not bump the counter, but it is still a new generation
+            snapshot = ConfigSnapshot(max(generation, current.generation + 1), settings)
+            self.snapshot = snapshot
+        logger.info(f"Loaded config generation {snapshot.generation} from {self.path}")
+        self._notify(snapshot)
+        return snapshot
+
+    # Writing
+
+    def update(self, **changes):
+        """Apply changes, save them and publish a new snapshot. Returns the snapshot."""
+        with self.lock:
+            current = self.snapshot
+            settings = {**thaw(current.settings), **changes}
+            if freeze(settings) == current.settings:
+                return current
+            snapshot = ConfigSnapshot(current.generation + 1, settings)
+            if self.path is not None:
+                self._write(snapshot)
+            self.snapshot = snapshot
+        self._notify(snapshot)
+        return snapshot
+
+    def _write(self, snapshot):
+        data = {'generation': snapshot.generation, **thaw(snapshot.settings)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # Make the rename itself durable
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            self._file_state = self._stat()
+            logger.info(f"Saved config generation {snapshot.generation}")
+        except OSError as e:
+            logger.error(f"Error saving config: {e}")
+
+    # Hot reload
+
+    def start_watching(self, interval=WATCH_INTERVAL):
+        """Reload the file in the background whenever its mtime, size or inode changes."""
+        if self.path is None or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                         name='config-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            if self._stat() != self._file_state:
+                self.load()
+
+    def stop_watching(self):
+        self._stop.set()
+        self._watcher = None
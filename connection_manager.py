@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import logging
+import random
+import threading
+import time
+
+from pychromecast.socket_client import (
+    CONNECTION_STATUS_CONNECTED,
+    CONNECTION_STATUS_DISCONNECTED,
+    CONNECTION_STATUS_FAILED,
+    CONNECTION_STATUS_FAILED_RESOLVE,
+    CONNECTION_STATUS_LOST,
+)
+
+import event_bus
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which the device cannot be talked to until it reconnects
+LOSS_STATUSES = (CONNECTION_STATUS_LOST, CONNECTION_STATUS_FAILED,
+                 CONNECTION_STATUS_FAILED_RESOLVE, CONNECTION_STATUS_DISCONNECTED)
+
+# Every managed device, keyed by uuid, so the web interface can report on them
+managers = {}
+managers_lock = threading.Lock()
+
+
+class ConnectionManager:
+    """
+    Track a Chromecast's connection health from pychromecast's own events.
+
+    The socket client already notices dead connections through the heartbeat
+    channel and reconnects by itself, so a healthy connection is left alone.
+    After each failed attempt the retry delay it sleeps for is replaced with
+    a jittered exponential backoff, reset once the connection is back.
+    pychromecast only calls new_connection_status(), so there is no need to
+    derive from its listener class.
+    """
+
+    __slots__ = ('chromecast', 'name', 'base_delay', 'max_delay', 'lock', 'state',
+                 'connected_since', 'lost_at', 'ever_connected', 'failed_attempts',
+                 'reconnects', 'losses', 'disconnected_seconds')
+
+    def __init__(self, chromecast, base_delay=1.0, max_delay=60.0):
+        self.chromecast = chromecast
+        self.name = chromecast.name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+
+        self.state = 'CONNECTING'
+        self.connected_since = None
+        self.lost_at = None
+        self.ever_connected = False
+        self.failed_attempts = 0
+        self.reconnects = 0
+        self.losses = 0
+        self.disconnected_seconds = 0.0
+
+        socket_client = chromecast.socket_client
+        socket_client.retry_wait = base_delay
+        # Status callbacks run on the socket thread; name it after the device for profiles
+        socket_client.name = f'cast {self.name}'
+        if socket_client.is_connected:
+            self._connected(time.monotonic())
+        chromecast.register_connection_listener(self)
+
+    @classmethod
+    def for_chromecast(cls, chromecast):
+        """Return the manager for chromecast, creating it on first use."""
+        with managers_lock:
+            manager = managers.get(chromecast.uuid)
+            if manager is None or manager.chromecast is not chromecast:
+                manager = cls(chromecast)
+                managers[chromecast.uuid] = manager
+            return manager
+
+    @property
+    def connected(self):
+        return self.state == CONNECTION_STATUS_CONNECTED
+
+    def next_delay(self):
+        """Exponential backoff with full jitter, capped at max_delay."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** self.failed_attempts)
+        return random.uniform(self.base_delay, max(self.base_delay, ceiling))
+
+    def new_connection_status(self, status):
+        """Called by pychromecast on every connection state change."""
+        now = time.monotonic()
+        with self.lock:
+            changed = status.status != self.state
+            if status.status == CONNECTION_STATUS_CONNECTED:
+                self._connected(now)
+            elif status.status in LOSS_STATUSES:
+                if self.lost_at is None and self.ever_connected:
+                    self.lost_at = now
+                    self.losses += 1
+                    metrics.connection_losses_total.inc()
+                    logger.warning(f"Lost connection to {self.name}: {status.status}")
+                self.connected_since = None
+                if status.status in (CONNECTION_STATUS_FAILED, CONNECTION_STATUS_FAILED_RESOLVE):
+                    self.failed_attempts += 1
+                    delay = self.next_delay()
+                    self.chromecast.socket_client.retry_wait = delay
+                    logger.info(f"Retrying {self.name} in {delay:.1f}s (attempt {self.failed_attempts})")
+            self.state = status.status
+        if changed:
+            event_bus.publish('connection', device=self.name, state=status.status)
+
+    def _connected(self, now):
+        if self.lost_at is not None:
+            self.disconnected_seconds += now - self.lost_at
+            self.reconnects += 1
+            metrics.reconnects_total.inc()
+            logger.info(f"Reconnected to {self.name} after {now - self.lost_at:.1f}s")
+        self.lost_at = None
+        self.ever_connected = True
+        self.connected_since = now
+        self.failed_attempts = 0
+        self.state = CONNECTION_STATUS_CONNECTED
+        self.chromecast.socket_client.retry_wait = self.base_delay
+
+    def heartbeat_age(self):
+        """Seconds since the device last answered a heartbeat, if known."""
+        heartbeat = getattr(self.chromecast.socket_client, 'heartbeat_controller', None)
+        if heartbeat is None:
+            return None
+        return max(0.0, time.time() - heartbeat.last_pong)
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            disconnected = self.disconnected_seconds
+            if self.lost_at is not None:
+                disconnected += now - self.lost_at
+            heartbeat_age = self.heartbeat_age()
+            return {
+                'device': self.name,
+                'state': self.state,
+                'uptime_seconds': round(now - self.connected_since, 1) if self.connected_since else 0,
+                'reconnects': self.reconnects,
+                'connection_losses': self.losses,
+                'failed_attempts': self.failed_attempts,
+                'disconnected_seconds': round(disconnected, 1),
+                'heartbeat_age_seconds': round(heartbeat_age, 1) if heartbeat_age is not None else None,
+            }
+
+
+def all_stats():
+    """Return connection stats for every managed device."""
+    with managers_lock:
+        current = list(managers.values())
+    return [manager.stats() for manager in current]
+
+
+def forget(chromecast):
+    """Stop reporting on a device that has gone away."""
+    with managers_lock:
+        manager = managers.get(chromecast.uuid)
+        if manager is not None and manager.chromecast is chromecast:
+            del managers[chromecast.uuid]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'device_cache.json'
+
+
+class DeviceCache:
+    """
+    Remember cast devices between runs so startup can skip mDNS discovery.
+    Each entry holds what pychromecast needs to connect straight to the host;
+    a background CastBrowser keeps the entries current and moves live
+    connections to a device's new address when its IP changes.
+    """
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = self._load()
+        self.watched = {}  # uuid -> Chromecast to repoint when its address changes
+        self.browser = None
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    return json.load(f).get('devices', {})
+        except Exception as e:
+            logger.error(f"Error loading device cache: {e}")
+        return {}
+
+    def _save(self):
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'devices': self.entries}, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving device cache: {e}")
+
+    def cast_infos(self):
+        """Return a CastInfo for every cached device, most recently seen first."""
+        from pychromecast.models import CastInfo, HostServiceInfo
+
+        infos = []
+        with self.lock:
+            entries = sorted(self.entries.items(), key=lambda item: item[1].get('seen', 0),
+                             reverse=True)
+        for uuid, entry in entries:
+            try:
+                infos.append(CastInfo(
+                    services={HostServiceInfo(entry['host'], entry['port'])},
+                    uuid=UUID(uuid),
+                    model_name=entry.get('model_name'),
+                    friendly_name=entry.get('friendly_name'),
+                    host=entry['host'],
+                    port=entry['port'],
+                    # Stored so pychromecast does not have to ask the device over HTTP
+                    cast_type=entry.get('cast_type'),
+                    manufacturer=entry.get('manufacturer'),
+                ))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Skipping bad device cache entry {uuid}: {e}")
+        return infos
+
+    def remember(self, cast_info):
+        """Store a discovered device. Returns True if its address changed."""
+        key = str(cast_info.uuid)
+        entry = {
+            'host': cast_info.host,
+            'port': cast_info.port,
+            'friendly_name': cast_info.friendly_name,
+            'model_name': cast_info.model_name,
+            'cast_type': cast_info.cast_type,
+            'manufacturer': cast_info.manufacturer,
+        }
+        with self.lock:
+            old = self.entries.get(key, {})
+            # mDNS alone does not always identify the device type; keep what we knew
+            for field in ('cast_type', 'manufacturer'):
+                if entry[field] is None:
+                    entry[field] = old.get(field)
+            moved = bool(old) and (old.get('host'), old.get('port')) != (cast_info.host, cast_info.port)
+            changed = any(old.get(field) != value for field, value in entry.items())
+            entry['seen'] = time.time()
+            self.entries[key] = entry
+            # Only rewrite the file when something a restart would need changed
+            if changed:
+                self._save()
+        if moved:
+            logger.info(f"{cast_info.friendly_name} moved to {cast_info.host}:{cast_info.port}")
+        return moved
+
+    def forget(self, uuid):
+        with self.lock:
+            if self.entries.pop(str(uuid), None) is not None:
+                self._save()
+
+    def watch(self, chromecast):
+        """Repoint chromecast at the new address if discovery finds it has moved."""
+        self.watched[chromecast.uuid] = chromecast
+
+    # Background revalidation
+
+    def start_revalidation(self):
+        """Run zeroconf discovery in the background to keep the cache current."""
+        import zeroconf
+        from pychromecast.discovery import CastBrowser
+
+        if self.browser is None:
+            self.browser = CastBrowser(self, zeroconf.Zeroconf())
+            self.browser.start_discovery()
+        return self.browser
+
+    def add_cast(self, uuid, service):
+        """Called by the CastBrowser when a device is found."""
+        cast_info = self.browser.devices.get(uuid)
+        if cast_info is None:
+            return
+        self.remember(cast_info)
+        chromecast = self.watched.get(uuid)
+        if chromecast is not None:
+            repoint(chromecast, cast_info, self.browser.zc)
+
+    def update_cast(self, uuid, service):
+        """Called by the CastBrowser when a device's details change."""
+        self.add_cast(uuid, service)
+
+    def remove_cast(self, uuid, service, cast_info):
+        """Called by the CastBrowser when a device goes away; keep it for next boot."""
+
+    def stop_discovery(self):
+        """Stop background revalidation."""
+        if self.browser is not None:
+            self.browser.stop_discovery()
+            self.browser = None
+
+
+def repoint(chromecast, cast_info, zconf):
+    """Let a connected Chromecast reach the device at its newly discovered address."""
+    if cast_info.host == chromecast.socket_client.host and \
+            cast_info.services <= chromecast.socket_client.services:
+        return
+    # The socket client tries every known service on each reconnect
+    chromecast.socket_client.services.update(cast_info.services)
+    if chromecast.socket_client.zconf is None:
+        chromecast.socket_client.zconf = zconf
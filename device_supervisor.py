@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import command_queue
+import connection_manager
+import event_bus
+import lifecycle
+from connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceSupervisor:
+    """
+    Monitor every cast device on the network at once.
+
+    A long-running pychromecast CastBrowser reports devices as they appear and
+    disappear; each one gets its own monitor (and so its own detection state)
+    while attached. Monitors only classify on pychromecast's socket threads,
+    and all device I/O for the whole fleet runs on one small shared worker
+    pool, so adding devices does not add threads of our own. Mutes expire on
+    the shared timer queue. Reconnecting is left to pychromecast; a
+    ConnectionManager per device tracks its health.
+    """
+
+    def __init__(self, monitor_class, get_rules_func, max_workers=4, device_cache=None):
+        self.monitor_class = monitor_class
+        self.device_cache = device_cache
+        self.get_rules_func = get_rules_func
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='cast-io')
+        self.devices = {}  # uuid -> (chromecast, monitor)
+        self.lock = threading.Lock()
+        self.monitoring = False
+        self.stop_event = threading.Event()
+        self.browser = None
+        self.zconf = None
+
+    # Discovery
+
+    def start_discovery(self):
+        """Start the CastBrowser; devices attach as they are found."""
+        import zeroconf
+        from pychromecast.discovery import CastBrowser
+
+        self.zconf = zeroconf.Zeroconf()
+        self.browser = CastBrowser(self, self.zconf)
+
+        # Connect to cached devices straight away; discovery confirms them later
+        if self.device_cache:
+            for cast_info in self.device_cache.cast_infos():
+                self.executor.submit(self._attach_cast_info, cast_info)
+
+        self.browser.start_discovery()
+        logger.info("Device discovery started")
+
+    def add_cast(self, uuid, service):
+        """Called by the CastBrowser when a new device is found."""
+        # Setting up the device may block, so keep it off the zeroconf thread
+        self.executor.submit(self._add_cast, uuid)
+
+    def _add_cast(self, uuid):
+        cast_info = self.browser.devices.get(uuid)
+        if cast_info is None:
+            return
+        entry = self.devices.get(uuid)
+        if entry is not None:
+            # Attached from the cache; make sure it can follow an IP change
+            if self.device_cache:
+                from device_cache import repoint
+                self.device_cache.remember(cast_info)
+                repoint(entry[0], cast_info, self.zconf)
+            return
+        self._attach_cast_info(cast_info)
+
+    def _attach_cast_info(self, cast_info):
+        import pychromecast
+
+        if cast_info.uuid in self.devices:
+            return
+        try:
+            chromecast = pychromecast.get_chromecast_from_cast_info(cast_info, self.zconf)
+        except Exception as e:
+            logger.error(f"Could not set up {cast_info.friendly_name}: {e}")
+            return
+        if self.device_cache:
+            self.device_cache.remember(chromecast.cast_info)
+        self.attach(chromecast)
+
+    def update_cast(self, uuid, service):
+        """Called by the CastBrowser when a device's details change."""
+        self.add_cast(uuid, service)
+
+    def remove_cast(self, uuid, service, cast_info):
+        """Called by the CastBrowser when a device goes away."""
+        self.detach(uuid)
+
+    # Device lifecycle
+
+    def attach(self, chromecast):
+        """Connect to a device and start monitoring it if monitoring is on."""
+        from pychromecast.controllers.youtube import YouTubeController
+
+        monitor = self.monitor_class(chromecast, self.get_rules_func)
+        # Device I/O goes to the shared pool instead of a per-device thread
+        monitor.dispatcher = lambda action: self.executor.submit(self._perform, monitor, action)
+
+        with self.lock:
+            if chromecast.uuid in self.devices:
+                return
+            self.devices[chromecast.uuid] = (chromecast, monitor)
+
+        try:
+            chromecast.register_handler(YouTubeController())
+        except Exception as e:
+            logger.warning(f"Could not register YouTube controller for {chromecast.name}: {e}")
+        chromecast.register_status_listener(monitor)
+        chromecast.media_controller.register_status_listener(monitor)
+        ConnectionManager.for_chromecast(chromecast)
+        # Connects on pychromecast's socket thread without blocking us
+        chromecast.start()
+        logger.info(f"Attached {chromecast.name} ({len(self.devices)} device(s))")
+        event_bus.publish('device', device=chromecast.name, attached=True)
+
+        if self.monitoring:
+            monitor.start()
+
+    def detach(self, uuid):
+        """Stop monitoring a device and disconnect from it."""
+        with self.lock:
+            entry = self.devices.pop(uuid, None)
+        if entry is None:
+            return
+        chromecast, monitor = entry
+        monitor.stop()
+        connection_manager.forget(chromecast)
+        command_queue.forget(chromecast)
+        self.executor.submit(self._disconnect, chromecast)
+        logger.info(f"Detached {chromecast.name} ({len(self.devices)} device(s))")
+        event_bus.publish('device', device=chromecast.name, attached=False)
+
+    def _disconnect(self, chromecast):
+        try:
+            chromecast.disconnect(timeout=5)
+        except Exception as e:
+            logger.error(f"Error disconnecting {chromecast.name}: {e}")
+
+    def _perform(self, monitor, action):
+        try:
+            monitor.perform(action)
+        except Exception as e:
+            logger.error(f"Error handling {action[0]} on {monitor.name}: {e}")
+
+    def device_names(self):
+        with self.lock:
+            return [chromecast.name for chromecast, _ in self.devices.values()]
+
+    def monitors(self):
+        with self.lock:
+            return [monitor for _, monitor in self.devices.values()]
+
+    # Monitoring
+
+    def run(self):
+        """
+        Monitor all attached devices until stop_monitoring() is called or
+        monitoring stops. Run it through lifecycle.supervisor.start_monitoring().
+        """
+        threading.current_thread().name = 'device-supervisor'
+        self.stop_event.clear()
+        self.monitoring = True
+        for monitor in self.monitors():
+            monitor.start()
+        logger.info(f"Monitoring {len(self.devices)} device(s)")
+
+        # Everything happens on socket threads, the pool and the timer queue
+        lifecycle.supervisor.on_stop(self.stop_monitoring)
+        self.stop_event.wait()
+
+        self.monitoring = False
+        releases = [self.executor.submit(monitor.release) for monitor in self.monitors()]
+        for release in releases:
+            release.result()
+        logger.info("Stopped monitoring devices")
+
+    def stop_monitoring(self):
+        """Make run() release every device and return."""
+        self.stop_event.set()
+
+    def shutdown(self):
+        """Stop monitoring and discovery and disconnect from every device."""
+        self.stop_monitoring()
+        if self.browser:
+            try:
+                self.browser.stop_discovery()
+            except Exception as e:
+                logger.error(f"Error stopping discovery: {e}")
+        for uuid in list(self.devices):
+            self.detach(uuid)
+        self.executor.shutdown(wait=True)
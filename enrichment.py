@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from autosave import Autosaver
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'metadata_cache.json'
+
+# Any endpoint that answers GET with JSON works; {video_id} is filled in.
+# YouTube's oEmbed needs no API key but only gives the title and channel.
+DEFAULT_ENDPOINT = ('https://www.youtube.com/oembed?format=json'
+                    '&url=https://www.youtube.com/watch%3Fv%3D{video_id}')
+
+# Keep a fetch inside one 2-second polling interval
+FETCH_TIMEOUT = 1.5
+MAX_WORKERS = 4
+MAX_ENTRIES = 5000
+TTL = 7 * 24 * 3600
+SAVE_INTERVAL = 60
+RETRY_AFTER = 60  # Seconds before retrying a lookup that failed
+
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def video_id(content_id):
+    """Return the YouTube video ID in a media content ID, or None."""
+    if not content_id:
+        return None
+    if VIDEO_ID.match(content_id):
+        return content_id
+    match = re.search(r'(?:v=|youtu\.be/|/embed/|/shorts/)([A-Za-z0-9_-]{11})', content_id)
+    return match.group(1) if match else None
+
+
+def parse_metadata(data):
+    """Map an endpoint response onto the fields rules look at."""
+    if not isinstance(data, dict):
+        return {}
+    # Accept YouTube Data API style items as well as flat responses
+    if isinstance(data.get('items'), list) and data['items']:
+        data = data['items'][0].get('snippet', {})
+    tags = data.get('tags') or data.get('keywords') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return {
+        'title': data.get('title') or None,
+        'channel': data.get('channel') or data.get('channelTitle') or data.get('author_name') or None,
+        'tags': ', '.join(tag.strip() for tag in tags if tag.strip()) or None,
+        'category': str(data.get('category') or data.get('categoryId') or '') or None,
+    }
+
+
+def merge(fields, metadata):
+    """Fill in empty fields from looked-up metadata; what the device reported wins."""
+    for field, value in metadata.items():
+        if value and not fields.get(field):
+            fields[field] = value
+    return fields
+
+
+class MetadataEnricher:
+    """
+    Fill in what a YouTube media status leaves out by looking the video up.
+
+    Fetches run on a small thread pool over one keep-alive requests.Session,
+    so there are never more than max_workers requests in flight and each one
+    reuses a pooled connection. Concurrent requests for the same video share
+    one fetch. Results, including "nothing found", are kept in an LRU cache
+    with a TTL that is saved to disk, so a video is fetched once a week at
+    most. Without the requests package, enrichment is simply off.
+    """
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, path=CACHE_FILE, max_workers=MAX_WORKERS,
+                 timeout=FETCH_TIMEOUT, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.endpoint = endpoint
+        self.path = path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # video_id -> (metadata, fetched_at)
+        self.in_flight = {}  # video_id -> Future
+        self.dirty = False
+        self.fetches = 0
+        self.failures = 0
+        self._session = None
+        self._executor = None
+        self.autosaver = Autosaver(self.save, 'metadata-cache-saver')
+
+    @property
+    def enabled(self):
+        return bool(self.endpoint) and self.session is not None
+
+    @property
+    def session(self):
+        if self._session is None:
+            try:
+                import requests
+                from requests.adapters import HTTPAdapter
+            except ImportError:
+                logger.warning("requests is not installed; YouTube metadata lookups are off")
+                self.endpoint = None
+                return None
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['User-Agent'] = 'chromecast-blocker'
+            self._session = session
+        return self._session
+
+    def cached(self, video):
+        """Return cached metadata for a video ({} if it is known to have none), or None."""
+        with self.lock:
+            entry = self.entries.get(video)
+            if entry is None or time.time() - entry[1] >= self.ttl:
+                return None
+            self.entries.move_to_end(video)
+            return entry[0]
+
+    def request(self, video, callback=None):
+        """
+        Start fetching a video's metadata unless it is cached or on its way.
+        callback(video, metadata) runs on a pool thread once it is known.
+        Returns the Future, or None when enrichment is off.
+        """
+        if not self.enabled:
+            return None
+        with self.lock:
+            future = self.in_flight.get(video)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='metadata')
+                future = self._executor.submit(self._fetch, video)
+                self.in_flight[video] = future
+        if callback:
+            future.add_done_callback(lambda done: callback(video, done.result()))
+        return future
+
+    def lookup(self, video, timeout=None):
+        """Return a video's metadata, waiting up to timeout seconds for a fetch."""
+        metadata = self.cached(video)
+        if metadata is not None:
+            return metadata
+        future = self.request(video)
+        if future is None:
+            return {}
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except Exception:
+            return {}
+
+    def _fetch(self, video):
+        metadata = {}
+        try:
+            response = self.session.get(self.endpoint.format(video_id=video), timeout=self.timeout)
+            with self.lock:
+                self.fetches += 1
+            if response.status_code == 200:
+                metadata = parse_metadata(response.json())
+            elif response.status_code not in (401, 403, 404):
+                # Worth trying again next time
+                raise OSError(f"HTTP {response.status_code}")
+            self._store(video, metadata)
+        except Exception as e:
+            with self.lock:
+                self.failures += 1
+            logger.warning(f"Could not fetch metadata for {video}: {e}")
+            # Do not ask again on every status update while the endpoint is down
+            self._store(video, metadata, fetched_at=time.time() - self.ttl + RETRY_AFTER)
+        finally:
+            with self.lock:
+                self.in_flight.pop(video, None)
+        return metadata
+
+    def _store(self, video, metadata, fetched_at=None):
+        with self.lock:
+            self.entries[video] = (metadata, fetched_at or time.time())
+            self.entries.move_to_end(video)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def stats(self):
+        return {'entries': len(self.entries), 'in_flight': len(self.in_flight),
+                'fetches': self.fetches, 'failures': self.failures}
+
+    # Persistence
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            now = time.time()
+            entries = OrderedDict((video, (metadata, fetched_at))
+                                  for video, metadata, fetched_at in data.get('videos', [])
+                                  if now - fetched_at < self.ttl)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Error loading metadata cache: {e}")
+            return
+        with self.lock:
+            entries.update(self.entries)
+            self.entries = entries
+        logger.info(f"Loaded metadata for {len(entries)} videos")
+
+    def save(self):
+        if self.path is None or not self.dirty:
+            return
+        with self.lock:
+            videos = [[video, metadata, fetched_at]
+                      for video, (metadata, fetched_at) in self.entries.items()]
+            self.dirty = False
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'videos': videos}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving metadata cache: {e}")
+
+    def start_autosave(self, interval=SAVE_INTERVAL):
+        if self.path is not None:
+            self.autosaver.start(interval)
+
+    def stop_autosave(self):
+        self.autosaver.stop()
+        self.save()
+
+
+# Off until the config asks for lookups (web_server.on_config_change)
+enricher = MetadataEnricher(endpoint=None)
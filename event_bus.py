@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Events kept for browsers that reconnect with a Last-Event-ID
+HISTORY_SIZE = 50
+
+# Events buffered per subscriber before a stalled client is dropped
+SUBSCRIBER_BUFFER = 100
+
+
+class EventBus:
+    """
+    Fan out state changes to every subscribed web client.
+
+    publish() never blocks: each subscriber has a bounded queue and one that
+    stops reading is dropped instead of holding up the blocker. Subscribers
+    sleep on their queue until an event or the next heartbeat is due, so an
+    idle stream costs no CPU.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.history = deque(maxlen=history_size)
+        self.ids = itertools.count(1)
+        self.listeners = []
+
+    def publish(self, kind, **data):
+        """Send an event of the given kind to every subscriber."""
+        data['time'] = time.time()
+        with self.lock:
+            event = (next(self.ids), kind, json.dumps(data))
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for listener in self.listeners:
+            try:
+                listener(kind, data)
+            except Exception as e:
+                logger.error(f"Error in event listener: {e}")
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                logger.warning("Dropping event stream subscriber that stopped reading")
+                self.unsubscribe(subscriber)
+                end(subscriber)
+
+    def add_listener(self, callback):
+        """Also call callback(kind, data) in process for every event; it must not block."""
+        self.listeners.append(callback)
+
+    def subscribe(self, last_event_id=None):
+        """Return a queue of events, starting with any missed since last_event_id."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        with self.lock:
+            if last_event_id is not None:
+                for event in self.history:
+                    if event[0] > last_event_id:
+                        subscriber.put_nowait(event)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def since(self, last_event_id):
+        """Return (events after last_event_id still in the history, ID of the latest event)."""
+        with self.lock:
+            latest = self.history[-1][0] if self.history else 0
+            if last_event_id is None:
+                return [], latest
+            return [event for event in self.history if event[0] > last_event_id], latest
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def close(self):
+        """End every open stream, as on shutdown."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.subscribers.clear()
+        for subscriber in subscribers:
+            end(subscriber)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def stream(self, subscriber, initial=None):
+        """
+        Yield the subscriber's events formatted for Server-Sent Events.
+        initial is an optional (kind, data) snapshot sent before anything else.
+        """
+        try:
+            # Ask the browser to wait a few seconds before reconnecting
+            yield 'retry: 3000\n\n'
+            if initial is not None:
+                kind, data = initial
+                yield format_event(None, kind, json.dumps(data))
+            while True:
+                try:
+                    event = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    # Comment lines keep proxies and the browser from timing out
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield format_event(*event)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def end(subscriber):
+    """Wake a subscriber's stream so it ends instead of waiting for a heartbeat."""
+    with subscriber.mutex:
+        subscriber.queue.clear()
+        subscriber.queue.append(None)
+        subscriber.not_empty.notify()
+
+
+def format_event(event_id, kind, payload):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {kind}')
+    lines.append(f'data: {payload}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# Shared by the blocker and the web server
+bus = EventBus()
+
+
+def publish(kind, **data):
+    bus.publish(kind, **data)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import importlib.metadata
+import json
+import logging
+import queue
+import threading
+
+from waitress.buffers import OverflowableBuffer
+from waitress.channel import HTTPChannel
+
+import event_bus
+
+logger = logging.getLogger(__name__)
+
+# Bytes left unsent on one stream before a client that stopped reading is dropped
+STREAM_BUFFER = 256 * 1024
+
+KEEP_ALIVE = b': keep-alive\n\n'
+
+# EventStreamChannel works with waitress's channel internals (its request
+# list, output buffers and trigger), which can change in any release; other
+# versions get the plain WSGI stream until checked with bench_web_server.py
+TESTED_WAITRESS = '3.0'
+
+
+def waitress_version():
+    try:
+        return importlib.metadata.version('waitress')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def supported():
+    """Whether the installed waitress is the release series this module was tested with."""
+    version = waitress_version() or ''
+    return version == TESTED_WAITRESS or version.startswith(TESTED_WAITRESS + '.')
+
+
+class EventStreams:
+    """
+    Serve the Server-Sent Events stream from waitress's event loop instead
+    of its worker threads.
+
+    A request for the stream takes a worker only long enough to build the
+    first snapshot; the connection is then handed to the server's loop
+    thread, which writes to it as the socket allows. One broadcaster thread
+    reads the event bus and passes each event (or a keep-alive when the bus
+    is quiet) to the loop thread for every open stream, so open pages cost
+    no threads and never hold up the worker pool. Every write to a stream
+    happens on the loop thread, in order.
+    """
+
+    def __init__(self, server, path, snapshot, bus=event_bus.bus):
+        self.server = server
+        self.path = path
+        self.snapshot = snapshot  # Callable giving the state a fresh page starts from
+        self.bus = bus
+        self.channels = set()  # Only touched on the loop thread
+        self.lock = threading.Lock()
+        self.thread = None
+        server.channel_class = type('EventStreamChannel', (EventStreamChannel,), {'streams': self})
+
+    def __len__(self):
+        return len(self.channels)
+
+    def _start(self):
+        """Subscribe the broadcaster to the bus unless it already is."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, args=(self.bus.subscribe(),),
+                                           name='event-streams', daemon=True)
+            self.thread.start()
+
+    def _run(self, subscriber):
+        while True:
+            try:
+                events = [subscriber.get(timeout=event_bus.HEARTBEAT_INTERVAL)]
+            except queue.Empty:
+                self._later(self._keep_alive)
+                continue
+            # Whatever else is already waiting goes out in the same wakeup
+            while events[-1] is not None:
+                try:
+                    events.append(subscriber.get_nowait())
+                except queue.Empty:
+                    break
+            if events[-1] is None:
+                # The bus closed (shutdown) or dropped us; pages reconnect
+                # with their Last-Event-ID and the next one starts over
+                with self.lock:
+                    self.thread = None
+                self._later(lambda: self._send(events[:-1], close=True))
+                return
+            self._later(lambda events=events: self._send(events))
+
+    def _later(self, thunk):
+        self.server.trigger.pull_trigger(thunk)
+
+    def open(self, channel, request):
+        """Called on a worker thread with a request for the stream."""
+        try:
+            last_event_id = int(request.headers.get('LAST_EVENT_ID', ''))
+        except ValueError:
+            last_event_id = None
+        self._start()
+        head = ['retry: 3000\n\n']
+        if last_event_id is None:
+            # A fresh page gets the full state first, then what changed after it
+            _, last_event_id = self.bus.since(None)
+            head.append(event_bus.format_event(None, 'snapshot', json.dumps(self.snapshot())))
+        status = b'HTTP/1.0 200 OK' if request.version == '1.0' else b'HTTP/1.1 200 OK'
+        data = (status + b'\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                b'X-Accel-Buffering: no\r\nConnection: close\r\n\r\n' + ''.join(head).encode())
+        self._later(lambda: self._attach(channel, data, last_event_id))
+
+    def _attach(self, channel, data, last_event_id):
+        # Events published since the snapshot (or the page's last one) that
+        # the broadcaster passed on before this stream was open
+        events, channel.last_event_id = self.bus.since(last_event_id)
+        channel.push(data + ''.join(event_bus.format_event(*event) for event in events).encode())
+        self.channels.add(channel)
+
+    def _send(self, events, close=False):
+        for channel in list(self.channels):
+            if not channel.connected:
+                self.channels.discard(channel)
+                continue
+            data = ''.join(event_bus.format_event(*event) for event in events
+                           if event[0] > channel.last_event_id)
+            if data:
+                channel.last_event_id = events[-1][0]
+                channel.push(data.encode())
+            if close:
+                channel.close_when_flushed = True
+                self.channels.discard(channel)
+
+    def _keep_alive(self):
+        for channel in list(self.channels):
+            if channel.connected:
+                channel.push(KEEP_ALIVE)
+            else:
+                self.channels.discard(channel)
+
+
+class EventStreamChannel(HTTPChannel):
+    """A waitress channel that hands requests for the event stream to EventStreams."""
+
+    streams = None  # Set on the subclass each EventStreams makes
+    streaming = False
+    last_event_id = 0
+
+    def service(self):
+        request = self.requests[0]
+        if request.error or request.command != 'GET' or request.path != self.streams.path:
+            return super().service()
+        with self.requests_lock:
+            # No more requests on this connection; it only carries events now
+            self.streaming = True
+            self.requests = []
+        request.close()
+        try:
+            self.streams.open(self, request)
+        except Exception as e:
+            logger.error(f"Error opening event stream: {e}")
+            self.streams._later(self.handle_close)
+
+    def received(self, data):
+        # Anything a browser sends on an event stream is ignored
+        if self.streaming:
+            return False
+        return super().received(data)
+
+    def push(self, data):
+        """Queue data to send on the stream. Call on the loop thread only."""
+        if not self.connected:
+            return
+        if self.total_outbufs_len > STREAM_BUFFER:
+            logger.warning("Dropping event stream that stopped reading")
+            self.will_close = True
+            return
+        with self.outbuf_lock:
+            if self.current_outbuf_count >= self.adj.outbuf_high_watermark:
+                self.outbufs.append(OverflowableBuffer(self.adj.outbuf_overflow))
+                self.current_outbuf_count = 0
+            self.outbufs[-1].append(data)
+            self.current_outbuf_count += len(data)
+            self.total_outbufs_len += len(data)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = 'history.db'
+
+# Event bus kinds worth keeping
+KINDS = ('detection', 'mute', 'app', 'title')
+COLUMNS = ('device', 'app_id', 'display_name', 'title', 'action', 'reason', 'muted')
+
+FLUSH_INTERVAL = 30  # Seconds between writes to disk
+FLUSH_SIZE = 500  # Write sooner once this many events are waiting
+BUFFER_SIZE = 10000  # Events kept in memory if the disk cannot keep up
+RETENTION = 400 * 24 * 3600  # Seconds of history kept
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+CACHE_KIB = 2000  # SQLite page cache per connection (its own default)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    device TEXT,
+    app_id TEXT,
+    display_name TEXT,
+    title TEXT,
+    action TEXT,
+    reason TEXT,
+    muted INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+'''
+
+
+def parse_cursor(cursor):
+    """'time:id' from a previous page to (time, id), or raise ValueError."""
+    time_part, _, id_part = str(cursor).partition(':')
+    return float(time_part), int(id_part)
+
+
+class HistoryStore:
+    """
+    Keep detections, mutes, app changes and titles for a year or so.
+
+    Events go into an in-memory ring buffer first and are written to SQLite
+    in one transaction every FLUSH_INTERVAL seconds (sooner when a lot is
+    waiting), so a busy evening costs a handful of small writes instead of
+    one per event; the database runs in WAL mode with synchronous=NORMAL,
+    which appends to the log rather than rewriting pages. Queries read the
+    database through the time index, newest first, with a keyset cursor so
+    every page costs the same however far back it goes, and include events
+    still waiting in the buffer.
+    """
+
+    def __init__(self, path=HISTORY_FILE, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE,
+                 buffer_size=BUFFER_SIZE, retention=RETENTION):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.retention = retention
+        self.cache_kib = CACHE_KIB
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=buffer_size)  # rows not written yet, oldest first
+        self.next_id = None
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.last_pruned = 0
+        self.wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._writer = None
+        self._connection = None  # used by the writer only
+        self._readers = threading.local()
+
+    def resize(self, buffer_size):
+        """Keep at most buffer_size events in memory, dropping the oldest if there are more."""
+        with self.lock:
+            self.dropped += max(0, len(self.pending) - buffer_size)
+            self.pending = deque(self.pending, maxlen=buffer_size)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(f'PRAGMA cache_size=-{int(self.cache_kib)}')
+        return connection
+
+    def open(self):
+        """Create the database if needed and carry on numbering from its last event."""
+        if self.path is None:
+            self.next_id = self.next_id or 1
+            return
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        last_id = connection.execute('SELECT MAX(id) FROM events').fetchone()[0] or 0
+        with self.lock:
+            # Number anything recorded before opening after the stored events
+            self.pending = deque(((last_id + 1 + index,) + row[1:]
+                                  for index, row in enumerate(self.pending)),
+                                 maxlen=self.pending.maxlen)
+            self.next_id = last_id + 1 + len(self.pending)
+        self._connection = connection
+
+    # Recording
+
+    def record(self, kind, data):
+        """Queue an event for writing. Never blocks on the disk."""
+        if kind not in KINDS:
+            return
+        muted = data.get('muted')
+        with self.lock:
+            if self.next_id is None:
+                self.next_id = 1
+            row = (self.next_id, data.get('time', time.time()), kind) + tuple(
+                data.get(column) for column in COLUMNS[:-1]) + (
+                None if muted is None else int(bool(muted)),)
+            self.next_id += 1
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(row)
+            waiting = len(self.pending)
+        if waiting >= self.flush_size:
+            self.wakeup.set()
+
+    def flush(self):
+        """Write every waiting event in one transaction. Returns how many were written."""
+        if self._connection is None:
+            return 0
+        with self.lock:
+            rows = list(self.pending)
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    f'INSERT OR IGNORE INTO events (id, time, kind, {", ".join(COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * (len(COLUMNS) + 3))})', rows)
+        except sqlite3.Error as e:
+            logger.error(f"Error writing history: {e}")
+            return 0
+        last_id = rows[-1][0]
+        with self.lock:
+            while self.pending and self.pending[0][0] <= last_id:
+                self.pending.popleft()
+        self.written += len(rows)
+        self.flushes += 1
+        metrics.history_flush_seconds.observe(time.perf_counter() - started)
+        metrics.history_events_written_total.inc(len(rows))
+        return len(rows)
+
+    def prune(self):
+        """Drop events older than the retention period, at most once a day."""
+        now = time.time()
+        if self._connection is None or now - self.last_pruned < 24 * 3600:
+            return
+        self.last_pruned = now
+        try:
+            with self._connection:
+                deleted = self._connection.execute('DELETE FROM events WHERE time < ?',
+                                                   (now - self.retention,)).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error pruning history: {e}")
+            return
+        if deleted:
+            logger.info(f"Pruned {deleted} history events")
+
+    def start(self):
+        """Open the database and write in the background."""
+        if self._writer is not None:
+            return
+        try:
+            self.open()
+        except sqlite3.Error as e:
+            logger.error(f"History disabled, cannot open {self.path}: {e}")
+            return
+        if self.path is None:
+            return
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._writer.start()
+
+    def _run(self):
+        self.prune()
+        while not self._stop.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+            self.prune()
+
+    def stop(self):
+        """Write whatever is waiting and stop the writer."""
+        writer = self._writer
+        self._writer = None
+        self._stop.set()
+        self.wakeup.set()
+        if writer is not None:
+            writer.join(10)
+        self.flush()
+
+    # Reading
+
+    def _reader(self):
+        connection = getattr(self._readers, 'connection', None)
+        if connection is None:
+            connection = self._readers.connection = self._connect()
+        return connection
+
+    def query(self, since=None, until=None, kinds=None, device=None, cursor=None, limit=PAGE_SIZE):
+        """
+        Return (events, next_cursor): up to limit events, newest first, with
+        since <= time < until. Pass next_cursor back for the following page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where, params = [], []
+        if since is not None:
+            where.append('time >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('time < ?')
+            params.append(until)
+        if kinds:
+            where.append(f'kind IN ({", ".join("?" * len(kinds))})')
+            params.extend(kinds)
+        if device:
+            where.append('device = ?')
+            params.append(device)
+        before = parse_cursor(cursor) if cursor else None
+
+        def wanted(row):
+            return ((since is None or row[1] >= since) and (until is None or row[1] < until)
+                    and (not kinds or row[2] in kinds) and (not device or row[3] == device)
+                    and (before is None or (row[1], row[0]) < before))
+
+        with self.lock:
+            rows = sorted((row for row in self.pending if wanted(row)),
+                          key=lambda row: (row[1], row[0]), reverse=True)[:limit + 1]
+            pending_ids = {row[0] for row in self.pending}
+
+        if self._connection is not None and len(rows) <= limit:
+            if before is not None:
+                where.append('(time, id) < (?, ?)')
+                params.extend(before)
+            sql = (f'SELECT id, time, kind, {", ".join(COLUMNS)} FROM events'
+                   f'{" WHERE " + " AND ".join(where) if where else ""}'
+                   f' ORDER BY time DESC, id DESC LIMIT ?')
+            try:
+                stored = self._reader().execute(sql, params + [limit + 1]).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading history: {e}")
+                stored = []
+            rows = sorted(rows + [row for row in stored if row[0] not in pending_ids],
+                          key=lambda row: (row[1], row[0]), reverse=True)[:limit + 1]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f'{rows[-1][1]!r}:{rows[-1][0]}'
+        events = []
+        for row in rows:
+            event = {'id': row[0], 'time': row[1], 'kind': row[2]}
+            for column, value in zip(COLUMNS, row[3:]):
+                if value is not None:
+                    event[column] = bool(value) if column == 'muted' else value
+            events.append(event)
+        return events, next_cursor
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {'pending': pending, 'written': self.written, 'flushes': self.flushes,
+                'dropped': self.dropped}
+
+
+store = HistoryStore()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Optional; gzip is always available
+
+# Types worth compressing; images and the like already are
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 1024  # Bytes; smaller bodies gain less than the header costs
+STATIC_GZIP_LEVEL = 9  # Assets are compressed once, so take the smallest
+DYNAMIC_GZIP_LEVEL = 5  # API responses are compressed on every request
+STATIC_MAX_AGE = 3600  # Seconds browsers may reuse a static file without asking
+
+
+def compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE)
+
+
+def etag_of(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+def choose_encoding(request, available):
+    """The best encoding of those available that the client accepts, or None."""
+    for encoding in ('br', 'gzip'):
+        if encoding in available and request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+class Asset:
+    """A response body hashed and compressed once, served many times."""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'encoded', 'mtime')
+
+    def __init__(self, body, mimetype, mtime=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.etag = etag_of(body)
+        self.encoded = {}  # encoding -> body, only where it came out smaller
+        if compressible(mimetype) and len(body) >= MIN_COMPRESS_SIZE:
+            self.encoded['gzip'] = gzip.compress(body, STATIC_GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.encoded['br'] = brotli.compress(body)
+            for encoding, encoded in list(self.encoded.items()):
+                if len(encoded) >= len(body):
+                    del self.encoded[encoding]
+
+    def respond(self, request, max_age=None):
+        """A 200 in the best encoding the client takes, or a 304 if it already has it."""
+        encoding = choose_encoding(request, self.encoded)
+        # Each encoding is a different representation and needs its own tag
+        etag = f'{self.etag}-{encoding}' if encoding else self.etag
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.encoded[encoding] if encoding else self.body,
+                                mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if max_age:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        else:
+            # Always ask, but a matching ETag costs only a 304
+            response.cache_control.no_cache = True
+        return response
+
+
+class AssetCache:
+    """Files under a directory, read and compressed once and again only after they change."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.assets = {}  # path -> Asset
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """The Asset for a path under the directory, or None if there is no such file."""
+        full_path = safe_join(self.directory, path)
+        if full_path is None:
+            return None
+        try:
+            mtime = os.stat(full_path).st_mtime_ns
+            asset = self.assets.get(full_path)
+            if asset is not None and asset.mtime == mtime:
+                return asset
+            with open(full_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            # Missing, a directory or unreadable
+            return None
+        mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        asset = Asset(body, mimetype, mtime)
+        with self.lock:
+            self.assets[full_path] = asset
+        return asset
+
+
+def finish(response, request):
+    """
+    Make a dynamic GET response cheap to repeat: tag it, answer a matching
+    If-None-Match with a 304 and gzip larger text bodies when the client
+    accepts it. Streams (such as /api/events) pass through untouched.
+    """
+    if (request.method != 'GET' or response.status_code != 200 or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.get_etag()[0] is not None):
+        return response
+    body = response.get_data()
+    etag = etag_of(body)
+    encoding = None
+    if compressible(response.mimetype) and len(body) >= MIN_COMPRESS_SIZE:
+        encoding = choose_encoding(request, ('gzip',))
+    if encoding:
+        etag = f'{etag}-{encoding}'
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if 'Cache-Control' not in response.headers:
+        response.cache_control.no_cache = True
+    if request.if_none_match.contains_weak(etag):
+        response.status_code = 304
+        response.set_data(b'')
+        return response
+    if encoding:
+        response.set_data(gzip.compress(body, DYNAMIC_GZIP_LEVEL, mtime=0))
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -26,12 +26,36 @@ python3 -m venv $VENV_DIR
 # Install dependencies in the virtual environment
 echo "Installing Python dependencies in virtual environment..."
 $VENV_DIR/bin/pip install --upgrade pip
-$VENV_DIR/bin/pip install pychromecast flask
+$VENV_DIR/bin/pip install 'pychromecast>=13.0.0' flask requests 'waitress>=3.0,<3.1'
 
 # Copy files to install directory
 echo "Copying files to $INSTALL_DIR..."
 cp main.py $INSTALL_DIR/
 cp web_server.py $INSTALL_DIR/
+cp keyword_matcher.py $INSTALL_DIR/
+cp text_normalizer.py $INSTALL_DIR/
+cp device_supervisor.py $INSTALL_DIR/
+cp device_cache.py $INSTALL_DIR/
+cp connection_manager.py $INSTALL_DIR/
+cp event_bus.py $INSTALL_DIR/
+cp event_streams.py $INSTALL_DIR/
+cp metrics.py $INSTALL_DIR/
+cp config_store.py $INSTALL_DIR/
+cp rule_engine.py $INSTALL_DIR/
+cp verdict_cache.py $INSTALL_DIR/
+cp enrichment.py $INSTALL_DIR/
+cp timer_queue.py $INSTALL_DIR/
+cp autosave.py $INSTALL_DIR/
+cp command_queue.py $INSTALL_DIR/
+cp schedules.py $INSTALL_DIR/
+cp history.py $INSTALL_DIR/
+cp analytics.py $INSTALL_DIR/
+cp http_cache.py $INSTALL_DIR/
+cp memory_profile.py $INSTALL_DIR/
+cp lifecycle.py $INSTALL_DIR/
+cp profiler.py $INSTALL_DIR/
+cp recording.py $INSTALL_DIR/
+cp bulk_classify.py $INSTALL_DIR/
 cp -p templates/index.html $INSTALL_DIR/templates/ 2>/dev/null || mkdir -p $INSTALL_DIR/templates
 if [ -d "static" ]; then
   cp -r static/* $INSTALL_DIR/static/ 2>/dev/null || mkdir -p $INSTALL_DIR/static
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import deque
+
+from text_normalizer import normalize_text, tokenize
+
+# Below this many keywords CPython's C-level substring search beats walking
+# the automaton one character at a time in Python. TitleMatcher still
+# normalizes and tokenizes every text first, which this does not skip
+SMALL_KEYWORD_SET = 32
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a set of keywords.
+    Builds once and then finds every keyword in a text in a single pass,
+    no matter how many keywords there are.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = []
+        # State 0 is the root; each state has a transition dict, a failure
+        # link and the indexes of the keywords that end there
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        seen = set()
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            self._add(keyword, len(self.keywords))
+            self.keywords.append(keyword)
+
+        self._build_failure_links()
+        self._small = len(self.keywords) <= SMALL_KEYWORD_SET
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def _add(self, keyword, index):
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + (index,)
+
+    def _build_failure_links(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, next_state in goto[state].items():
+                pending.append(next_state)
+                link = fail[state]
+                while link and ch not in goto[link]:
+                    link = fail[link]
+                fail[next_state] = goto[link].get(ch, 0)
+                # Inherit matches from the suffix so scanning never walks the chain
+                out[next_state] = out[next_state] + out[fail[next_state]]
+
+    def find_all(self, text):
+        """Return every (keyword, offset) found in text, in order of where they end."""
+        matches = []
+        if not text or not self.keywords:
+            return matches
+
+        if self._small:
+            lowered = text.lower()
+            for keyword in self.keywords:
+                offset = lowered.find(keyword)
+                while offset >= 0:
+                    matches.append((keyword, offset))
+                    offset = lowered.find(keyword, offset + 1)
+            matches.sort(key=lambda match: match[1] + len(match[0]))
+            return matches
+
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        state = 0
+        for position, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                keyword = keywords[index]
+                matches.append((keyword, position - len(keyword) + 1))
+        return matches
+
+    def search(self, text):
+        """Return a (keyword, offset) found in text, or None."""
+        if not text or not self.keywords:
+            return None
+
+        if self._small:
+            lowered = text.lower()
+            for keyword in self.keywords:
+                offset = lowered.find(keyword)
+                if offset >= 0:
+                    return keyword, offset
+            return None
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for position, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                keyword = self.keywords[out[state][0]]
+                return keyword, position - len(keyword) + 1
+        return None
+
+
+# Only this many leading characters go into the deletion index; longer words
+# are told apart by the full edit distance check afterwards
+INDEX_PREFIX = 7
+
+
+def edit_budget(length):
+    """
+    Number of typos tolerated in a keyword of the given (squashed) length.
+    Shorter keywords are often one letter away from everyday words ("steve"
+    and "stove", "zombie" and "bombie", "creeper" and "creepier"), so they
+    only match exactly, or through leetspeak and lookalike letters.
+    """
+    if length < 8:
+        return 0
+    if length < 12:
+        return 1
+    return 2
+
+
+def deletions(word, distance):
+    """Return every string reachable from word by deleting up to distance characters."""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:]
+                    for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def bounded_levenshtein(a, b, limit):
+    """Return the edit distance between a and b, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1,
+                       previous[j - 1] + (ca != cb))
+            current.append(cost)
+            row_min = min(row_min, cost)
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TitleMatcher:
+    """
+    Obfuscation-tolerant keyword matcher for titles and app names.
+    Keywords and text go through the same normalization (Unicode folding,
+    leetspeak and separator collapsing) before an exact Aho-Corasick pass.
+    Words the exact pass misses are looked up in a deletion-neighbourhood
+    index built alongside the automaton, which finds keywords within a
+    small edit distance without scanning the keyword list.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = []
+        normalized = {}
+        for keyword in keywords:
+            key = normalize_text(keyword)
+            if key and key not in normalized:
+                normalized[key] = keyword.lower()
+                self.keywords.append(keyword.lower())
+
+        # Exact matches run over the normalized text
+        self._exact = KeywordMatcher(normalized)
+        self._original = normalized
+
+        # Fuzzy matches compare whole words (or word pairs) against keywords
+        # with spaces removed, so "mine craft" still finds "minecraft"
+        self._squashed = []
+        self._joined = {}
+        self._index = {}
+        self._lengths = set()  # Word lengths within some keyword's edit budget
+        for key, keyword in normalized.items():
+            squashed = key.replace(' ', '')
+            self._joined.setdefault(squashed, keyword)
+            budget = edit_budget(len(squashed))
+            if not budget:
+                continue
+            position = len(self._squashed)
+            self._squashed.append((squashed, budget, keyword))
+            self._lengths.update(range(len(squashed) - budget, len(squashed) + budget + 1))
+            for variant in deletions(squashed[:INDEX_PREFIX], budget):
+                entry = self._index.get(variant)
+                if entry is None:
+                    self._index[variant] = (position,)
+                elif entry[-1] != position:
+                    self._index[variant] = entry + (position,)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def _fuzzy(self, words, first_only):
+        matches = []
+        joined, lengths = self._joined, self._lengths
+        offset = 0
+        for i, word in enumerate(words):
+            # Adjacent words only match a keyword exactly once joined up
+            # ("mine craft"), which keeps the lookups per title low
+            if i + 1 < len(words):
+                keyword = joined.get(word + words[i + 1])
+                if keyword is not None:
+                    matches.append((keyword, offset))
+                    if first_only:
+                        return matches
+            # No keyword is within its budget of a word much shorter or
+            # longer, so most words of a title skip the index altogether
+            if len(word) in lengths:
+                self._lookup(word, offset, matches)
+                if first_only and matches:
+                    return matches
+            offset += len(word) + 1
+        return matches
+
+    def _lookup(self, candidate, offset, matches):
+        index, squashed = self._index, self._squashed
+        checked = set()
+        # Allow for keywords up to two characters longer than the candidate
+        budget = edit_budget(len(candidate) + 2)
+        for variant in deletions(candidate[:INDEX_PREFIX], budget):
+            for position in index.get(variant, ()):
+                if position in checked:
+                    continue
+                checked.add(position)
+                key, key_budget, keyword = squashed[position]
+                if bounded_levenshtein(candidate, key, key_budget) <= key_budget:
+                    matches.append((keyword, offset))
+
+    def find_all(self, text):
+        """
+        Return every (keyword, offset) found in text.
+        Offsets point into normalize_text(text).
+        """
+        if not text or not self.keywords:
+            return []
+        words = tokenize(text)
+        normalized = ' '.join(words)
+        matches = [(self._original[key], offset)
+                   for key, offset in self._exact.find_all(normalized)]
+        found = {keyword for keyword, _ in matches}
+        for keyword, offset in self._fuzzy(words, first_only=False):
+            if keyword not in found:
+                found.add(keyword)
+                matches.append((keyword, offset))
+        return matches
+
+    def search(self, text):
+        """Return a (keyword, offset) found in text, or None."""
+        if not text or not self.keywords:
+            return None
+        words = tokenize(text)
+        match = self._exact.search(' '.join(words))
+        if match is not None:
+            return self._original[match[0]], match[1]
+        fuzzy = self._fuzzy(words, first_only=True)
+        return fuzzy[0] if fuzzy else None
+
+
+# Most recently compiled matcher as (version, keywords, matcher)
+_cached = (None, None, None)
+_cache_lock = threading.Lock()
+
+
+def get_matcher(keywords, version=None):
+    """
+    Return a compiled TitleMatcher for keywords, reusing the cached one when possible.
+    The cache hits on the keyword version, or on the identity of the keywords
+    list, which callers replace rather than mutate.
+    """
+    global _cached
+
+    cached_version, cached_keywords, matcher = _cached
+    if matcher is not None and (keywords is cached_keywords or
+                                (version is not None and version == cached_version)):
+        return matcher
+
+    with _cache_lock:
+        # Another thread may have compiled the same list while we waited
+        cached_version, cached_keywords, matcher = _cached
+        if matcher is not None and (keywords is cached_keywords or
+                                    (version is not None and version == cached_version)):
+            return matcher
+
+        matcher = TitleMatcher(keywords)
+        _cached = (version, keywords, matcher)
+        return matcher
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the monitor to let go of its devices; unmuting one can take ACK_TIMEOUT
+STOP_TIMEOUT = 10
+
+# Seconds to wait for each of discovery and the web server on the way out
+SHUTDOWN_TIMEOUT = 5
+
+
+class Supervisor:
+    """
+    Own the long-running parts of the blocker: the monitor, discovery and the
+    web server.
+
+    Nothing under it sleeps. Loops wait on stop_event, which is clear only
+    while monitoring runs, and anything that blocks elsewhere (a queue, a
+    CastBrowser) registers with on_stop() to be woken. Stopping therefore
+    takes as long as releasing the devices, and stop_monitoring() and
+    shutdown() only return once the threads they stop have ended.
+
+    Signals only set shutdown_event; whoever waits for it (main.py) then calls
+    shutdown() outside the signal handler.
+    """
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.stop_event.set()  # Not monitoring until start_monitoring()
+        self.shutdown_event = threading.Event()
+        self.lock = threading.Lock()
+        self.monitor_thread = None
+        self.stop_callbacks = []
+        self.threads = []  # Discovery, the web server: joined by shutdown()
+        self.shutdown_callbacks = []
+
+    # Monitoring
+
+    @property
+    def monitoring(self):
+        return not self.stop_event.is_set()
+
+    def monitor_alive(self):
+        thread = self.monitor_thread
+        return thread is not None and thread.is_alive()
+
+    def wait(self, timeout):
+        """Sleep for up to timeout seconds; True (at once) if monitoring has to stop."""
+        return self.stop_event.wait(timeout)
+
+    def on_stop(self, callback):
+        """Call callback when the current monitoring run stops, or now if none is running."""
+        with self.lock:
+            if not self.stop_event.is_set():
+                self.stop_callbacks.append(callback)
+                return
+        callback()
+
+    def start_monitoring(self, target, *args, name='monitor', shutdown_after=False):
+        """
+        Run target(*args) on a new monitor thread. With shutdown_after, the
+        process shuts down when it returns (the CLI has nothing else to do).
+        Returns False if a monitor is still running.
+        """
+        with self.lock:
+            if self.monitor_thread is not None and self.monitor_thread.is_alive():
+                return False
+            self.stop_event.clear()
+            self.stop_callbacks = []
+            thread = threading.Thread(target=self._run_monitor, name=name, daemon=True,
+                                      args=(target, args, shutdown_after))
+            self.monitor_thread = thread
+            thread.start()
+        return True
+
+    def _run_monitor(self, target, args, shutdown_after):
+        try:
+            target(*args)
+        except Exception as e:
+            logger.error(f"Error in {threading.current_thread().name}: {e}")
+        finally:
+            # Ended on its own: make sure nothing waits for it any more
+            if self.monitor_thread is threading.current_thread():
+                self._stop()
+            if shutdown_after:
+                self.shutdown_event.set()
+
+    def _stop(self):
+        with self.lock:
+            self.stop_event.set()
+            callbacks, self.stop_callbacks = self.stop_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error stopping monitoring: {e}")
+
+    def stop_monitoring(self, timeout=STOP_TIMEOUT):
+        """Stop the monitor and wait for its thread. Returns False if it is still running."""
+        self._stop()
+        thread = self.monitor_thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        started = time.monotonic()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"{thread.name} still running after {timeout}s")
+            return False
+        logger.info(f"Monitoring stopped in {(time.monotonic() - started) * 1000:.0f} ms")
+        return True
+
+    # The rest of the process
+
+    def spawn(self, name, target, *args):
+        """Start a thread that shutdown() waits for; it should return once shutdown_event is set."""
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            self.threads.append(thread)
+        thread.start()
+        return thread
+
+    def on_shutdown(self, callback):
+        """Call callback during shutdown(); the last registered runs first."""
+        with self.lock:
+            self.shutdown_callbacks.append(callback)
+
+    def wait_for_shutdown(self, timeout=None):
+        """Sleep for up to timeout seconds (or until shutdown); True once shutting down."""
+        return self.shutdown_event.wait(timeout)
+
+    def shutdown(self):
+        """Stop monitoring, run the shutdown callbacks and wait for every spawned thread."""
+        self.shutdown_event.set()
+        self.stop_monitoring()
+        with self.lock:
+            callbacks, self.shutdown_callbacks = self.shutdown_callbacks, []
+            threads, self.threads = self.threads, []
+        for callback in reversed(callbacks):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error during shutdown: {e}")
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(SHUTDOWN_TIMEOUT)
+                if thread.is_alive():
+                    logger.warning(f"{thread.name} still running after shutdown")
+
+    # Signals
+
+    def install_signal_handlers(self):
+        """Shut down cleanly on SIGINT and SIGTERM. Call from the main thread."""
+        signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+
+    def handle_signal(self, sig, frame):
+        logger.info("Received shutdown signal, cleaning up...")
+        self.shutdown_event.set()
+        # Should cleaning up hang, a second signal ends the process the usual way
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+# Shared by main.py, the web server and the device supervisor
+supervisor = Supervisor()
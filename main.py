@@ -1,14 +1,31 @@
 #!/usr/bin/env python3
 
+import contextlib
+import json
+import os
+import sys
 import time
-import pychromecast
 import logging
+import queue
 import re
 import threading
 import argparse
-import signal
-import sys
-from pychromecast.controllers.youtube import YouTubeController  # Import directly
+import analytics
+import bulk_classify
+import command_queue
+import device_cache
+import enrichment
+import event_bus
+import history
+import lifecycle
+import memory_profile
+import metrics
+import recording
+import rule_engine
+import schedules
+import verdict_cache
+from command_queue import CommandQueue
+from timer_queue import timers
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -20,50 +37,95 @@ DEFAULT_MINECRAFT_KEYWORDS = [
     'ender dragon', 'skeleton', 'zombie', 'mojang'
 ]
 
-# Global flag to control monitoring loop
-monitoring_active = True
+# Used to report how long startup took
+STARTED_AT = time.monotonic()
+
+# How long to wait for a cached device before falling back to discovery
+CACHED_CONNECT_TIMEOUT = 5
+
+# How long each round of discovery listens for devices
+DISCOVERY_TIMEOUT = 5
+
+# How long to wait for the web server to start listening
+WEB_READY_TIMEOUT = 30
+
+# Threads doing device I/O for the whole fleet with --all-devices
+DEVICE_WORKERS = 4
 
 # Global variables for chromecast and browser to allow clean shutdown
 active_chromecast = None
 active_browser = None
+active_supervisor = None
 
+# Set once start_services() has run
+services_started = False
 
-def signal_handler(sig, frame):
-    """Handle SIGINT (Ctrl+C) and SIGTERM signals for clean shutdown"""
-    global monitoring_active, active_chromecast, active_browser
-    print("\nReceived shutdown signal, cleaning up...")
-    monitoring_active = False
 
-    # Clean up chromecast connection
-    if active_chromecast:
-        try:
-            active_chromecast.disconnect()
-            print("Disconnected from Chromecast")
-        except Exception as e:
-            print(f"Error during disconnect: {e}")
+def connect_cached_chromecast(cache):
+    """
+    Connect straight to the most recently seen cached device, skipping discovery.
+    Returns the Chromecast, or None if nothing cached answers in time.
+    """
+    import pychromecast
 
-    # Clean up browser
-    if active_browser:
+    for cast_info in cache.cast_infos():
+        print(f"Connecting to cached Chromecast {cast_info.friendly_name} at {cast_info.host}:{cast_info.port}...")
+        chromecast = pychromecast.get_chromecast_from_cast_info(cast_info, None)
+        cache.watch(chromecast)
         try:
-            active_browser.stop_discovery()
-            print("Stopped discovery service")
+            chromecast.wait(timeout=CACHED_CONNECT_TIMEOUT)
+            return chromecast
         except Exception as e:
-            print(f"Error stopping discovery: {e}")
-
-    sys.exit(0)
+            print(f"Cached Chromecast did not answer: {e}")
+            try:
+                chromecast.disconnect(timeout=0)
+            except Exception:
+                pass
+    return None
 
 
-# Register signal handlers
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
+def discover_chromecasts(timeout=DISCOVERY_TIMEOUT):
+    """
+    Listen for Chromecasts for timeout seconds (less if we are shutting down)
+    and connect to those found. Returns (chromecasts, browser); the browser
+    keeps the devices' addresses up to date until stop_discovery().
+    """
+    import pychromecast
+    import zeroconf
+    from pychromecast.discovery import CastBrowser, SimpleCastListener
+
+    browser = CastBrowser(SimpleCastListener(), zeroconf.Zeroconf())
+    browser.start_discovery()
+    if lifecycle.supervisor.wait_for_shutdown(timeout):
+        browser.stop_discovery()
+        raise Exception("Shutting down")
+    chromecasts = []
+    for cast_info in list(browser.devices.values()):
+        try:
+            chromecasts.append(pychromecast.get_chromecast_from_cast_info(cast_info, browser.zc))
+        except pychromecast.ChromecastConnectionError:
+            pass
+    return chromecasts, browser
 
 
 def find_chromecast():
     """Discover and return the first Chromecast found on the network."""
-    global active_browser
+    global active_browser, active_chromecast
+
+    # With a warm cache, connect directly while discovery revalidates it
+    cache = device_cache.DeviceCache()
+    cache.start_revalidation()
+    active_browser = cache
+    chromecast = connect_cached_chromecast(cache)
+    if chromecast:
+        print(f"Selected Chromecast: {chromecast.name} "
+              f"(connected {time.monotonic() - STARTED_AT:.2f}s after start)")
+        active_chromecast = chromecast
+        return chromecast, cache
+    cache.stop_discovery()
 
     print("Discovering Chromecasts on the network...")
-    chromecasts, browser = pychromecast.get_chromecasts()
+    chromecasts, browser = discover_chromecasts()
     active_browser = browser  # Save for clean shutdown
 
     # Wait for at least one Chromecast to be discovered
@@ -72,8 +134,10 @@ def find_chromecast():
     while not chromecasts and attempt < max_attempts:
         attempt += 1
         print(f"No Chromecasts found. Retrying ({attempt}/{max_attempts})...")
-        time.sleep(5)
-        chromecasts, browser = pychromecast.get_chromecasts()
+        browser.stop_discovery()
+        if lifecycle.supervisor.wait_for_shutdown(5):
+            raise Exception("Shutting down")
+        chromecasts, browser = discover_chromecasts()
         active_browser = browser  # Update browser reference
 
     if not chromecasts:
@@ -81,78 +145,135 @@ def find_chromecast():
 
     print(f"Found {len(chromecasts)} Chromecast(s)")
 
+    # Remember them so the next start can skip discovery
+    for discovered in chromecasts:
+        cache.remember(discovered.cast_info)
+
     # Return the first Chromecast found
     chromecast = chromecasts[0]
     print(f"Selected Chromecast: {chromecast.name}")
 
     # Store reference to the chromecast for clean shutdown
-    global active_chromecast
     active_chromecast = chromecast
 
     # Return both the Chromecast and browser to prevent garbage collection
     return chromecast, browser
 
 
-def reconnect_chromecast(chromecast):
+def create_device_supervisor():
+    """Start discovering and supervising every cast device on the network."""
+    global active_supervisor
+    from device_supervisor import DeviceSupervisor
+
+    print("Discovering all cast devices on the network...")
+    supervisor = DeviceSupervisor(EventDrivenMonitor, get_rules_function(),
+                                  max_workers=DEVICE_WORKERS,
+                                  device_cache=device_cache.DeviceCache())
+    supervisor.start_discovery()
+    active_supervisor = supervisor
+    return supervisor
+
+
+def get_rules_function():
+    """Return a callable giving the current DecisionTable (web interface or defaults)."""
+    try:
+        from web_server import get_rule_table
+        print("Using rules from web interface")
+        return get_rule_table
+    except (ImportError, AttributeError):
+        print("Using default rules (web interface not available)")
+        table = rule_engine.DecisionTable(rule_engine.default_rules(DEFAULT_MINECRAFT_KEYWORDS))
+        return lambda: table
+
+
+def classify(table, fields, previous=None):
     """
-    Attempt to reconnect to a Chromecast if connection seems stale.
-    Returns True if reconnected successfully or connection was already good.
+    Run the app and media fields through the rules, via the verdict cache.
+    Returns (action, reason, term, verdict); action is None when nothing
+    should be done, and term is the keyword or value a rule matched. Pass
+    verdict back as previous next time so an unchanged status is not looked
+    at again.
     """
-    try:
-        # Test if connection is still active by accessing status
-        chromecast.status
-        return True
-    except Exception as e:
-        print(f"Connection appears stale, attempting to reconnect: {e}")
-        try:
-            chromecast.disconnect()
-            time.sleep(1)
-            # Start worker thread and wait for cast device to be ready
-            chromecast.wait()
-            print(f"Reconnected to {chromecast.name}")
-            return True
-        except Exception as reconnect_error:
-            print(f"Failed to reconnect: {reconnect_error}")
-            return False
-
-
-def is_minecraft_related(text, keywords=None):
-    """Check if the given text is related to Minecraft using a set of keywords."""
-    if not text:
-        return False
-
-    # If no keywords provided, use the default ones or get from web server if available
-    if keywords is None:
-        # Try to get keywords from web server if available
-        try:
-            from web_server import get_keywords
-            keywords_from_server = get_keywords()
-            if keywords_from_server:
-                keywords = keywords_from_server
-            else:
-                keywords = DEFAULT_MINECRAFT_KEYWORDS
-        except (ImportError, AttributeError):
-            keywords = DEFAULT_MINECRAFT_KEYWORDS
+    verdict = verdict_cache.cache.lookup(table, fields, previous)
+    action, reason, term = verdict[1]
+    if action == 'allow':
+        return None, reason, term, verdict
+    return action, reason, term, verdict
+
+
+def scheduled(action, reason, term, app_id):
+    """Let an active block window or a used-up daily limit override the rules."""
+    override = schedules.scheduler.verdict(app_id)
+    if override:
+        return override + (None,)
+    return action, reason, term
+
 
-    text = text.lower()
-    return any(keyword in text for keyword in keywords)
+def device_key(chromecast):
+    """Identify a device across reconnects for watch-time accounting."""
+    return str(getattr(chromecast, 'uuid', None) or chromecast.name)
+
+
+def youtube_video(app_id, fields):
+    """Video ID of what YouTube is playing, if there is one to look up."""
+    if app_id != rule_engine.YOUTUBE_APP_ID or not enrichment.enricher.enabled:
+        return None
+    return enrichment.video_id(fields.get('content_id'))
+
+
+def needs_action(action, currently_muted, player_state):
+    """Whether a rule action still has something to do on the device."""
+    if action in ('pause', 'quit'):
+        return player_state in rule_engine.PLAYING_STATES
+    return action is not None and not currently_muted
+
+
+def enforce(chromecast, action, player_state, callback=None):
+    """
+    Send the device commands for a rule action without waiting for them:
+    'block' pauses playing media and mutes at the same time, 'mute' only
+    mutes, 'pause' only pauses and 'quit' stops the app. callback(results)
+    runs once the device has answered every command.
+    """
+    names = [name for name in command_queue.ACTION_COMMANDS[action]
+             if name != 'pause' or player_state in rule_engine.PLAYING_STATES]
+    return CommandQueue.for_chromecast(chromecast).submit_all(names, callback)
+
+
+def report_enforced(name, results, reason, verdict_at):
+    """Log and publish how the commands for an action went. Returns True if it muted."""
+    for command, ok in results.items():
+        if ok:
+            print(f"[{name}] ✅ {command} acknowledged")
+        else:
+            print(f"[{name}] Failed to {command}")
+    muted = bool(results.get('mute'))
+    if muted:
+        metrics.verdict_to_mute_seconds.observe(time.monotonic() - verdict_at)
+        event_bus.publish('mute', device=name, muted=True, reason=reason)
+    return muted
 
 
 def monitor_and_control_chromecast(chromecast):
     """Monitor the Chromecast and mute it when Minecraft content is detected or suspected."""
-    global monitoring_active
+    threading.current_thread().name = f'monitor {chromecast.name}'
+    from connection_manager import ConnectionManager
+    from pychromecast.controllers.youtube import YouTubeController
 
     try:
         # Connect to the Chromecast and wait for it to be ready
         print(f"Connecting to {chromecast.name}...")
 
+        # pychromecast keeps the connection alive itself; this just tracks its health
+        connection = ConnectionManager.for_chromecast(chromecast)
+
         # Start worker thread and wait for cast device to be ready
         chromecast.wait()
         print(f"Connected to {chromecast.name}")
 
         # Register a YouTube controller for additional detection capability
         try:
-            yt = YouTubeController()  # Use the imported YouTubeController
+            yt = YouTubeController()
             chromecast.register_handler(yt)
             print("Registered YouTube controller")
         except Exception as e:
@@ -162,110 +283,82 @@ def monitor_and_control_chromecast(chromecast):
         print(f"Now monitoring {chromecast.name} for content...")
         print(f"Will mute when filtered content is detected...")
 
-        # Keep track of last refresh time
-        last_reconnect_time = time.time()
-        reconnect_interval = 10  # Reconnect every 10 seconds to keep connection fresh
-
         # Track muting status to avoid excessive muting commands
         currently_muted = False
-        last_mute_time = 0
         mute_duration = 600  # Keep muted for 10 minutes by default
+        unmute_timer = None
 
         # Track detection to avoid excessive logging
         last_detection_log = 0
         detection_log_interval = 10  # Log detection details every 10 seconds
 
-        # Keep track of recent apps seen for better detection
-        recent_app_ids = set()
         last_app_id = None
         last_title = None
+        last_verdict = None
 
         # Force periodic muting check intervals
         force_mute_check_interval = 5  # Check every 5 seconds regardless of detection
         last_forced_check = time.time()
 
-        # Set monitoring_active to True when starting
-        monitoring_active = True
-
-        # Import keywords function if web server is available
-        try:
-            from web_server import get_keywords
-            get_keywords_func = get_keywords
-            print("Using keywords from web interface")
-        except (ImportError, AttributeError):
-            def get_keywords_func(): return DEFAULT_MINECRAFT_KEYWORDS
-            print("Using default keywords (web interface not available)")
-
-        print(f"Monitoring active: {monitoring_active}")
-
-        while monitoring_active:
+        # Use the rules from the web interface if it is available
+        get_rules_func = get_rules_function()
+
+        # Device commands go out without the loop waiting for them
+        commands = CommandQueue.for_chromecast(chromecast)
+
+        def mute_expired():
+            """Runs on the timer queue once the mute duration has passed."""
+            nonlocal unmute_timer
+            app_id = chromecast.status.app_id if chromecast.status else None
+            if schedules.scheduler.verdict(app_id):
+                # Still inside a block window or over a daily limit
+                unmute_timer = timers.call_later(mute_duration, mute_expired)
+                return
+            unmute_timer = None
+            print(f"Mute duration ({mute_duration/60:.1f} minutes) expired, unmuting...")
+            # The periodic volume check notices if this does not go through
+            commands.submit('unmute')
+            event_bus.publish('mute', device=chromecast.name, muted=False,
+                              reason='Mute duration expired')
+
+        while lifecycle.supervisor.monitoring:
             try:
                 current_time = time.time()
+                pass_started = time.perf_counter()
 
-                # Check if we should still be running - additional check
-                if not monitoring_active:
-                    print("Monitoring has been stopped by external request")
-                    # Make sure we unmute before exiting
-                    try:
-                        if currently_muted:
-                            chromecast.set_volume_muted(False)
-                            print("Unmuted Chromecast before stopping")
-                    except Exception as e:
-                        print(f"Error unmuting before exit: {e}")
-                    break
-
-                # Get current keywords
-                current_keywords = get_keywords_func()
+                # Get current rules
+                table = get_rules_func()
 
-                # If empty, use cautious mode (block all)
-                cautious_mode = len(current_keywords) == 0
+                # With no rules, use cautious mode (block all)
+                cautious_mode = table.cautious
                 if cautious_mode and current_time - last_detection_log > detection_log_interval:
                     print("Running in cautious mode - will block all content")
 
-                # Periodically reconnect to keep connection fresh
-                if current_time - last_reconnect_time > reconnect_interval:
-                    print(
-                        "Performing periodic reconnection to keep connection fresh...")
-                    reconnect_chromecast(chromecast)
-                    last_reconnect_time = current_time
-
-                # Check if it's time to unmute after the mute duration
-                if currently_muted and current_time - last_mute_time > mute_duration:
-                    print(
-                        f"Mute duration ({mute_duration/60:.1f} minutes) expired, unmuting...")
-                    try:
-                        chromecast.set_volume_muted(False)
-                        currently_muted = False
-                        print("Unmuted Chromecast")
-                    except Exception as e:
-                        print(f"Failed to unmute: {e}")
+                # While the connection is down pychromecast is already reconnecting
+                if not connection.connected:
+                    if current_time - last_detection_log > detection_log_interval:
+                        last_detection_log = current_time
+                        print(f"Waiting for connection to {chromecast.name} ({connection.state})...")
+                    lifecycle.supervisor.wait(2)
+                    continue
 
                 # Get current app information
                 current_app_id = None
                 app_display_name = None
                 title = None
                 player_state = None
-                minecraft_detected = False
-                detection_reason = ""
+                fields = {}
+                awaiting_lookup = False
 
                 # Get app ID and display name
+                status_read_at = time.perf_counter()
                 try:
                     if chromecast.status:
                         current_app_id = chromecast.status.app_id
-                        if current_app_id:
-                            recent_app_ids.add(current_app_id)
 
                         # Try to get app display name
                         app_display_name = getattr(
                             chromecast.status, 'display_name', None)
-                        if app_display_name:
-                            # Check if app name contains filtered keywords
-                            if not cautious_mode and is_minecraft_related(app_display_name, current_keywords):
-                                minecraft_detected = True
-                                detection_reason = f"App name: {app_display_name}"
-                            elif cautious_mode:
-                                minecraft_detected = True
-                                detection_reason = "Cautious mode - blocking all content"
                 except Exception as app_error:
                     print(f"Error getting app info: {app_error}")
 
@@ -277,39 +370,53 @@ def monitor_and_control_chromecast(chromecast):
                     else:
                         print("No app currently running")
                     last_app_id = current_app_id
+                    event_bus.publish('app', device=chromecast.name, app_id=current_app_id,
+                                      display_name=app_display_name)
 
                 # Try to get media information
                 try:
                     if hasattr(chromecast, 'media_controller') and chromecast.media_controller.status:
-                        # Try to get title from media metadata
-                        if chromecast.media_controller.status.media_metadata:
-                            title = chromecast.media_controller.status.media_metadata.get(
-                                'title', '')
-                            if title and title != last_title:
-                                print(f"Media title: {title}")
-                                last_title = title
-
-                            # Check title for filtered keywords
-                            if not cautious_mode and title and is_minecraft_related(title, current_keywords):
-                                minecraft_detected = True
-                                detection_reason = f"Title: {title}"
-                            elif cautious_mode and title:
-                                minecraft_detected = True
-                                detection_reason = "Cautious mode - blocking all content"
-
-                        # Check player state
-                        player_state = chromecast.media_controller.status.player_state
-                        if player_state in ('PLAYING', 'BUFFERING'):
-                            # If YouTube is playing or another app right after YouTube was seen,
-                            # and we don't have a title to check, be cautious
-                            if cautious_mode or (not title and ('YouTube' in recent_app_ids or current_app_id == 'YouTube')):
-                                minecraft_detected = True
-                                detection_reason = "Cautious approach - blocking unknown content"
+                        # Title, subtitle, series, artist, content ID and player state
+                        fields = rule_engine.media_fields(chromecast.media_controller.status)
+                        # Look YouTube videos up in the background; a later pass finds them cached
+                        video = youtube_video(current_app_id, fields)
+                        if video:
+                            metadata = enrichment.enricher.cached(video)
+                            if metadata is None:
+                                # Only hold off while a lookup is actually on its way
+                                awaiting_lookup = (enrichment.enricher.request(video) is not None
+                                                   and not fields['title'])
+                            else:
+                                enrichment.merge(fields, metadata)
+                        title = fields['title']
+                        if title and title != last_title:
+                            print(f"Media title: {title}")
+                            last_title = title
+                            event_bus.publish('title', device=chromecast.name,
+                                              app_id=current_app_id, title=title)
+                        player_state = fields['player_state']
                 except Exception as media_error:
                     # Errors are common here, only log them periodically
                     if current_time - last_detection_log > detection_log_interval:
                         print(f"Note: Media detection partial or unavailable")
 
+                # Watch time only changes when playback starts or stops
+                schedules.scheduler.playback(device_key(chromecast), current_app_id,
+                                             player_state in rule_engine.PLAYING_STATES,
+                                             chromecast.name)
+
+                # Check the app and media fields against the rules and schedules
+                fields.update(app_id=current_app_id, display_name=app_display_name)
+                action, detection_reason, detection_term, last_verdict = classify(
+                    table, fields, last_verdict)
+                if awaiting_lookup:
+                    # Rather than block an untitled video outright, give its
+                    # lookup until the next pass (at most FETCH_TIMEOUT)
+                    action, detection_reason, detection_term, last_verdict = None, "", None, None
+                action, detection_reason, detection_term = scheduled(
+                    action, detection_reason, detection_term, current_app_id)
+                metrics.poll_status_to_verdict.observe(time.perf_counter() - status_read_at)
+
                 # Force periodic mute check for any active media
                 if current_time - last_forced_check > force_mute_check_interval:
                     last_forced_check = current_time
@@ -326,8 +433,9 @@ def monitor_and_control_chromecast(chromecast):
                         if cautious_mode and volume_level > 0 and not is_muted and current_app_id:
                             print(
                                 "Active media detected in periodic check - applying cautious muting")
-                            minecraft_detected = True
+                            action = 'block'
                             detection_reason = "Periodic cautious check for active media"
+                            detection_term = None
 
                         # Update currently_muted status to match device
                         currently_muted = is_muted
@@ -337,91 +445,577 @@ def monitor_and_control_chromecast(chromecast):
                 # Log detection details periodically to avoid console spam
                 if current_time - last_detection_log > detection_log_interval:
                     last_detection_log = current_time
-                    if minecraft_detected:
+                    if action:
                         print(
-                            f"⚠️ Content blocked! Reason: {detection_reason}")
+                            f"⚠️ Content blocked ({action})! Reason: {detection_reason}")
                     else:
                         # Only log this periodically
                         print(f"No content to block detected at this time")
 
                 # Take action if filtered content is detected or suspected
-                if minecraft_detected and not currently_muted:
+                if needs_action(action, currently_muted, player_state):
                     print(
-                        f"⚠️ Muting Chromecast due to detection: {detection_reason}")
-                    try:
-                        # First try to pause if it's playing
-                        if player_state in ('PLAYING', 'BUFFERING'):
-                            try:
-                                chromecast.media_controller.pause()
-                                print("Media paused")
-                                time.sleep(0.5)
-                            except Exception as pause_error:
-                                print(f"Failed to pause: {pause_error}")
-
-                        # Then always mute as well
-                        chromecast.set_volume_muted(True)
-                        print("✅ Chromecast muted")
+                        f"⚠️ Chromecast {action} due to detection: {detection_reason}")
+                    event_bus.publish('detection', device=chromecast.name, app_id=current_app_id,
+                                      reason=detection_reason, term=detection_term, title=title,
+                                      action=action)
+                    metrics.count_detection(current_app_id)
+                    enforce(chromecast, action, player_state,
+                            lambda results, reason=detection_reason, verdict_at=time.monotonic():
+                            report_enforced(chromecast.name, results, reason, verdict_at))
+                    if 'mute' in command_queue.ACTION_COMMANDS[action]:
+                        # Assume it worked; the periodic volume check corrects us if not
                         currently_muted = True
-                        last_mute_time = current_time
-                    except Exception as mute_error:
-                        print(f"Failed to mute: {mute_error}")
+                        if unmute_timer:
+                            unmute_timer.cancel()
+                        unmute_timer = timers.call_later(mute_duration, mute_expired)
 
-                # Keep recent app list manageable
-                if len(recent_app_ids) > 5:
-                    recent_app_ids = set(list(recent_app_ids)[-5:])
+                metrics.poll_processing.observe(time.perf_counter() - pass_started)
 
             except Exception as e:
                 print(f"Error during monitoring: {e}")
-                # If we have critical errors, attempt to reconnect
-                reconnect_chromecast(chromecast)
-                last_reconnect_time = time.time()
-
-                # Also check if we should exit
-                if not monitoring_active:
-                    print("Monitoring stopping after error recovery")
-                    break
 
-            # Check again before sleeping
-            if not monitoring_active:
-                print("Monitoring stopping before sleep")
-                break
-
-            # Wait before checking again
-            time.sleep(2)
+            # Wait before checking again; stopping wakes this straight away
+            lifecycle.supervisor.wait(2)
 
+        # Make sure we unmute before exiting
+        if currently_muted:
+            commands.submit('unmute')
+            print("Unmuting Chromecast before stopping")
+        if unmute_timer:
+            unmute_timer.cancel()
+        schedules.scheduler.playback(device_key(chromecast), None, False)
         print("Monitoring function exiting")
         return
 
     except Exception as e:
         print(f"Unexpected error in monitor_and_control_chromecast: {e}")
-        monitoring_active = False
         return
 
 
+class EventDrivenMonitor:
+    """
+    Classify cast and media status updates as soon as pychromecast delivers them.
+    Callbacks run on the socket thread, so device I/O is handed off through
+    dispatch() instead of being done inline: to the run() loop by default, or
+    to a shared worker pool when a DeviceSupervisor owns the monitor.
+
+    pychromecast only calls the listener methods, so this does not derive
+    from its listener classes and importing main does not import pychromecast.
+    """
+
+    __slots__ = ('chromecast', 'name', 'get_rules_func', 'mute_duration', 'actions', 'active',
+                 'lock', 'dispatcher', 'app_id', 'app_display_name', 'title', 'player_state',
+                 'media', 'verdict', 'awaiting', 'volume_level', 'currently_muted',
+                 'mute_pending', 'muted_by_schedule', 'last_mute_time', 'unmute_timer', 'key')
+
+    def __init__(self, chromecast, get_rules_func, mute_duration=600):
+        self.chromecast = chromecast
+        self.name = chromecast.name
+        self.get_rules_func = get_rules_func
+        self.mute_duration = mute_duration  # Keep muted for 10 minutes by default
+        self.actions = queue.Queue()
+        self.active = False
+        self.lock = threading.Lock()
+        self.dispatcher = None  # set by a DeviceSupervisor to use its worker pool
+
+        self.app_id = None
+        self.app_display_name = None
+        self.title = None
+        self.player_state = None
+        self.media = {}
+        self.verdict = None  # last verdict, reused while the status is unchanged
+        self.awaiting = None  # (video ID, received_at) while its lookup is running
+        self.volume_level = 0
+
+        self.currently_muted = False
+        self.mute_pending = False
+        self.muted_by_schedule = False  # the last action came from a schedule or daily limit
+        self.last_mute_time = 0
+        self.unmute_timer = None
+        self.key = device_key(chromecast)
+
+    def start(self):
+        """Start reacting to status updates, classifying whatever is already playing."""
+        with self.lock:
+            # Updates were ignored while stopped; what played then is gone
+            self.media = {}
+            self.title = None
+            self.verdict = None
+        self.active = True
+        schedules.scheduler.subscribe(self.recheck)
+        self.new_cast_status(self.chromecast.status)
+        media_status = self.chromecast.media_controller.status
+        if media_status:
+            self.new_media_status(media_status)
+
+    def new_cast_status(self, status):
+        """Called by pychromecast when a receiver status message arrives."""
+        if not self.active or status is None:
+            return
+        received_at = time.monotonic()
+        recording.recorder.cast_status(self.name, status)
+        with self.lock:
+            app_changed = status.app_id != self.app_id
+            if app_changed:
+                if status.app_id:
+                    print(
+                        f"[{self.name}] App changed to: {status.app_id} ({status.display_name or 'Unknown'})")
+                else:
+                    print(f"[{self.name}] No app currently running")
+                event_bus.publish('app', device=self.name, app_id=status.app_id,
+                                  display_name=status.display_name)
+            self.app_id = status.app_id
+            self.app_display_name = status.display_name
+            self.volume_level = status.volume_level
+            # Keep our view of the mute state in line with the device
+            self.currently_muted = status.volume_muted
+            self._evaluate(received_at, check_active_media=True)
+        metrics.event_processing.observe(time.monotonic() - received_at)
+        if app_changed:
+            # The new app's media status starts its watch time
+            schedules.scheduler.playback(self.key, status.app_id, False)
+
+    def new_media_status(self, status):
+        """Called by pychromecast when a media status message arrives."""
+        if not self.active or status is None:
+            return
+        received_at = time.monotonic()
+        recording.recorder.media_status(self.name, status)
+        with self.lock:
+            self.media = rule_engine.media_fields(status)
+            title = self.media['title']
+            if title and title != self.title:
+                print(f"[{self.name}] Media title: {title}")
+                event_bus.publish('title', device=self.name, app_id=self.app_id, title=title)
+            self.title = title
+            self.player_state = status.player_state
+            app_id = self.app_id
+            self.awaiting = None
+            video = youtube_video(self.app_id, self.media)
+            if video:
+                metadata = enrichment.enricher.cached(video)
+                if metadata is not None:
+                    enrichment.merge(self.media, metadata)
+                    recording.recorder.metadata(self.name, video, metadata)
+                    video = None
+                elif not title:
+                    # Rather than block an untitled video outright, wait
+                    # for the lookup (at most FETCH_TIMEOUT)
+                    self.awaiting = (video, received_at)
+            self._evaluate(received_at)
+        metrics.event_processing.observe(time.monotonic() - received_at)
+        schedules.scheduler.playback(self.key, app_id,
+                                     status.player_state in rule_engine.PLAYING_STATES, self.name)
+        if video:
+            # Outside the lock: a lookup that is already done calls back right away
+            future = None
+            try:
+                future = enrichment.enricher.request(video, self.new_metadata)
+            finally:
+                if future is None:
+                    self.lookup_unavailable(video)
+
+    def new_metadata(self, video, metadata):
+        """Called on a lookup thread once a video's metadata is known."""
+        if not self.active:
+            return
+        with self.lock:
+            if enrichment.video_id(self.media.get('content_id')) != video:
+                return  # Something else is playing by now
+            received_at = self.awaiting[1] if self.awaiting else time.monotonic()
+            self.awaiting = None
+            recording.recorder.metadata(self.name, video, metadata)
+            enrichment.merge(self.media, metadata)
+            if metadata.get('title') and not self.title:
+                self.title = metadata['title']
+                print(f"[{self.name}] Looked up title: {self.title}")
+                event_bus.publish('title', device=self.name, app_id=self.app_id, title=self.title)
+            self._evaluate(received_at)
+
+    def lookup_unavailable(self, video):
+        """Stop waiting for a lookup that never started and classify without it."""
+        with self.lock:
+            if not self.awaiting or self.awaiting[0] != video:
+                return
+            received_at = self.awaiting[1]
+            self.awaiting = None
+            self._evaluate(received_at)
+
+    def recheck(self):
+        """Called by the scheduler when a block window starts or ends or a daily limit changes."""
+        if not self.active:
+            return
+        with self.lock:
+            action = self._evaluate(time.monotonic(), check_active_media=True)
+            release = (self.muted_by_schedule and self.currently_muted
+                       and action is None and not self.awaiting)
+        if release:
+            print(f"[{self.name}] Schedule no longer applies, unmuting...")
+            self.unmute('Schedule ended')
+
+    def load_media_failed(self, queue_item_id, error_code):
+        """Required by MediaStatusListener; failed loads need no action."""
+
+    def _evaluate(self, received_at, check_active_media=False):
+        """Classify the current status and dispatch what it calls for. Returns the action."""
+        if self.awaiting:
+            return None
+        table = self.get_rules_func()
+        action, reason, term, self.verdict = classify(
+            table, dict(self.media, app_id=self.app_id, display_name=self.app_display_name),
+            self.verdict)
+
+        # Block windows and used-up daily limits apply whatever the rules say
+        override = schedules.scheduler.verdict(self.app_id)
+        if override:
+            action, reason = override
+            term = None
+
+        # Cautious mode also mutes any running app with the volume up
+        if (check_active_media and not action and table.cautious
+                and self.volume_level > 0 and self.app_id):
+            action = 'block'
+            reason = "Cautious check for active media"
+            term = None
+
+        verdict_at = time.monotonic()
+        metrics.event_status_to_verdict.observe(verdict_at - received_at)
+        if needs_action(action, self.currently_muted, self.player_state) and not self.mute_pending:
+            self.mute_pending = True
+            self.muted_by_schedule = override is not None
+            metrics.count_detection(self.app_id)
+            self.dispatch((action, reason, term, self.player_state, received_at, verdict_at))
+        return action
+
+    def dispatch(self, action):
+        """Hand an action off to whoever does the device I/O."""
+        if self.dispatcher is not None:
+            self.dispatcher(action)
+        else:
+            self.actions.put(action)
+
+    def perform(self, action):
+        """Carry out a dispatched action. Sends the commands and returns without waiting."""
+        kind, reason, term, player_state, received_at, verdict_at = action
+        if kind in command_queue.ACTION_COMMANDS:
+            print(f"[{self.name}] ⚠️ Chromecast {kind} due to detection: {reason}")
+            event_bus.publish('detection', device=self.name, app_id=self.app_id, reason=reason,
+                              term=term, title=self.title, action=kind)
+            enforce(self.chromecast, kind, player_state,
+                    lambda results: self.enforced(results, reason, received_at, verdict_at))
+
+    def enforced(self, results, reason, received_at, verdict_at):
+        """Called once the device has answered the commands for an action."""
+        muted = report_enforced(self.name, results, reason, verdict_at)
+        with self.lock:
+            self.mute_pending = False
+            if muted:
+                # currently_muted follows the receiver status, which pychromecast
+                # delivers before this answer; the device may have been unmuted since
+                self.last_mute_time = time.monotonic()
+                self._schedule_unmute(self.mute_duration)
+        if muted:
+            print(
+                f"[{self.name}] Status-to-mute latency: {(time.monotonic() - received_at) * 1000:.0f} ms")
+
+    def _schedule_unmute(self, delay):
+        """Set the timer that ends our mute. Call with the lock held."""
+        if self.unmute_timer:
+            self.unmute_timer.cancel()
+        self.unmute_timer = timers.call_later(delay, self.mute_expired)
+
+    def mute_expired(self):
+        """Runs on the timer queue once the mute duration has passed."""
+        with self.lock:
+            self.unmute_timer = None
+            if not self.active or not self.currently_muted:
+                return
+            if schedules.scheduler.verdict(self.app_id):
+                # Still inside a block window or over a daily limit
+                self._schedule_unmute(self.mute_duration)
+                return
+        print(
+            f"[{self.name}] Mute duration ({self.mute_duration/60:.1f} minutes) expired, unmuting...")
+        self.unmute('Mute duration expired')
+
+    def unmute(self, reason):
+        """Send an unmute without waiting for it."""
+        CommandQueue.for_chromecast(self.chromecast).submit(
+            'unmute', lambda command: self.unmuted(command, reason))
+
+    def unmuted(self, command, reason):
+        """Called once the device has answered an unmute sent by unmute()."""
+        with self.lock:
+            if command.ok:
+                self.currently_muted = False
+                self.muted_by_schedule = False
+                self.last_mute_time = 0
+            elif self.active:
+                self._schedule_unmute(5)  # Try again in 5 seconds
+        if command.ok:
+            event_bus.publish('mute', device=self.name, muted=False, reason=reason)
+            print(f"[{self.name}] Unmuted Chromecast")
+        else:
+            print(f"[{self.name}] Failed to unmute")
+
+    def stop(self):
+        """Stop reacting to status updates, schedules and timers."""
+        self.active = False
+        schedules.scheduler.unsubscribe(self.recheck)
+        schedules.scheduler.playback(self.key, None, False)
+        with self.lock:
+            if self.unmute_timer:
+                self.unmute_timer.cancel()
+                self.unmute_timer = None
+
+    def release(self):
+        """Stop reacting to status updates and unmute the device if it is muted."""
+        self.stop()
+        if self.currently_muted:
+            # Stopping is the one place worth waiting for the device
+            command = CommandQueue.for_chromecast(self.chromecast).submit('unmute')
+            if command.wait(command_queue.ACK_TIMEOUT):
+                event_bus.publish('mute', device=self.name, muted=False, reason='Blocker stopped')
+                print(f"[{self.name}] Unmuted Chromecast before stopping")
+            else:
+                print(f"[{self.name}] Error unmuting before exit")
+        with self.lock:
+            self.currently_muted = False
+            self.mute_pending = False
+            self.muted_by_schedule = False
+            self.last_mute_time = 0
+
+    def run(self):
+        """Carry out queued actions until monitoring stops."""
+        # Mutes expire on the timer queue; the queue only needs waking to stop
+        lifecycle.supervisor.on_stop(lambda: self.actions.put(None))
+        while lifecycle.supervisor.monitoring:
+            action = self.actions.get()
+            if action is not None:
+                self.perform(action)
+
+        self.release()
+
+
+def monitor_chromecast_events(chromecast):
+    """Monitor the Chromecast through status listeners instead of polling."""
+    threading.current_thread().name = f'monitor {chromecast.name}'
+    from connection_manager import ConnectionManager
+    from pychromecast.controllers.youtube import YouTubeController
+
+    try:
+        print(f"Connecting to {chromecast.name}...")
+        ConnectionManager.for_chromecast(chromecast)
+        chromecast.wait()
+        print(f"Connected to {chromecast.name}")
+
+        try:
+            yt = YouTubeController()
+            chromecast.register_handler(yt)
+            print("Registered YouTube controller")
+        except Exception as e:
+            print(f"Warning: Could not register YouTube controller: {e}")
+            print("Will continue without YouTube-specific controls")
+
+        monitor = EventDrivenMonitor(chromecast, get_rules_function())
+        chromecast.register_status_listener(monitor)
+        chromecast.media_controller.register_status_listener(monitor)
+        monitor.start()
+
+        print(f"Now monitoring {chromecast.name} for status events "
+              f"({time.monotonic() - STARTED_AT:.2f}s after start)...")
+        monitor.run()
+
+        print("Monitoring function exiting")
+
+    except Exception as e:
+        print(f"Unexpected error in monitor_chromecast_events: {e}")
+
+
+def start_services():
+    """Load what earlier runs left behind and start the background writers. Safe to call twice."""
+    global services_started
+    if services_started:
+        return
+    services_started = True
+    # Content seen before a restart is recognised without classifying it again
+    verdict_cache.cache.load()
+    verdict_cache.cache.start_autosave()
+    enrichment.enricher.load()
+    enrichment.enricher.start_autosave()
+    # Daily limits carry on from where they were before a restart
+    schedules.scheduler.load()
+    schedules.scheduler.start_autosave()
+    # Detections, mutes, app changes and titles are kept in history.db
+    event_bus.bus.add_listener(history.store.record)
+    history.store.start()
+    # Play time and blocks per app, device and hour for /api/stats
+    analytics.rollups.load()
+    analytics.rollups.start_autosave()
+    event_bus.bus.add_listener(analytics.rollups.record)
+    if memory_profile.low_memory:
+        memory_profile.settle()
+
+
+def monitor_in_foreground(target, *args):
+    """Monitor until the monitor gives up or a signal asks us to stop (CLI mode)."""
+    lifecycle.supervisor.start_monitoring(target, *args, shutdown_after=True)
+    lifecycle.supervisor.wait_for_shutdown()
+
+
+def replay_recording(path, speed=0, verdicts_path=None):
+    """Replay a recording through the current rules and print what they decided and how fast."""
+    out = sys.stdout
+    verdicts = open(verdicts_path, 'w') if verdicts_path else None
+
+    def on_verdict(verdict):
+        if verdicts:
+            verdicts.write(json.dumps(verdict) + '\n')
+        elif verdict['enforced']:
+            print(f"[{verdict['at']:9.1f}s] [{verdict['device']}] {verdict['enforced']}: "
+                  f"{verdict['title'] or verdict['app_id']} ({verdict['reason']})", file=out)
+
+    rules = get_rules_function()
+    try:
+        # The monitors narrate every title; only the verdicts matter here
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            summary = recording.replay(path, EventDrivenMonitor, rules, speed, on_verdict)
+    finally:
+        if verdicts:
+            verdicts.close()
+
+    def counts(counter):
+        return ', '.join(f'{action} {count}' for action, count in sorted(counter.items(), key=str))
+
+    print(f"Replayed {summary['events']} status messages from {summary['devices']} device(s), "
+          f"{summary['recorded_seconds']}s recorded, in {summary['replay_seconds']}s "
+          f"({summary['events_per_second']} events/s)")
+    latency = summary['latency_ms']
+    if latency:
+        print(f"Status to verdict: p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+              f"p99 {latency['p99']} ms, max {latency['max']} ms")
+    print(f"Verdicts: {counts(summary['verdicts']) or 'none'}")
+    print(f"Enforced: {counts(summary['enforced']) or 'nothing'}")
+
+
+def classify_titles(args):
+    """Run every row of a file through the rules; stats go to stderr."""
+    if args.keywords:
+        rules = rule_engine.default_rules(rule_engine.split_keywords(args.keywords))
+    else:
+        try:
+            from web_server import get_rules
+            rules = get_rules()
+        except (ImportError, AttributeError):
+            rules = rule_engine.default_rules(DEFAULT_MINECRAFT_KEYWORDS)
+
+    def report(summary):
+        rate = summary['rows'] / summary['seconds'] if summary['seconds'] else 0
+        blocked = summary['blocked'] / summary['rows'] * 100 if summary['rows'] else 0
+        print(f"{summary['rows']} rows in {summary['seconds']:.1f}s ({rate:.0f} rows/s), "
+              f"{summary['blocked']} acted on ({blocked:.2f}%), "
+              f"{summary['skipped']} skipped as unreadable", file=sys.stderr)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        summary = bulk_classify.classify_file(
+            args.input, output, rules, args.format,
+            args.fields or bulk_classify.DEFAULT_FIELDS, args.workers, report)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    report(summary)
+    for heading, counts in (('action', summary['actions']), ('rule', summary['rules']),
+                            ('matched', summary['terms'])):
+        for name, count in counts.most_common():
+            share = count / summary['rows'] * 100 if summary['rows'] else 0
+            print(f"  {heading:8} {name:30} {count:10} rows  {share:6.2f}%", file=sys.stderr)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Chromecast Content Blocker')
     parser.add_argument('--web', action='store_true',
                         help='Run with web interface')
     parser.add_argument('--port', type=int, default=8080,
                         help='Port for web interface')
+    parser.add_argument('--mode', choices=['events', 'poll'], default='events',
+                        help='React to status events (default) or poll every 2 seconds')
+    parser.add_argument('--all-devices', action='store_true',
+                        help='Monitor every cast device on the network (event mode only)')
+    parser.add_argument('--dev-server', action='store_true',
+                        help="Serve the web interface with Flask's development server instead of waitress")
+    parser.add_argument('--low-memory', action='store_true',
+                        help='Smaller caches, buffers and thread pools for a Pi Zero 2 W')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Trace allocations from startup for /api/debug/memory')
+    parser.add_argument('--record', metavar='FILE',
+                        help='Record the status messages the monitor sees to FILE (.jsonl.gz)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    replay_parser = commands.add_parser(
+        'replay', help='Feed a recording through the current rules and report verdicts and speed')
+    replay_parser.add_argument('recording', help='File written by --record')
+    replay_parser.add_argument('--speed', type=float, default=0,
+                               help='1 replays at the recorded pace, 10 ten times faster; '
+                                    '0 (default) as fast as possible')
+    replay_parser.add_argument('--verdicts', metavar='FILE',
+                               help='Write every verdict to FILE as JSON lines, for diffing two runs')
+    classify_parser = commands.add_parser(
+        'classify', help='Show what the rules (or a keyword list) would do to a file of titles')
+    classify_parser.add_argument('input', help='JSONL, CSV, watch-history.json or .html '
+                                               '(maybe .gz), or - for JSONL on stdin')
+    classify_parser.add_argument('--format', choices=bulk_classify.FORMATS,
+                                 help='Input format; guessed from the file name by default')
+    classify_parser.add_argument('--field', action='append', dest='fields', metavar='FIELD',
+                                 choices=rule_engine.FIELDS,
+                                 help='Field or CSV column the rules look at, repeatable '
+                                      '(default: title and channel)')
+    classify_parser.add_argument('--keywords',
+                                 help='Comma-separated keywords to try instead of the configured rules')
+    classify_parser.add_argument('--output', default='-',
+                                 help='Where to write a JSON line per row (default: stdout)')
+    classify_parser.add_argument('--workers', type=int,
+                                 help='Worker processes (default: one per CPU)')
     args = parser.parse_args()
 
+    if args.command == 'classify':
+        classify_titles(args)
+        return
+    if args.command == 'replay':
+        replay_recording(args.recording, args.speed, args.verdicts)
+        return
+
+    if args.trace_memory:
+        memory_profile.start_tracing()
+    if args.low_memory:
+        global DEVICE_WORKERS
+        DEVICE_WORKERS = memory_profile.LOW_MEMORY['device_workers']
+        memory_profile.apply_low_memory()
+
+    monitor_function = monitor_chromecast_events if args.mode == 'events' else monitor_and_control_chromecast
+
+    # Signals only ask the lifecycle supervisor to shut down; cleaning up happens below
+    lifecycle.supervisor.install_signal_handlers()
+
+    if args.record:
+        recording.recorder.start(args.record)
+
     try:
         if args.web:
             # Import the web server and set up the blocker function
             try:
                 import web_server
-                import threading
-                import time
                 import socket
 
-                print(f"Finding Chromecast...")
-                # First find the Chromecast
-                chromecast, browser = find_chromecast()
-
-                # Set up the web server
-                web_server.set_blocker_function(monitor_and_control_chromecast)
-                web_server.set_chromecast_and_browser(chromecast, browser)
+                # Serve the page first; everything slow happens behind it
+                print(f"Starting web interface on port {args.port}...")
+                lifecycle.supervisor.spawn('web', web_server.run_server, '0.0.0.0', args.port,
+                                           not args.dev_server)
+                lifecycle.supervisor.on_shutdown(web_server.shutdown)
+                if web_server.ready.wait(WEB_READY_TIMEOUT):
+                    print(f"Web interface listening {time.monotonic() - STARTED_AT:.2f}s after start")
+                else:
+                    print(f"Web server not listening after {WEB_READY_TIMEOUT}s, carrying on")
 
                 # Get the host IP for display purposes
                 hostname = socket.gethostname()
@@ -430,46 +1024,65 @@ def main():
                 except:
                     host_ip = "pi.local or IP address"
 
-                # Define a function that will be run in a thread to start the web server
-                def run_web_server():
-                    print(f"Starting web interface on port {args.port}...")
-                    web_server.run_server(port=args.port)
-
-                # Start the web server in a separate thread
-                web_thread = threading.Thread(target=run_web_server)
-                web_thread.daemon = True
-                web_thread.start()
-
-                # Give the web server a moment to start
-                print("Waiting for web server to initialize...")
-                time.sleep(3)  # Wait 3 seconds for Flask to start
-
                 print(f"Web interface should now be accessible at:")
                 print(f"  http://{host_ip}:{args.port}")
                 print(f"  http://pi.local:{args.port}")
                 print(f"  http://localhost:{args.port}")
 
+                start_services()
+
+                def discover():
+                    try:
+                        if args.all_devices:
+                            # Devices attach in the background as they are discovered
+                            web_server.set_device_supervisor(create_device_supervisor())
+                        else:
+                            print(f"Finding Chromecast...")
+                            chromecast, browser = find_chromecast()
+                            web_server.set_blocker_function(monitor_function)
+                            web_server.set_chromecast_and_browser(chromecast, browser)
+                        web_server.set_discovery('ready')
+                    except Exception as e:
+                        print(f"Error finding Chromecast: {e}")
+                        web_server.set_discovery('failed', str(e))
+
+                # pychromecast is imported and devices found while the page is already up
+                lifecycle.supervisor.spawn('discovery', discover)
+
                 # Continue with normal operation - the web server is running in the background
                 # and the blocker will be activated when requested through the web interface
-                while True:
-                    time.sleep(1)
+                lifecycle.supervisor.wait_for_shutdown()
 
             except ImportError as e:
                 print(
                     f"Web server module not found: {e}, falling back to CLI mode")
-                chromecast, browser = find_chromecast()
-                monitor_and_control_chromecast(chromecast)
+                start_services()
+                if args.all_devices:
+                    monitor_in_foreground((active_supervisor or create_device_supervisor()).run)
+                else:
+                    chromecast, browser = find_chromecast()
+                    monitor_in_foreground(monitor_function, chromecast)
 
             except Exception as e:
                 print(f"Error starting web interface: {e}")
                 print("Falling back to CLI mode")
-                chromecast, browser = find_chromecast()
-                monitor_and_control_chromecast(chromecast)
+                start_services()
+                if args.all_devices:
+                    monitor_in_foreground((active_supervisor or create_device_supervisor()).run)
+                else:
+                    chromecast, browser = find_chromecast()
+                    monitor_in_foreground(monitor_function, chromecast)
+
+        elif args.all_devices:
+            # CLI mode - Monitor every device on the network indefinitely
+            start_services()
+            monitor_in_foreground(create_device_supervisor().run)
 
         else:
             # CLI mode - Monitor and control Chromecast indefinitely
+            start_services()
             chromecast, browser = find_chromecast()
-            monitor_and_control_chromecast(chromecast)
+            monitor_in_foreground(monitor_function, chromecast)
 
     except KeyboardInterrupt:
         print("\nMonitoring stopped by user")
@@ -478,22 +1091,34 @@ def main():
     finally:
         # Cleanup
         try:
-            global monitoring_active
-            monitoring_active = False
+            print("Cleaning up...")
+            # Stops monitoring (unmuting what we muted), discovery and the web
+            # server, and waits for their threads
+            lifecycle.supervisor.shutdown()
 
             # Only disconnect if socket client exists and is alive
-            print("Cleaning up...")
-            if 'chromecast' in locals() and hasattr(chromecast, 'socket_client') and chromecast.socket_client:
+            if getattr(active_chromecast, 'socket_client', None):
                 try:
-                    chromecast.disconnect()
+                    active_chromecast.disconnect()
                     print("Disconnected from Chromecast")
                 except Exception as e:
                     print(f"Error during disconnect: {e}")
 
             # Stop discovery if browser exists
-            if 'browser' in locals():
-                browser.stop_discovery()
+            if active_browser:
+                active_browser.stop_discovery()
                 print("Stopped discovery service")
+
+            if active_supervisor:
+                active_supervisor.shutdown()
+                print("Stopped device supervisor")
+
+            verdict_cache.cache.stop_autosave()
+            enrichment.enricher.stop_autosave()
+            schedules.scheduler.stop_autosave()
+            analytics.rollups.stop_autosave()
+            history.store.stop()
+            recording.recorder.stop()
         except Exception as cleanup_error:
             print(f"Error during cleanup: {cleanup_error}")
 
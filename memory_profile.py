@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+import gc
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import tracemalloc
+
+import analytics
+import enrichment
+import event_bus
+import history
+import verdict_cache
+from timer_queue import timers
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per allocation; enough to get from the standard library back to its caller
+TRACE_FRAMES = 10
+TOP = 25
+MAX_TOP = 200
+
+# The low-memory profile, for a 512 MB Pi Zero 2 W shared with other services
+LOW_MEMORY = {
+    'verdict_cache_entries': 512,
+    'metadata_entries': 1000,
+    'metadata_workers': 1,
+    'history_buffer': 2000,
+    'history_cache_kib': 256,
+    'event_buffer': 50,
+    'analytics_days': 92,  # Older days are still on disk in history.db
+    'device_workers': 2,
+    'web_threads': 4,
+    'thread_stack_size': 512 * 1024,
+    'gc_threshold': (500, 10, 10),
+}
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STDLIB = sysconfig.get_paths()['stdlib']
+SITE_PACKAGES = os.sep + 'site-packages' + os.sep
+
+low_memory = False
+previous_snapshot = None  # The last snapshot reported, to show growth since then
+snapshot_lock = threading.Lock()
+
+
+def apply_low_memory():
+    """
+    Bound every buffer and cache more tightly, use fewer worker threads with
+    smaller stacks and collect garbage a little more eagerly. Call before
+    the web server, monitors and discovery start their threads; main.py
+    sizes the device worker pool itself.
+    """
+    global low_memory
+    import web_server
+
+    settings = LOW_MEMORY
+    verdict_cache.cache.max_entries = settings['verdict_cache_entries']
+    enrichment.enricher.max_entries = settings['metadata_entries']
+    enrichment.enricher.max_workers = settings['metadata_workers']
+    history.store.resize(settings['history_buffer'])
+    history.store.cache_kib = settings['history_cache_kib']
+    event_bus.SUBSCRIBER_BUFFER = settings['event_buffer']
+    analytics.rollups.keep_days = settings['analytics_days']
+    web_server.WEB_THREADS = settings['web_threads']
+    # Stacks are reserved per thread; most of ours only ever use a few pages
+    threading.stack_size(settings['thread_stack_size'])
+    gc.set_threshold(*settings['gc_threshold'])
+    low_memory = True
+    logger.info("Low-memory profile on")
+
+
+def settle():
+    """
+    Once startup is over, move everything it created out of the garbage
+    collector's way: those objects live as long as the process, so scanning
+    them on every full collection only costs time.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def process_memory():
+    """Resident and peak memory in KiB, from /proc where there is one."""
+    memory = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM', 'VmSize', 'RssAnon', 'RssFile'):
+                    memory[key] = int(value.split()[0])
+    except OSError:
+        import resource
+        memory['VmHWM'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return memory
+
+
+def subsystem(filename):
+    """The package or module of ours a source file belongs to, or None for the standard library."""
+    if SITE_PACKAGES in filename:
+        package = filename.split(SITE_PACKAGES, 1)[1].split(os.sep, 1)[0]
+        return 'protobuf' if package == 'google' else package.split('.')[0]
+    if filename.startswith(ROOT + os.sep):
+        return os.path.splitext(os.path.relpath(filename, ROOT))[0].replace(os.sep, '.')
+    if filename.startswith(STDLIB) or filename.startswith('<'):
+        return None
+    return 'other'
+
+
+def owner(traceback):
+    """Attribute an allocation to the innermost frame outside the standard library."""
+    for frame in reversed(traceback):
+        name = subsystem(frame.filename)
+        if name is not None:
+            return name
+    return 'stdlib'
+
+
+def buffers():
+    """How full each of our own buffers and caches is, against its bound."""
+    return {
+        'verdict_cache': [len(verdict_cache.cache.entries), verdict_cache.cache.max_entries],
+        'metadata_cache': [len(enrichment.enricher.entries), enrichment.enricher.max_entries],
+        'history_pending': [len(history.store.pending), history.store.pending.maxlen],
+        'event_history': [len(event_bus.bus.history), event_bus.bus.history.maxlen],
+        'event_subscribers': [event_bus.bus.subscriber_count(), None],
+        'analytics_days': [len(analytics.rollups.days), analytics.rollups.keep_days],
+        'timers': [timers.pending(), None],
+    }
+
+
+def start_tracing(frames=TRACE_FRAMES):
+    """Start tracing allocations; only those made from now on are seen."""
+    global previous_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        with snapshot_lock:
+            previous_snapshot = None
+        logger.info("Tracing memory allocations")
+
+
+def stop_tracing():
+    global previous_snapshot
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        with snapshot_lock:
+            previous_snapshot = None
+        logger.info("Stopped tracing memory allocations")
+
+
+def report(top=TOP):
+    """
+    Process memory, garbage collector and thread counts and buffer fill
+    levels; while tracing, also the top allocating lines, a breakdown by
+    subsystem and the lines that grew most since the previous report.
+    """
+    global previous_snapshot
+    top = max(1, min(int(top), MAX_TOP))
+    threads = threading.enumerate()
+    result = {
+        'memory_kib': process_memory(),
+        'low_memory': low_memory,
+        'gc': {'counts': gc.get_count(), 'thresholds': gc.get_threshold(),
+               'frozen': gc.get_freeze_count(), 'objects': len(gc.get_objects())},
+        'threads': {'count': len(threads), 'stack_size': threading.stack_size(),
+                    'names': sorted(thread.name for thread in threads)},
+        'buffers': buffers(),
+        'modules': len(sys.modules),
+        'tracing': tracemalloc.is_tracing(),
+    }
+    if not tracemalloc.is_tracing():
+        return result
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+    traced, peak = tracemalloc.get_traced_memory()
+    by_subsystem = {}
+    for stat in snapshot.statistics('traceback'):
+        name = owner(stat.traceback)
+        entry = by_subsystem.setdefault(name, [0, 0])
+        entry[0] += stat.size
+        entry[1] += stat.count
+    result['traced_kib'] = {'current': traced // 1024, 'peak': peak // 1024}
+    result['by_subsystem'] = [
+        {'subsystem': name, 'kib': round(size / 1024, 1), 'blocks': count}
+        for name, (size, count) in sorted(by_subsystem.items(), key=lambda item: -item[1][0])]
+    result['top'] = [
+        {'line': f'{stat.traceback[-1].filename}:{stat.traceback[-1].lineno}',
+         'kib': round(stat.size / 1024, 1), 'blocks': stat.count}
+        for stat in snapshot.statistics('lineno')[:top]]
+    with snapshot_lock:
+        previous, previous_snapshot = previous_snapshot, snapshot
+    if previous is not None:
+        result['growth'] = [
+            {'line': f'{stat.traceback[-1].filename}:{stat.traceback[-1].lineno}',
+             'kib': round(stat.size_diff / 1024, 1), 'blocks': stat.count_diff}
+            for stat in snapshot.compare_to(previous, 'lineno')[:top] if stat.size_diff > 0]
+    return result
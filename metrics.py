@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds, from sub-millisecond matching up to slow device round trips
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _CounterValue:
+    __slots__ = ('lock', 'value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class _HistogramValue:
+    __slots__ = ('lock', 'bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.lock = threading.Lock()
+        self.bounds = bounds
+        # One slot per bucket plus +Inf; cumulative counts are only built when scraped
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket', labels + (('le', le),), cumulative
+        yield f'{name}_count', labels, cumulative
+        yield f'{name}_sum', labels, total
+
+
+class Metric:
+    """
+    A named family of counters or histograms, one per combination of label values.
+    Look children up once with labels() and keep them, so the hot path only
+    pays for a single uncontended lock.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+        (registry or REGISTRY).register(self)
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_value())
+        return child
+
+    def samples(self):
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in children:
+            yield from child.samples(self.name, tuple(zip(self.labelnames, values)))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_text = ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+                    lines.append(f'{name}{{{label_text}}} {value}')
+                else:
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+REGISTRY = Registry()
+
+# Detection pipeline
+processing_seconds = Histogram(
+    'blocker_processing_seconds',
+    'Time spent handling one poll loop pass or one status event', ['mode'])
+status_to_verdict_seconds = Histogram(
+    'blocker_status_to_verdict_seconds',
+    'Time from a status arriving to the block/allow verdict', ['mode'])
+verdict_to_mute_seconds = Histogram(
+    'blocker_verdict_to_mute_seconds',
+    'Time from a block verdict to the device acknowledging the mute')
+keyword_match_seconds = Histogram(
+    'blocker_keyword_match_seconds', 'Time spent matching one text against the keywords')
+detections_total = Counter(
+    'blocker_detections_total', 'Block verdicts by app', ['app'])
+verdict_cache_total = Counter(
+    'blocker_verdict_cache_total',
+    'Verdict lookups: unchanged status, cache hit, or miss (classified)', ['result'])
+
+# Devices
+commands_total = Counter(
+    'blocker_commands_total', 'Commands sent to devices', ['command', 'result'])
+command_ack_seconds = Histogram(
+    'blocker_command_ack_seconds', 'Time from submitting a command to the device acknowledging it',
+    ['command'])
+command_retries_total = Counter(
+    'blocker_command_retries_total', 'Commands sent again after failing or going unanswered',
+    ['command'])
+reconnects_total = Counter(
+    'blocker_reconnects_total', 'Connections restored after being lost')
+connection_losses_total = Counter(
+    'blocker_connection_losses_total', 'Connections lost')
+
+# History
+history_flush_seconds = Histogram(
+    'blocker_history_flush_seconds', 'Time spent writing one batch of history events to disk')
+history_events_written_total = Counter(
+    'blocker_history_events_written_total', 'History events written to disk')
+
+# Web interface
+http_request_seconds = Histogram(
+    'blocker_http_request_seconds', 'Web request latency', ['route', 'method', 'status'])
+
+# Children used on every pass, bound once up front
+poll_processing = processing_seconds.labels('poll')
+event_processing = processing_seconds.labels('events')
+poll_status_to_verdict = status_to_verdict_seconds.labels('poll')
+event_status_to_verdict = status_to_verdict_seconds.labels('events')
+VERDICT_CACHE_RESULTS = {result: verdict_cache_total.labels(result)
+                         for result in ('unchanged', 'hit', 'miss')}
+COMMAND_RESULTS = {(command, ok): commands_total.labels(command, 'ok' if ok else 'failed')
+                   for command in ('mute', 'unmute', 'pause', 'quit') for ok in (True, False)}
+
+
+def count_command(command, ok):
+    COMMAND_RESULTS[command, ok].inc()
+
+
+def count_detection(app_id):
+    detections_total.labels(app_id or 'none').inc()
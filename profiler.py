@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import collections
+import math
+import os
+import sys
+import sysconfig
+import threading
+import time
+
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 120
+DEFAULT_INTERVAL_MS = 10  # 100 samples a second
+MIN_INTERVAL_MS = 1
+MAX_DEPTH = 100  # Frames kept per stack, counted from the innermost
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STDLIB = sysconfig.get_paths()['stdlib']
+SITE_PACKAGES = os.sep + 'site-packages' + os.sep
+
+# One profile at a time; a second would only measure the first
+lock = threading.Lock()
+
+
+def short_path(filename):
+    """A source file relative to our directory, site-packages or the standard library."""
+    if SITE_PACKAGES in filename:
+        return filename.split(SITE_PACKAGES, 1)[1]
+    for base in (ROOT, STDLIB):
+        if filename.startswith(base + os.sep):
+            return os.path.relpath(filename, base)
+    return os.path.basename(filename)
+
+
+def thread_label(thread):
+    """The thread's name, with the class of library threads that kept the default name."""
+    name = thread.name
+    if name.startswith('Thread-') and type(thread) is not threading.Thread:
+        return f'{type(thread).__name__} {name}'
+    return name
+
+
+def cpu_clock(thread):
+    """Seconds of CPU the thread has used, or None where the OS cannot tell."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError, TypeError):
+        # No per-thread clocks here, or the thread has just ended
+        return None
+
+
+def profile(seconds=DEFAULT_SECONDS, interval_ms=DEFAULT_INTERVAL_MS, wall=False):
+    """
+    Sample the Python stack of every thread for seconds, every interval_ms,
+    and return the collapsed stacks (flamegraph.pl's input format, thread
+    name as the root frame) and CPU used per thread.
+
+    Nothing is hooked in between profiles: sampling reads
+    sys._current_frames() from the calling thread, which leaves itself out.
+    By default a thread's stack only counts when its CPU clock moved since
+    the previous sample, so threads waiting on a socket or a queue drop out;
+    wall=True counts every sample. Raises ValueError for a duration or
+    interval that is not a finite number and RuntimeError if a profile is
+    already running.
+    """
+    seconds, interval_ms = float(seconds), float(interval_ms)
+    if not (math.isfinite(seconds) and math.isfinite(interval_ms)):
+        raise ValueError('seconds and interval_ms must be finite numbers')
+    seconds = min(max(seconds, 0.1), MAX_SECONDS)
+    interval = max(interval_ms, MIN_INTERVAL_MS) / 1000
+    if not lock.acquire(blocking=False):
+        raise RuntimeError('A profile is already running')
+    try:
+        return _sample(seconds, interval, wall)
+    finally:
+        lock.release()
+
+
+def _sample(seconds, interval, wall):
+    me = threading.get_ident()
+    frames_seen = {}  # (code, line) -> label, so each frame is formatted once
+    stacks = collections.Counter()
+    thread_samples = collections.Counter()
+    cpu_started = {}  # ident -> CPU clock when first seen
+    cpu_last = {}  # ident -> CPU clock at the previous sample
+    labels = {}  # ident -> (label, native_id)
+    samples = 0
+
+    process_started = time.process_time()
+    own_started = cpu_clock(threading.current_thread())
+    started = time.monotonic()
+    for thread in threading.enumerate():
+        cpu_started[thread.ident] = cpu_last[thread.ident] = cpu_clock(thread)
+    deadline = started + seconds
+    next_sample = started
+    while True:
+        next_sample += interval
+        time.sleep(max(0.0, next_sample - time.monotonic()))
+        if time.monotonic() >= deadline:
+            break
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        current = sys._current_frames()
+        samples += 1
+        for ident, frame in current.items():
+            thread = threads.get(ident)
+            if ident == me or thread is None:
+                continue
+            label = thread_label(thread)
+            labels[ident] = (label, thread.native_id)
+            clock = cpu_clock(thread)
+            if ident not in cpu_started:
+                # Started during the profile; its clock began at zero
+                cpu_started[ident] = 0.0 if clock is not None else None
+            previous = cpu_last.get(ident)
+            cpu_last[ident] = clock
+            if not wall and clock is not None and previous is not None and clock <= previous:
+                continue
+            thread_samples[ident] += 1
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                key = (frame.f_code, frame.f_lineno)
+                name = frames_seen.get(key)
+                if name is None:
+                    code = frame.f_code
+                    name = frames_seen[key] = (f'{getattr(code, "co_qualname", code.co_name)} '
+                                               f'({short_path(code.co_filename)}:{frame.f_lineno})')
+                stack.append(name)
+                frame = frame.f_back
+            stack.append(label)
+            stacks[';'.join(reversed(stack))] += 1
+        current = None  # Holding on to the frames would keep their locals alive
+
+    elapsed = time.monotonic() - started
+    own = cpu_clock(threading.current_thread())
+    threads = []
+    for ident, (label, native_id) in labels.items():
+        start, end = cpu_started.get(ident), cpu_last.get(ident)
+        cpu = end - start if start is not None and end is not None else None
+        threads.append({
+            'name': label,
+            'native_id': native_id,
+            'cpu_seconds': round(cpu, 4) if cpu is not None else None,
+            'cpu_percent': round(cpu / elapsed * 100, 1) if cpu is not None else None,
+            'samples': thread_samples[ident],
+        })
+    threads.sort(key=lambda entry: (-(entry['cpu_seconds'] or 0), entry['name']))
+    return {
+        'seconds': round(elapsed, 3),
+        'interval_ms': interval * 1000,
+        'samples': samples,
+        'mode': 'wall' if wall else 'cpu',
+        'process_cpu_seconds': round(time.process_time() - process_started, 4),
+        # What the sampling itself cost; included in the process total
+        'profiler_cpu_seconds': round(own - own_started, 4) if own is not None else None,
+        'threads': threads,
+        'collapsed': [f'{stack} {count}' for stack, count in stacks.most_common()],
+    }
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+import array
+import collections
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import command_queue
+import enrichment
+import schedules
+import verdict_cache
+
+logger = logging.getLogger(__name__)
+
+# Where POST /api/debug/recording puts recordings
+RECORDINGS_DIR = 'recordings'
+
+FORMAT_VERSION = 1
+
+# What the monitor looks at in each kind of status; everything else is left out
+CAST_FIELDS = ('app_id', 'display_name', 'volume_level', 'volume_muted')
+CAST_DEFAULTS = {'app_id': None, 'display_name': None, 'volume_level': 0, 'volume_muted': False}
+MEDIA_METADATA_FIELDS = ('title', 'subtitle', 'seriesTitle', 'artist', 'albumArtist')
+MEDIA_FIELDS = ('content_id', 'player_state')
+
+
+def present(status, fields):
+    """The fields of a status object that are set."""
+    values = {field: getattr(status, field, None) for field in fields}
+    return {field: value for field, value in values.items() if value is not None}
+
+
+def cast_payload(status):
+    return present(status, CAST_FIELDS)
+
+
+def media_payload(status):
+    payload = present(status, MEDIA_FIELDS)
+    metadata = getattr(status, 'media_metadata', None) or {}
+    metadata = {field: metadata[field] for field in MEDIA_METADATA_FIELDS if metadata.get(field)}
+    if metadata:
+        payload['metadata'] = metadata
+    return payload
+
+
+class Recorder:
+    """
+    Write the receiver and media status messages the monitors see to a
+    gzipped file, one JSON line per message:
+
+        [milliseconds since the start, device, kind, fields]
+
+    kind is 'c' for a receiver status, 'm' for a media status and 'y' for
+    YouTube metadata applied to the current media. Only the fields the
+    monitor looks at are kept. When not recording, each message costs one
+    attribute check.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.started = None
+        self.events = 0
+
+    @property
+    def recording(self):
+        return self.file is not None
+
+    def start(self, path=None):
+        """Start recording to path (default: a new file in RECORDINGS_DIR). Returns the path."""
+        with self.lock:
+            if self.file is not None:
+                raise RuntimeError(f'Already recording to {self.path}')
+            if path is None:
+                os.makedirs(RECORDINGS_DIR, exist_ok=True)
+                path = os.path.join(RECORDINGS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.jsonl.gz')
+            f = gzip.open(path, 'wt', encoding='utf-8')
+            f.write(json.dumps({'recording': FORMAT_VERSION, 'started': time.time()}) + '\n')
+            self.path = path
+            self.started = time.monotonic()
+            self.events = 0
+            self.file = f
+        logger.info(f"Recording status messages to {path}")
+        return path
+
+    def stop(self):
+        """Stop recording and close the file. Returns the path, message count and duration."""
+        with self.lock:
+            summary = self._status()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                summary['recording'] = False
+                logger.info(f"Recorded {self.events} status messages to {self.path}")
+        return summary
+
+    def status(self):
+        with self.lock:
+            return self._status()
+
+    def _status(self):
+        return {
+            'recording': self.file is not None,
+            'path': self.path,
+            'events': self.events,
+            'seconds': round(time.monotonic() - self.started, 1) if self.file is not None else None,
+        }
+
+    def cast_status(self, device, status):
+        if self.file is not None:
+            self._write(device, 'c', cast_payload(status))
+
+    def media_status(self, device, status):
+        if self.file is not None:
+            self._write(device, 'm', media_payload(status))
+
+    def metadata(self, device, video, metadata):
+        if self.file is not None:
+            self._write(device, 'y', {'video': video, 'metadata': metadata})
+
+    def _write(self, device, kind, payload):
+        line = json.dumps([round((time.monotonic() - self.started) * 1000), device, kind, payload],
+                          separators=(',', ':'))
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line + '\n')
+                self.events += 1
+
+
+def read(path):
+    """
+    Yield (seconds, device, kind, fields) from a recording, one line at a
+    time. A recording cut short (the process was killed) ends at the last
+    complete line.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('recording') != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a status recording')
+        try:
+            for line in f:
+                try:
+                    ms, device, kind, fields = json.loads(line)
+                except ValueError:
+                    break  # A line cut in half
+                yield ms / 1000, device, kind, fields
+        except EOFError:
+            logger.warning(f"{path} ends early; replaying what it has")
+
+
+class ReplayCast:
+    """Stands in for a device whose status messages come from a recording."""
+
+    def __init__(self, name):
+        self.name = name
+        self.uuid = None
+        self.status = None
+        self.media_controller = SimpleNamespace(status=None)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def replay(path, monitor_class, get_rules_func, speed=0, on_verdict=None):
+    """
+    Feed a recording through a monitor per device, as fast as possible or,
+    with speed > 0, at speed times the recorded pace. Commands the monitors
+    send are only noted, as if the device carried them out at once, and
+    YouTube lookups come from the recording rather than the network.
+
+    Verdicts depend only on the recording and the rules: while it runs the
+    shared scheduler, verdict cache, metadata cache and recorder are
+    replaced by empty ones, so block windows and daily limits do not apply,
+    nothing cached by the live blocker or an earlier replay is reused, and
+    the real watch time is left alone. They are put back when it ends.
+
+    on_verdict(verdict) is called whenever a device's verdict changes and
+    whenever a monitor acts. Returns a summary: events/s and the time from
+    each status message to its verdict.
+    """
+    monitors = {}
+    latencies = array.array('d')
+    verdicts = collections.Counter()
+    enforced = collections.Counter()
+    last = {}  # device -> (title, action) last passed to on_verdict
+    acted = []
+
+    def dispatched(monitor, action):
+        # Called by the monitor with its lock held
+        acted.append(action[0])
+        monitor.mute_pending = False
+        if 'mute' in command_queue.ACTION_COMMANDS.get(action[0], ()):
+            monitor.currently_muted = True
+
+    global recorder
+    live = (schedules.scheduler, verdict_cache.cache, enrichment.enricher, recorder)
+    schedules.scheduler = schedules.Scheduler(path=None)
+    verdict_cache.cache = verdict_cache.VerdictCache(path=None)
+    enrichment.enricher = enrichment.MetadataEnricher(endpoint=None, path=None)
+    recorder = Recorder()
+    events = 0
+    recorded = 0.0
+    started = time.perf_counter()
+    try:
+        for at, device, kind, fields in read(path):
+            if speed > 0:
+                delay = at / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            monitor = monitors.get(device)
+            if monitor is None:
+                monitor = monitors[device] = monitor_class(ReplayCast(device), get_rules_func)
+                monitor.dispatcher = lambda action, monitor=monitor: dispatched(monitor, action)
+                monitor.start()
+
+            received = time.perf_counter()
+            if kind == 'c':
+                monitor.new_cast_status(SimpleNamespace(**{**CAST_DEFAULTS, **fields}))
+            elif kind == 'm':
+                monitor.new_media_status(SimpleNamespace(
+                    media_metadata=fields.get('metadata', {}), content_id=fields.get('content_id'),
+                    player_state=fields.get('player_state')))
+            elif kind == 'y':
+                monitor.new_metadata(fields['video'], fields['metadata'])
+            else:
+                continue
+            latencies.append(time.perf_counter() - received)
+            events += 1
+            recorded = at
+
+            action = monitor.verdict[1][0] if monitor.verdict else None
+            if acted or (monitor.title, action) != last.get(device):
+                last[device] = (monitor.title, action)
+                verdicts[action] += 1
+                for performed in acted:
+                    enforced[performed] += 1
+                if on_verdict:
+                    on_verdict({
+                        'at': at,
+                        'device': device,
+                        'app_id': monitor.app_id,
+                        'title': monitor.title,
+                        'action': action,
+                        'reason': monitor.verdict[1][1] if monitor.verdict else None,
+                        'enforced': acted[-1] if acted else None,
+                    })
+                acted.clear()
+    finally:
+        for monitor in monitors.values():
+            monitor.stop()
+        schedules.scheduler, verdict_cache.cache, enrichment.enricher, recorder = live
+
+    elapsed = time.perf_counter() - started
+    return {
+        'events': events,
+        'devices': len(monitors),
+        'recorded_seconds': round(recorded, 1),
+        'replay_seconds': round(elapsed, 3),
+        'events_per_second': round(events / elapsed) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.5) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'max': round(max(latencies) * 1000, 3),
+        } if latencies else None,
+        'verdicts': dict(verdicts),
+        'enforced': dict(enforced),
+    }
+
+
+# Shared by the monitors, the web server and main.py
+recorder = Recorder()
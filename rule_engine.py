@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import threading
+import time
+
+import metrics
+from keyword_matcher import TitleMatcher
+
+# Fields a rule can look at, as collected from the receiver and media status
+# (channel, tags and category come from looking YouTube videos up)
+FIELDS = ('app_id', 'display_name', 'title', 'subtitle', 'series', 'artist',
+          'channel', 'tags', 'category', 'content_id', 'player_state')
+
+# 'any_text' looks at every human-readable field at once
+TEXT_FIELDS = ('display_name', 'title', 'subtitle', 'series', 'artist', 'channel', 'tags',
+               'category')
+
+MATCHES = ('keywords', 'contains', 'equals', 'missing')
+ACTIONS = ('allow', 'block', 'mute', 'pause', 'quit')
+
+# The YouTube receiver app
+YOUTUBE_APP_ID = '233637DE'
+
+PLAYING_STATES = ('PLAYING', 'BUFFERING')
+
+
+def default_rules(keywords):
+    """
+    Rules equivalent to a plain keyword list: block anything whose app name or
+    media text matches, and YouTube videos playing without a title. No
+    keywords means no rules, which puts the table in cautious mode.
+    """
+    if not keywords:
+        return []
+    return [
+        {'name': 'Keywords', 'app_id': '', 'field': 'any_text', 'match': 'keywords',
+         'value': list(keywords), 'player_states': [], 'action': 'block',
+         'priority': 0, 'enabled': True},
+        {'name': 'Untitled YouTube video', 'app_id': YOUTUBE_APP_ID, 'field': 'title',
+         'match': 'missing', 'value': '', 'player_states': list(PLAYING_STATES),
+         'action': 'block', 'priority': 0, 'enabled': True},
+    ]
+
+
+def rules_digest(rules):
+    """Short fingerprint of a rule list that stays the same across restarts."""
+    data = json.dumps(rules, sort_keys=True, default=list)
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+
+def split_keywords(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [keyword.strip().lower() for keyword in value if keyword.strip()]
+
+
+def validate_rule(rule):
+    """Return a cleaned copy of a rule from the web interface, or raise ValueError."""
+    if not isinstance(rule, dict):
+        raise ValueError("Each rule must be an object")
+    name = str(rule.get('name') or '').strip() or 'Unnamed rule'
+    field = rule.get('field', 'any_text')
+    if field not in FIELDS + ('any_text',):
+        raise ValueError(f"{name}: unknown field '{field}'")
+    match = rule.get('match', 'keywords')
+    if match not in MATCHES:
+        raise ValueError(f"{name}: unknown match '{match}'")
+    action = rule.get('action', 'block')
+    if action not in ACTIONS:
+        raise ValueError(f"{name}: unknown action '{action}'")
+    try:
+        priority = int(rule.get('priority', 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: priority must be a whole number")
+
+    value = rule.get('value', '')
+    if match == 'keywords':
+        value = split_keywords(value)
+        if not value:
+            raise ValueError(f"{name}: add at least one keyword")
+    elif match == 'missing':
+        value = ''
+    else:
+        value = str(value).strip()
+        if not value:
+            raise ValueError(f"{name}: a value is required for '{match}'")
+
+    player_states = rule.get('player_states') or []
+    if isinstance(player_states, str):
+        player_states = player_states.split(',')
+    player_states = [state.strip().upper() for state in player_states if state.strip()]
+
+    return {
+        'name': name,
+        'app_id': str(rule.get('app_id') or '').strip(),
+        'field': field,
+        'match': match,
+        'value': value,
+        'player_states': player_states,
+        'action': action,
+        'priority': priority,
+        'enabled': bool(rule.get('enabled', True)),
+    }
+
+
+class CompiledRule:
+    """A rule with its matcher built, ready to test against status fields."""
+
+    __slots__ = ('name', 'app_id', 'fields', 'match', 'value', 'player_states',
+                 'action', 'priority', 'order', 'matcher')
+
+    def __init__(self, rule, order):
+        self.name = rule.get('name', 'Unnamed rule')
+        self.app_id = rule.get('app_id') or ''
+        field = rule.get('field', 'any_text')
+        self.fields = TEXT_FIELDS if field == 'any_text' else (field,)
+        self.match = rule.get('match', 'keywords')
+        self.player_states = frozenset(rule.get('player_states') or ())
+        self.action = rule.get('action', 'block')
+        self.priority = rule.get('priority', 0)
+        self.order = order
+        self.matcher = None
+        value = rule.get('value', '')
+        if self.match == 'keywords':
+            self.matcher = TitleMatcher(split_keywords(value))
+            self.value = None
+        else:
+            self.value = str(value).casefold()
+
+    def test(self, fields):
+        """Return (description, term) for what matched, or None; term is None for 'missing'."""
+        if self.player_states and fields.get('player_state') not in self.player_states:
+            return None
+        if self.match == 'missing':
+            if any(fields.get(field) for field in self.fields):
+                return None
+            return f"no {' or '.join(self.fields)}", None
+        for field in self.fields:
+            text = fields.get(field)
+            if not text:
+                continue
+            if self.match == 'keywords':
+                started = time.perf_counter()
+                found = self.matcher.search(text)
+                metrics.keyword_match_seconds.observe(time.perf_counter() - started)
+                term = found[0] if found else None
+            elif self.match == 'contains':
+                term = self.value if self.value in text.casefold() else None
+            else:
+                term = self.value if self.value == text.casefold() else None
+            if term is not None:
+                return f"{field}: {text}; matched '{term}'", term
+        return None
+
+
+class DecisionTable:
+    """
+    Rules compiled for fast dispatch.
+
+    Rules are sorted by priority (highest first, then by position) and grouped
+    by the app they apply to, so a status update looks up its app ID once and
+    only walks the rules that can apply to it. The first rule that matches
+    decides. With no enabled rules the table is in cautious mode and blocks
+    anything that is playing.
+    """
+
+    def __init__(self, rules, generation=None):
+        self.generation = generation
+        self.digest = rules_digest(rules)
+        compiled = [CompiledRule(rule, order) for order, rule in enumerate(rules)
+                    if rule.get('enabled', True)]
+        compiled.sort(key=lambda rule: (-rule.priority, rule.order))
+        self.cautious = not compiled
+        self.rule_count = len(compiled)
+        self.wildcard = tuple(rule for rule in compiled if not rule.app_id)
+        self.by_app = {}
+        for app_id in {rule.app_id for rule in compiled if rule.app_id}:
+            self.by_app[app_id] = tuple(rule for rule in compiled
+                                        if not rule.app_id or rule.app_id == app_id)
+
+    def __len__(self):
+        return self.rule_count
+
+    def rules_for(self, app_id):
+        return self.by_app.get(app_id, self.wildcard)
+
+    def decide(self, fields):
+        """
+        Return (action, reason, term) for the status fields; action is None if
+        nothing matched, and term is the keyword or value the rule matched.
+        """
+        action, _, reason, term = self.explain(fields)
+        return action, reason, term
+
+    def explain(self, fields):
+        """Like decide(), but returns (action, rule name, reason, term); the name is None unless a rule matched."""
+        if self.cautious:
+            if (fields.get('display_name') or fields.get('title')
+                    or fields.get('player_state') in PLAYING_STATES):
+                return 'block', None, "Cautious mode - blocking all content", None
+            return None, None, "", None
+        for rule in self.rules_for(fields.get('app_id')):
+            matched = rule.test(fields)
+            if matched is not None:
+                description, term = matched
+                return rule.action, rule.name, f"{rule.name} ({description})", term
+        return None, None, "", None
+
+
+# Most recently compiled table, keyed on the config generation it came from
+_cached = None
+_cache_lock = threading.Lock()
+
+
+def get_table(rules, generation):
+    """Return the DecisionTable for a config generation, compiling it only once."""
+    global _cached
+
+    table = _cached
+    if table is not None and generation is not None and table.generation == generation:
+        return table
+    with _cache_lock:
+        table = _cached
+        if table is not None and generation is not None and table.generation == generation:
+            return table
+        table = DecisionTable(rules, generation)
+        _cached = table
+        return table
+
+
+def media_fields(media_status):
+    """Pull the fields rules look at out of a pychromecast media status."""
+    if media_status is None:
+        return {}
+    metadata = getattr(media_status, 'media_metadata', None) or {}
+    return {
+        'title': metadata.get('title') or None,
+        'subtitle': metadata.get('subtitle') or None,
+        'series': metadata.get('seriesTitle') or None,
+        'artist': metadata.get('artist') or metadata.get('albumArtist') or None,
+        'content_id': getattr(media_status, 'content_id', None),
+        'player_state': getattr(media_status, 'player_state', None),
+    }
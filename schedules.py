@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import event_bus
+from autosave import Autosaver
+from timer_queue import timers
+
+logger = logging.getLogger(__name__)
+
+USAGE_FILE = 'quota_usage.json'
+SAVE_INTERVAL = 60
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+ACTIONS = ('block', 'mute', 'pause', 'quit')
+
+
+def parse_time(value):
+    """'HH:MM' to seconds after midnight, or raise ValueError."""
+    try:
+        hours, minutes = str(value).strip().split(':')
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        raise ValueError(f"'{value}' is not a time like 21:30")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f"'{value}' is not a time like 21:30")
+    return hours * 3600 + minutes * 60
+
+
+def split_list(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [item.strip() for item in value or () if str(item).strip()]
+
+
+def validate_window(window):
+    """Return a cleaned copy of a block window from the web interface, or raise ValueError."""
+    if not isinstance(window, dict):
+        raise ValueError("Each schedule must be an object")
+    name = str(window.get('name') or '').strip() or 'Unnamed schedule'
+    days = [day.lower()[:3] for day in split_list(window.get('days'))]
+    for day in days:
+        if day not in DAYS:
+            raise ValueError(f"{name}: unknown day '{day}'")
+    start, end = window.get('start', ''), window.get('end', '')
+    for value in (start, end):
+        try:
+            parse_time(value)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}")
+    action = window.get('action', 'block')
+    if action not in ACTIONS:
+        raise ValueError(f"{name}: unknown action '{action}'")
+    return {
+        'name': name,
+        'days': days,
+        'start': str(start).strip(),
+        'end': str(end).strip(),
+        'app_id': str(window.get('app_id') or '').strip(),
+        'action': action,
+        'enabled': bool(window.get('enabled', True)),
+    }
+
+
+def validate_quota(quota):
+    """Return a cleaned copy of a daily quota from the web interface, or raise ValueError."""
+    if not isinstance(quota, dict):
+        raise ValueError("Each limit must be an object")
+    app_id = str(quota.get('app_id') or '').strip()
+    name = str(quota.get('name') or '').strip() or app_id or 'Unnamed limit'
+    if not app_id:
+        raise ValueError(f"{name}: an app ID is required")
+    try:
+        minutes = float(quota.get('minutes', 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: minutes must be a number")
+    if not 0 <= minutes <= 24 * 60:
+        raise ValueError(f"{name}: minutes must be between 0 and 1440")
+    action = quota.get('action', 'block')
+    if action not in ACTIONS:
+        raise ValueError(f"{name}: unknown action '{action}'")
+    if minutes == int(minutes):
+        minutes = int(minutes)
+    return {'name': name, 'app_id': app_id, 'minutes': minutes, 'action': action,
+            'enabled': bool(quota.get('enabled', True))}
+
+
+class Window:
+    """A compiled block window: a time range on some days of the week."""
+
+    __slots__ = ('name', 'days', 'start', 'end', 'app_id', 'action')
+
+    def __init__(self, window):
+        self.name = window['name']
+        self.days = frozenset(DAYS.index(day) for day in window.get('days') or ()) or None
+        self.start = parse_time(window['start'])
+        self.end = parse_time(window['end'])
+        self.app_id = window.get('app_id') or ''
+        self.action = window.get('action', 'block')
+
+    def on_day(self, weekday):
+        return self.days is None or weekday in self.days
+
+    def active_at(self, moment):
+        seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+        weekday = moment.weekday()
+        if self.start == self.end:
+            return self.on_day(weekday)  # all day
+        if self.start < self.end:
+            return self.on_day(weekday) and self.start <= seconds < self.end
+        # Runs past midnight: the early hours belong to the previous day's window
+        return ((self.on_day(weekday) and seconds >= self.start)
+                or (self.on_day((weekday - 1) % 7) and seconds < self.end))
+
+    def next_boundary(self, moment):
+        """The next time after moment this window may start or end."""
+        midnight = datetime.combine(moment.date(), datetime.min.time())
+        for day in range(8):
+            for offset in sorted((self.start, self.end)):
+                boundary = midnight + timedelta(days=day, seconds=offset)
+                if boundary > moment:
+                    return boundary
+        return None
+
+    def applies_to(self, app_id):
+        return not self.app_id or self.app_id == app_id
+
+
+class Scheduler:
+    """
+    Time-based blocking: block windows by time of day and daily watch-time
+    quotas per app.
+
+    Nothing here runs on a tick. Windows put one timer on the shared timer
+    queue for the next time any of them starts or ends. Watch time is added
+    up from playback transitions reported by the monitors, and while an app
+    with a quota is playing a single timer is set for the moment its quota
+    runs out. Another timer resets the counts at midnight. Usage is saved
+    to disk now and then and on shutdown, so it survives restarts. Listeners
+    are called whenever what is blocked changes.
+    """
+
+    def __init__(self, path=USAGE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.config = None  # (windows, quotas) as last configured
+        self.windows = ()
+        self.quotas = {}  # app_id -> (seconds, action, name)
+        self.day = date.today().isoformat()
+        self.usage = {}  # app_id -> seconds watched today, not counting sessions in progress
+        self.sessions = {}  # device -> (app_id, counted_from), restarted at midnight
+        self.watching = {}  # device -> (wall time playback started, device name)
+        self.active_windows = ()
+        self.exhausted = set()
+        self.listeners = set()
+        self.window_timer = None
+        self.midnight_timer = None
+        self.quota_timers = {}  # app_id -> Timer
+        self.dirty = False
+        self.autosaver = Autosaver(self.save, 'watch-time-saver')
+
+    def subscribe(self, callback):
+        """Call callback() whenever a window starts or ends or a quota runs out or resets."""
+        self.listeners.add(callback)
+
+    def unsubscribe(self, callback):
+        self.listeners.discard(callback)
+
+    def _notify(self):
+        event_bus.publish('schedule', **self.status())
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in schedule listener: {e}")
+
+    # Configuration
+
+    def configure(self, windows, quotas):
+        """Replace the block windows and daily quotas, as dicts from the config."""
+        if (windows, quotas) == self.config:
+            return
+        self.config = (windows, quotas)
+        compiled = []
+        limits = {}
+        try:
+            for window in windows:
+                window = validate_window(window)
+                if window['enabled']:
+                    compiled.append(Window(window))
+            for quota in quotas:
+                quota = validate_quota(quota)
+                if quota['enabled']:
+                    limits[quota['app_id']] = (quota['minutes'] * 60, quota['action'], quota['name'])
+        except ValueError as e:
+            # Most likely a hand edit of the config file; keep what we have
+            logger.error(f"Ignoring schedules from the config: {e}")
+            return
+        with self.lock:
+            self.windows = tuple(compiled)
+            self.quotas = limits
+            self._check_quotas(time.monotonic())
+            if self.midnight_timer is None:
+                self._schedule_midnight()
+        self._update_windows()
+        self._notify()
+
+    # Decisions
+
+    def verdict(self, app_id):
+        """Return (action, reason) if a window or quota blocks app_id right now, else None."""
+        if not app_id:
+            return None
+        for window in self.active_windows:
+            if window.applies_to(app_id):
+                return window.action, f"Schedule: {window.name}"
+        if app_id in self.exhausted:
+            limit, action, name = self.quotas.get(app_id, (0, 'block', app_id))
+            return action, f"Daily limit reached: {name} ({limit / 60:g} min)"
+        return None
+
+    # Block windows
+
+    def _update_windows(self):
+        """Work out which windows are active and wake up at the next change."""
+        now = datetime.now()
+        with self.lock:
+            active = tuple(window for window in self.windows if window.active_at(now))
+            changed = active != self.active_windows
+            self.active_windows = active
+            if self.window_timer:
+                self.window_timer.cancel()
+                self.window_timer = None
+            boundaries = [boundary for boundary in
+                          (window.next_boundary(now) for window in self.windows) if boundary]
+            if boundaries:
+                delay = (min(boundaries) - now).total_seconds()
+                self.window_timer = timers.call_later(delay, self._window_boundary)
+        if changed:
+            names = ', '.join(window.name for window in active) or 'none'
+            logger.info(f"Active schedules: {names}")
+        return changed
+
+    def _window_boundary(self):
+        if self._update_windows():
+            self._notify()
+
+    # Watch time
+
+    def _used(self, app_id, now):
+        return self.usage.get(app_id, 0) + sum(now - started for app, started in
+                                               self.sessions.values() if app == app_id)
+
+    def playback(self, device, app_id, playing, name=None):
+        """
+        Record whether a device is playing app_id. Only transitions are acted
+        on; each stretch of playback is published as a 'watched' event when
+        it ends.
+        """
+        now = time.monotonic()
+        apps = set()
+        watched = None
+        with self.lock:
+            session = self.sessions.get(device)
+            if session and (not playing or session[0] != app_id):
+                del self.sessions[device]
+                self.usage[session[0]] = self.usage.get(session[0], 0) + now - session[1]
+                apps.add(session[0])
+                self.dirty = True
+                started, watcher = self.watching.pop(device, (None, device))
+                if started is not None:
+                    watched = (watcher, session[0], started)
+            if playing and app_id and device not in self.sessions:
+                self.sessions[device] = (app_id, now)
+                self.watching[device] = (time.time(), name or device)
+                apps.add(app_id)
+            for app in apps:
+                self._schedule_quota(app, now)
+        if watched:
+            watcher, app, started = watched
+            event_bus.publish('watched', device=watcher, app_id=app, started=started,
+                              seconds=time.time() - started)
+        if apps:
+            event_bus.publish('schedule', **self.status())
+
+    def _check_quotas(self, now):
+        """Work out which quotas are used up and reset their timers. Call with the lock held."""
+        exhausted = {app_id for app_id, (limit, _, _) in self.quotas.items()
+                     if self._used(app_id, now) >= limit}
+        changed = exhausted != self.exhausted
+        self.exhausted = exhausted
+        for app_id in set(self.quota_timers) | set(self.quotas):
+            self._schedule_quota(app_id, now)
+        return changed
+
+    def _schedule_quota(self, app_id, now):
+        """Set a timer for when app_id's quota runs out at the current rate. Call with the lock held."""
+        timer = self.quota_timers.pop(app_id, None)
+        if timer:
+            timer.cancel()
+        if app_id not in self.quotas or app_id in self.exhausted:
+            return
+        playing = sum(1 for app, _ in self.sessions.values() if app == app_id)
+        if not playing:
+            return
+        remaining = self.quotas[app_id][0] - self._used(app_id, now)
+        self.quota_timers[app_id] = timers.call_later(max(0.0, remaining / playing),
+                                                      self._quota_due, app_id)
+
+    def _quota_due(self, app_id):
+        now = time.monotonic()
+        with self.lock:
+            self.quota_timers.pop(app_id, None)
+            if app_id not in self.quotas or app_id in self.exhausted:
+                return
+            if self._used(app_id, now) < self.quotas[app_id][0] - 0.5:
+                self._schedule_quota(app_id, now)
+                return
+            self.exhausted.add(app_id)
+        logger.info(f"Daily limit reached for {app_id}")
+        self._notify()
+
+    def _schedule_midnight(self):
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        self.midnight_timer = timers.call_later((midnight - now).total_seconds(), self._new_day)
+
+    def _new_day(self):
+        """Start counting again at midnight; playback in progress carries on from zero."""
+        now = time.monotonic()
+        with self.lock:
+            self.midnight_timer = None
+            today = date.today().isoformat()
+            if today == self.day:
+                # Woke up a little early; try again at the real midnight
+                self._schedule_midnight()
+                return
+            self.day = today
+            self.usage = {}
+            self.dirty = True
+            self.sessions = {device: (app_id, now) for device, (app_id, _) in self.sessions.items()}
+            self.exhausted = set()
+            for app_id in set(self.quota_timers) | set(self.quotas):
+                self._schedule_quota(app_id, now)
+            self._schedule_midnight()
+        logger.info("New day: watch time reset")
+        self._notify()
+
+    def status(self):
+        now = time.monotonic()
+        with self.lock:
+            apps = set(self.usage) | set(self.quotas) | {app for app, _ in self.sessions.values()}
+            return {
+                'day': self.day,
+                'usage_minutes': {app: round(self._used(app, now) / 60, 1) for app in sorted(apps)},
+                'active_windows': [window.name for window in self.active_windows],
+                'exhausted': sorted(self.exhausted),
+            }
+
+    # Persistence
+
+    def load(self):
+        """Pick up today's watch time from before a restart."""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            usage = {str(app): float(seconds) for app, seconds in data.get('usage', {}).items()}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Error loading watch time: {e}")
+            return
+        if data.get('day') != date.today().isoformat():
+            return
+        with self.lock:
+            for app, seconds in usage.items():
+                self.usage[app] = self.usage.get(app, 0) + seconds
+            # Limits used up before the restart apply again straight away
+            changed = self._check_quotas(time.monotonic())
+        logger.info(f"Loaded today's watch time for {len(usage)} app(s)")
+        if changed:
+            self._notify()
+
+    def save(self):
+        """
+        Write today's watch time to disk if it changed since the last save,
+        counting sessions still in progress, so a power cut loses at most
+        one save interval of it.
+        """
+        if self.path is None or not (self.dirty or self.sessions):
+            return
+        now = time.monotonic()
+        with self.lock:
+            apps = set(self.usage) | {app for app, _ in self.sessions.values()}
+            data = {'day': self.day, 'usage': {app: self._used(app, now) for app in apps}}
+            self.dirty = False
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving watch time: {e}")
+
+    def start_autosave(self, interval=SAVE_INTERVAL):
+        if self.path is not None:
+            self.autosaver.start(interval)
+
+    def stop_autosave(self):
+        """End every session in progress so its time counts, and save."""
+        self.autosaver.stop()
+        for device in list(self.sessions):
+            self.playback(device, None, False)
+        self.save()
+
+
+scheduler = Scheduler()
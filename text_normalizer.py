@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import re
+import unicodedata
+
+# Lookalike letters from other scripts, folded onto the Latin letter they imitate.
+# Only lowercase forms are needed because text is casefolded first.
+CONFUSABLES = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'з': '3', 'и': 'u', 'і': 'i',
+    'ї': 'i', 'ј': 'j', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'п': 'n',
+    'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ѕ': 's', 'ԁ': 'd',
+    'ԛ': 'q', 'ԝ': 'w', 'ɡ': 'g',
+    # Greek
+    'α': 'a', 'β': 'b', 'γ': 'y', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k',
+    'μ': 'u', 'ν': 'v', 'ο': 'o', 'ρ': 'p', 'σ': 'o', 'τ': 't', 'υ': 'u',
+    'χ': 'x', 'ω': 'w',
+    # Latin lookalikes NFKC leaves alone
+    'ı': 'i', 'ł': 'l', 'ø': 'o', 'đ': 'd', 'ħ': 'h', 'ŀ': 'l', 'ƒ': 'f',
+}
+
+# Digits read as letters inside words ("M1n3craft")
+LEET_DIGITS = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '6': 'g', '7': 't',
+    '8': 'b', '9': 'g',
+})
+
+# Symbols read as letters when they lead into a letter or digit ("$teve", "m!necraft")
+LEET_SYMBOLS = {
+    '@': 'a', '$': 's', '!': 'i', '|': 'l', '+': 't', '€': 'e', '£': 'l',
+}
+LEET_SYMBOL_PATTERN = re.compile(r'[@$!|+€£](?=[^\W_])')
+
+# A word is a run of letters and digits in any script
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def fold_characters(text):
+    """NFKC, casefold, strip accents and fold lookalike letters."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    if text.isascii():
+        return text
+
+    folded = []
+    for ch in unicodedata.normalize('NFD', text):
+        if unicodedata.category(ch) == 'Mn':
+            continue
+        folded.append(CONFUSABLES.get(ch, ch))
+    return ''.join(folded)
+
+
+def tokenize(text):
+    """
+    Return the normalized words of text.
+    Everything that is not a letter or digit separates words, and runs of
+    single characters are joined back up ("m i n e c r a f t" -> "minecraft").
+    """
+    text = fold_characters(text)
+    text = LEET_SYMBOL_PATTERN.sub(lambda match: LEET_SYMBOLS[match.group()], text)
+    tokens = WORD_PATTERN.findall(text)
+
+    merged = []
+    letters = []
+    for token in tokens:
+        if len(token) == 1:
+            letters.append(token)
+            continue
+        if letters:
+            merged.append(''.join(letters))
+            letters = []
+        merged.append(token)
+    if letters:
+        merged.append(''.join(letters))
+
+    # Digits only stand for letters in words that also contain letters,
+    # so "2024" and "10" stay as they are
+    return [token.translate(LEET_DIGITS) if not token.isdigit() else token
+            for token in merged]
+
+
+def normalize_text(text):
+    """Return text as normalized words separated by single spaces."""
+    return ' '.join(tokenize(text))
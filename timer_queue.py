@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """A callback due at a monotonic time. Cancel it with cancel()."""
+
+    __slots__ = ('when', 'seq', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, seq, callback, args):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerQueue:
+    """
+    Run callbacks at given times from a single thread.
+
+    Timers sit in a heap ordered by due time, so the thread sleeps until the
+    next one is due instead of waking up on a tick, and adding a timer is
+    O(log n). Cancelled timers are skipped when they reach the top.
+    Callbacks run on the timer thread and must not block.
+    """
+
+    def __init__(self, name='timers'):
+        self.name = name
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) at monotonic time when. Returns the Timer."""
+        timer = Timer(when, next(self.counter), callback, args)
+        with self.condition:
+            heapq.heappush(self.heap, timer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+            # Only an earlier deadline changes how long the thread should sleep
+            if self.heap[0] is timer:
+                self.condition.notify()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def pending(self):
+        with self.condition:
+            return sum(1 for timer in self.heap if not timer.cancelled)
+
+    def _next_due(self):
+        """Wait for the next timer that is due and pop it."""
+        with self.condition:
+            while True:
+                while self.heap and self.heap[0].cancelled:
+                    heapq.heappop(self.heap)
+                now = time.monotonic()
+                if self.heap and self.heap[0].when <= now:
+                    return heapq.heappop(self.heap)
+                self.condition.wait(self.heap[0].when - now if self.heap else None)
+
+    def _run(self):
+        while True:
+            timer = self._next_due()
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.error(f"Error in timer callback {timer.callback!r}: {e}")
+
+
+# Shared by everything that needs a wake-up call
+timers = TimerQueue()
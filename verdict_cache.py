@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from autosave import Autosaver
+from rule_engine import FIELDS
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'verdict_cache.json'
+
+# Bump when matching changes in a way that makes stored verdicts wrong
+CACHE_VERSION = 5
+
+MAX_ENTRIES = 2048
+TTL = 24 * 3600  # Seconds a verdict is trusted for
+SAVE_INTERVAL = 60
+
+
+def cache_key(table, fields):
+    """Key for a verdict: the rule set it came from plus every field a rule can look at."""
+    return (table.digest,) + tuple(fields.get(field) for field in FIELDS)
+
+
+class VerdictCache:
+    """
+    Remember the verdict for each media status so it is only classified once.
+
+    Entries are keyed on the rule set's digest and the status fields, so
+    editing the rules never serves an old verdict, and are evicted least
+    recently used first or once they are older than the TTL. The cache is
+    saved to disk now and then and on shutdown, so content seen before a
+    restart is recognised straight away afterwards.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (action, reason, term, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0
+        self.dirty = False
+        self.autosaver = Autosaver(self.save, 'verdict-cache-saver')
+
+    def lookup(self, table, fields, previous=None):
+        """
+        Return (key, (action, reason, term)) for the fields, classifying with the
+        table only on a miss. previous is what the caller got last time; when
+        the fields have not changed it is handed back without even a lookup.
+        """
+        key = cache_key(table, fields)
+        if previous is not None and previous[0] == key:
+            self.unchanged += 1
+            metrics.VERDICT_CACHE_RESULTS['unchanged'].inc()
+            return previous
+
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[3] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.VERDICT_CACHE_RESULTS['hit'].inc()
+                return key, entry[:3]
+
+        verdict = table.decide(fields)
+        with self.lock:
+            self.entries[key] = verdict + (now,)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.misses += 1
+            self.dirty = True
+        metrics.VERDICT_CACHE_RESULTS['miss'].inc()
+        return key, verdict
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dirty = True
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.unchanged
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'unchanged': self.unchanged,
+            'hit_ratio': round((self.hits + self.unchanged) / lookups, 4) if lookups else None,
+        }
+
+    # Persistence
+
+    def load(self):
+        """Read verdicts saved by an earlier run, dropping expired ones."""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != CACHE_VERSION:
+                logger.info("Ignoring verdict cache from another version")
+                return
+            now = time.time()
+            entries = OrderedDict()
+            for key, action, reason, term, stored_at in data.get('entries', []):
+                if now - stored_at < self.ttl:
+                    entries[tuple(key)] = (action, reason, term, stored_at)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Error loading verdict cache: {e}")
+            return
+        with self.lock:
+            # Anything classified since startup is newer
+            entries.update(self.entries)
+            self.entries = entries
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        logger.info(f"Loaded {len(entries)} cached verdicts")
+
+    def save(self):
+        """Write the cache to disk if it changed since the last save."""
+        if self.path is None or not self.dirty:
+            return
+        with self.lock:
+            entries = [[list(key), action, reason, term, stored_at]
+                       for key, (action, reason, term, stored_at) in self.entries.items()]
+            self.dirty = False
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'entries': entries}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving verdict cache: {e}")
+
+    def start_autosave(self, interval=SAVE_INTERVAL):
+        if self.path is not None:
+            self.autosaver.start(interval)
+
+    def stop_autosave(self):
+        self.autosaver.stop()
+        self.save()
+
+
+cache = VerdictCache()
@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
 
+import hmac
+import os
+import secrets
 import threading
 import time
-import json
-import os
 import socket
 import sys
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, g, render_template, request, jsonify, stream_with_context
 import logging
+from datetime import datetime
+import analytics
+import rule_engine
+import verdict_cache
+import enrichment
+import event_bus
+import history
+import http_cache
+import lifecycle
+import memory_profile
+import profiler
+import recording
+import schedules
+from config_store import ConfigStore, thaw
+import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -15,40 +31,97 @@ logger = logging.getLogger(__name__)
 
 # Create Flask app
 app = Flask(__name__, static_folder='static')
+# The page is only re-rendered when index.html changes, so let Jinja notice that
+app.config['TEMPLATES_AUTO_RELOAD'] = True
+
+# Threads serving requests in production; event streams are served without one
+WEB_THREADS = 12
+
+# Files read, hashed and compressed once; the rendered page per running state
+static_files = http_cache.AssetCache(os.path.join(app.root_path, 'static'))
+template_files = http_cache.AssetCache(os.path.join(app.root_path, 'templates'))
+index_pages = {}
 
 # Global variables
 blocker_running = False
-blocker_thread = None
-keywords = []
 config_file = 'blocker_config.json'
-blocker_stop_event = threading.Event()  # Event to signal thread to stop
+debug_token_file = 'debug_token'  # Created on first use unless BLOCKER_DEBUG_TOKEN is set
+debug_token = None
+hostname = None  # Looked up once; it does not change while we run
 
-# Load configuration if it exists
+# Keywords and other settings; the monitor reads config.snapshot without locking
+config = ConfigStore(config_file, defaults={'keywords': []})
 
 
-def load_config():
-    global keywords
-    try:
-        if os.path.exists(config_file):
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                keywords = config.get('keywords', [])
-                logger.info(f"Loaded keywords from config: {keywords}")
-    except Exception as e:
-        logger.error(f"Error loading config: {e}")
+def on_config_change(snapshot):
+    """Tell open pages and prebuild the rules whenever the config changes."""
+    event_bus.publish('rules', rules=get_rules(snapshot))
+    # Lookups send video IDs to a third party, so they are off unless asked for:
+    # metadata_lookups turns on YouTube oEmbed, metadata_endpoint picks another service
+    endpoint = snapshot.get('metadata_endpoint')
+    if endpoint is None and snapshot.get('metadata_lookups'):
+        endpoint = enrichment.DEFAULT_ENDPOINT
+    enrichment.enricher.endpoint = endpoint or None
+    # Block windows and daily limits; only rearms timers when they changed
+    windows, quotas = get_schedules(snapshot)
+    event_bus.publish('schedules', schedules=windows, quotas=quotas)
+    schedules.scheduler.configure(windows, quotas)
+    # Compile the rules and their matchers now, not on the first title the monitor sees
+    threading.Thread(target=get_rule_table, args=(snapshot,), daemon=True).start()
 
-# Save configuration
 
+config.subscribe(on_config_change)
 
-def save_config():
-    try:
-        with open(config_file, 'w') as f:
-            json.dump({
-                'keywords': keywords
-            }, f)
-        logger.info("Config saved")
-    except Exception as e:
-        logger.error(f"Error saving config: {e}")
+
+def load_config():
+    """Load the config file and keep following edits made to it by hand."""
+    snapshot = config.load()
+    logger.info(f"Loaded keywords from config: {list(snapshot.keywords)}")
+    config.start_watching()
+
+
+def set_keywords(new_keywords):
+    """Replace the keywords of the 'Keywords' rule, saving a new config generation."""
+    snapshot = config.snapshot
+    if snapshot.get('rules') is None:
+        # Still on the default rules, which follow the keyword list
+        config.update(keywords=list(new_keywords))
+        return
+    rules = []
+    replaced = False
+    for rule in get_rules(snapshot):
+        if rule['name'] == 'Keywords' and rule['match'] == 'keywords':
+            if replaced or not new_keywords:
+                continue
+            rule = dict(rule, value=list(new_keywords))
+            replaced = True
+        rules.append(rule)
+    if new_keywords and not replaced:
+        rules.insert(0, rule_engine.validate_rule({'name': 'Keywords', 'field': 'any_text',
+                                                   'match': 'keywords', 'value': new_keywords,
+                                                   'action': 'block'}))
+    config.update(keywords=list(new_keywords), rules=rules)
+
+
+def get_rules(snapshot=None):
+    """Return the configured rules as plain dicts, or the defaults for the keyword list."""
+    snapshot = snapshot or config.snapshot
+    rules = snapshot.get('rules')
+    if rules is None:
+        return rule_engine.default_rules(snapshot.keywords)
+    return thaw(rules)
+
+
+def get_rule_table(snapshot=None):
+    """Return the compiled rules for the current config generation."""
+    snapshot = snapshot or config.snapshot
+    return rule_engine.get_table(get_rules(snapshot), snapshot.generation)
+
+
+def get_schedules(snapshot=None):
+    """Return the configured block windows and daily limits as plain dicts."""
+    snapshot = snapshot or config.snapshot
+    return thaw(snapshot.get('schedules') or ()), thaw(snapshot.get('quotas') or ())
 
 
 # Load config at startup
@@ -58,6 +131,15 @@ load_config()
 blocker_function = None
 chromecast_instance = None
 browser_instance = None
+device_supervisor = None  # Set instead of chromecast_instance when monitoring every device
+
+# main.py looks for devices after the web server is up; 'ready' or 'failed' once it is done
+discovery_state = 'discovering'
+discovery_error = None
+
+# Set once the web server accepts connections
+ready = threading.Event()
+stop_serving = None  # Set by serve(); makes it return
 
 
 def set_blocker_function(func):
@@ -73,22 +155,81 @@ def set_chromecast_and_browser(chromecast, browser):
     logger.info(f"Chromecast set: {chromecast.name if chromecast else 'None'}")
 
 
-def blocker_thread_function():
-    global blocker_running, chromecast_instance, blocker_stop_event
+def set_device_supervisor(supervisor):
+    global device_supervisor
+    device_supervisor = supervisor
+    logger.info("Device supervisor set")
 
-    logger.info("Blocker thread starting...")
 
-    # Reset the stop event whenever we start a new thread
-    blocker_stop_event.clear()
+def set_discovery(state, error=None):
+    """Record how finding devices went and tell every open page."""
+    global discovery_state, discovery_error
+    discovery_state = state
+    discovery_error = error
+    event_bus.publish('discovery', state=state, error=error)
+
 
-    if blocker_function and chromecast_instance:
+def connected_device_names():
+    """Return the names of the devices the blocker works on."""
+    if device_supervisor:
+        return device_supervisor.device_names()
+    if chromecast_instance:
+        return [chromecast_instance.name]
+    return []
+
+
+def get_hostname():
+    global hostname
+    if hostname is None:
         try:
-            # Set global running status to true
-            blocker_running = True
+            hostname = socket.gethostname()
+        except Exception:
+            return "Unknown"
+    return hostname
+
+
+def set_running(running):
+    """Update the running flag and tell every open page about it."""
+    global blocker_running
+    blocker_running = running
+    event_bus.publish('status', running=running)
 
-            # Import the monitoring_active variable from main to control it
-            import main
-            main.monitoring_active = True
+
+def status_snapshot():
+    windows, quotas = get_schedules()
+    return {
+        'running': blocker_running,
+        'keywords': list(get_keywords()),
+        'rules': get_rules(),
+        'schedules': windows,
+        'quotas': quotas,
+        'schedule': schedules.scheduler.status(),
+        'hostname': get_hostname(),
+        'devices': connected_device_names(),
+        'discovery': discovery_state,
+        'discovery_error': discovery_error
+    }
+
+
+def blocker_thread_function():
+    """Runs on the lifecycle supervisor's monitor thread until monitoring stops."""
+    logger.info("Blocker thread starting...")
+
+    if device_supervisor:
+        try:
+            set_running(True)
+            logger.info("Starting device supervisor...")
+            device_supervisor.run()
+            logger.info("Device supervisor returned")
+        except Exception as e:
+            logger.error(f"Error in blocker thread: {e}")
+        finally:
+            set_running(False)
+            logger.info("Blocker thread ending...")
+    elif blocker_function and chromecast_instance:
+        try:
+            # Set global running status to true
+            set_running(True)
 
             logger.info("Starting blocker function...")
             blocker_function(chromecast_instance)
@@ -96,185 +237,173 @@ def blocker_thread_function():
         except Exception as e:
             logger.error(f"Error in blocker thread: {e}")
         finally:
-            blocker_running = False
+            set_running(False)
             logger.info("Blocker thread ending...")
     else:
         logger.error("Blocker function or Chromecast not set")
-        blocker_running = False
+        set_running(False)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        # Label by route pattern rather than path so the series stay bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_seconds.labels(route, request.method, response.status_code).observe(
+            time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+def cache_and_compress(response):
+    # Runs before record_request_latency, so compression counts towards latency
+    return http_cache.finish(response, request)
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Expose counters and histograms in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/')
 def index():
-    return render_template('index.html',
-                           blocker_running=blocker_running,
-                           keywords=', '.join(keywords) if keywords else '')
+    running = blocker_running
+    template = template_files.get('index.html')
+    page = index_pages.get(running)
+    if page is None or template is None or page.mtime != template.mtime:
+        body = render_template('index.html',
+                               blocker_running=running,
+                               rule_fields=('any_text',) + rule_engine.FIELDS,
+                               rule_matches=rule_engine.MATCHES,
+                               rule_actions=rule_engine.ACTIONS)
+        page = index_pages[running] = http_cache.Asset(
+            body.encode('utf-8'), 'text/html', template.mtime if template else None)
+    return page.respond(request)
 
 
 @app.route('/static/<path:path>')
 def send_static(path):
-    return send_from_directory('static', path)
+    asset = static_files.get(path)
+    if asset is None:
+        abort(404)
+    return asset.respond(request, max_age=http_cache.STATIC_MAX_AGE)
 
 
 @app.route('/templates/<path:path>')
 def send_template(path):
-    return send_from_directory('templates', path)
+    asset = template_files.get(path)
+    if asset is None:
+        abort(404)
+    return asset.respond(request)
 
 
 @app.route('/api/status')
 def get_status():
-    global blocker_thread, blocker_running
-
     # Check if thread is still alive and update status accordingly
-    if blocker_thread is not None:
-        if not blocker_thread.is_alive():
-            blocker_thread = None
-            blocker_running = False
-            logger.info("Thread is no longer alive, updated status to stopped")
-
-    # Include hostname in response
-    hostname = "Unknown"
+    if blocker_running and not lifecycle.supervisor.monitor_alive():
+        set_running(False)
+        logger.info("Thread is no longer alive, updated status to stopped")
+
+    return jsonify(status_snapshot())
+
+
+@app.route('/api/events')
+def stream_events():
+    """
+    Push status changes to the browser as Server-Sent Events. Under waitress
+    event_streams serves this path instead, without holding a thread per page.
+    """
     try:
-        hostname = socket.gethostname()
-    except:
-        pass
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
 
-    return jsonify({
-        'running': blocker_running,
-        'keywords': keywords,
-        'hostname': hostname
-    })
+    subscriber = event_bus.bus.subscribe(last_event_id)
+    # A fresh page gets the full state first, then only changes
+    initial = ('snapshot', status_snapshot()) if last_event_id is None else None
+    return Response(stream_with_context(event_bus.bus.stream(subscriber, initial)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/api/start', methods=['POST'])
 def start_blocker():
-    global blocker_thread, blocker_running, blocker_stop_event
-
     logger.info("Start blocker request received")
 
     # First check if the thread is actually running
-    if blocker_thread is not None:
-        if blocker_thread.is_alive():
-            if blocker_running:
-                return jsonify({'status': 'error', 'message': 'Blocker is already running'})
-            else:
-                # Thread exists but status says not running - let's fix the inconsistency
-                logger.warning(
-                    "Thread exists but status says not running - fixing inconsistency")
-                blocker_running = True
-                return jsonify({'status': 'success', 'message': 'Blocker was already running, fixed status'})
+    if lifecycle.supervisor.monitor_alive():
+        if blocker_running:
+            return jsonify({'status': 'error', 'message': 'Blocker is already running'})
+        elif lifecycle.supervisor.monitoring:
+            # Thread exists but status says not running - let's fix the inconsistency
+            logger.warning(
+                "Thread exists but status says not running - fixing inconsistency")
+            set_running(True)
+            return jsonify({'status': 'success', 'message': 'Blocker was already running, fixed status'})
         else:
-            # Thread is not alive, we can clean it up
-            logger.info(
-                "Found dead thread, cleaning up before creating new one")
-            blocker_thread = None
+            # A previous stop timed out waiting for a device
+            return jsonify({'status': 'error',
+                            'message': 'The blocker is still stopping, try again in a moment.'})
 
     # Check if we have a Chromecast to work with
-    if chromecast_instance is None:
+    if chromecast_instance is None and device_supervisor is None:
+        if discovery_state == 'discovering':
+            return jsonify({'status': 'error',
+                            'message': 'Still looking for Chromecasts, try again in a moment.'})
         logger.error("No Chromecast instance available")
         return jsonify({'status': 'error', 'message': 'No Chromecast found. Please restart the service.'})
 
     # Update keywords if provided
     if 'keywords' in request.form:
-        global keywords
         new_keywords = [k.strip().lower()
                         for k in request.form['keywords'].split(',') if k.strip()]
-        keywords = new_keywords
-        save_config()
-        logger.info(f"Updated keywords: {keywords}")
+        set_keywords(new_keywords)
+        logger.info(f"Updated keywords: {new_keywords}")
 
     try:
-        # Create a new thread
-        blocker_stop_event.clear()  # Make sure the stop event is cleared
-
-        # Make sure main.monitoring_active is set to True
-        try:
-            import main
-            main.monitoring_active = True
-            logger.info("Set main.monitoring_active to True")
-        except Exception as e:
-            logger.error(f"Failed to update main.monitoring_active: {e}")
-
-        blocker_thread = threading.Thread(target=blocker_thread_function)
-        blocker_thread.daemon = True
+        # Runs on the lifecycle supervisor's monitor thread; stopping wakes it at once
+        if not lifecycle.supervisor.start_monitoring(blocker_thread_function):
+            return jsonify({'status': 'error', 'message': 'Blocker is already running'})
 
         # Set global status
-        blocker_running = True
-
-        # Start thread
-        blocker_thread.start()
+        set_running(True)
         logger.info("Blocker thread started")
 
         return jsonify({'status': 'success', 'message': 'Blocker started'})
     except Exception as e:
         logger.error(f"Error starting blocker: {e}")
-        blocker_running = False
+        set_running(False)
         return jsonify({'status': 'error', 'message': f'Error starting blocker: {e}'})
 
 
 @app.route('/api/stop', methods=['POST'])
 def stop_blocker():
-    global blocker_running, chromecast_instance, blocker_thread, blocker_stop_event
-
     logger.info("Stop blocker request received")
 
     # If status says not running, update UI but check thread
     if not blocker_running:
-        if blocker_thread is not None and blocker_thread.is_alive():
+        if lifecycle.supervisor.monitor_alive():
             logger.warning(
                 "Status says not running but thread exists - stopping thread anyway")
         else:
             return jsonify({'status': 'error', 'message': 'Blocker is not running'})
 
     try:
-        # Signal the thread to stop via global flag
-        blocker_running = False
-        blocker_stop_event.set()
+        set_running(False)
 
-        # Set the main.py monitoring_active flag to False to stop the monitoring loop
-        try:
-            import main
-            logger.info("Setting main.monitoring_active to False")
-            main.monitoring_active = False
-        except Exception as e:
-            logger.error(f"Failed to update main.monitoring_active: {e}")
-
-        # Attempt to unmute Chromecast if it was muted
-        if chromecast_instance:
-            try:
-                logger.info("Attempting to unmute Chromecast")
-                chromecast_instance.set_volume_muted(False)
-                logger.info("Unmuted Chromecast")
-            except Exception as e:
-                logger.error(f"Failed to unmute: {e}")
-
-        # Give the thread a moment to clean up
-        time.sleep(1)
-
-        # If thread still active, wait a bit longer but don't block the response
-        if blocker_thread and blocker_thread.is_alive():
-            def cleanup_thread():
-                try:
-                    logger.info("Waiting for blocker thread to finish...")
-                    # Wait up to 5 seconds for thread to finish
-                    blocker_thread.join(5)
-                    if blocker_thread.is_alive():
-                        logger.warning("Thread failed to stop within timeout")
-                    else:
-                        logger.info("Blocker thread successfully stopped")
-                except Exception as e:
-                    logger.error(
-                        f"Error while waiting for thread to finish: {e}")
-
-            # Start a cleanup thread to wait for the main blocker thread
-            cleanup = threading.Thread(target=cleanup_thread)
-            cleanup.daemon = True
-            cleanup.start()
+        # Wakes the monitor, which unmutes every device it muted on the way
+        # out; returns once its thread has ended
+        if lifecycle.supervisor.stop_monitoring():
+            logger.info("Blocker thread successfully stopped")
         else:
-            logger.info("Blocker thread was not running or already stopped")
-
-        # Reset blocker_thread if it's no longer alive
-        if blocker_thread and not blocker_thread.is_alive():
-            blocker_thread = None
+            logger.warning("Thread failed to stop within timeout")
 
         logger.info("Blocker stopping")
         return jsonify({'status': 'success', 'message': 'Blocker stopped'})
@@ -285,19 +414,109 @@ def stop_blocker():
 
 @app.route('/api/update_keywords', methods=['POST'])
 def update_keywords():
-    global keywords
-
     if 'keywords' in request.form:
         new_keywords = [k.strip().lower()
                         for k in request.form['keywords'].split(',') if k.strip()]
-        keywords = new_keywords
-        save_config()
-        logger.info(f"Keywords updated: {keywords}")
-        return jsonify({'status': 'success', 'message': 'Keywords updated', 'keywords': keywords})
+        set_keywords(new_keywords)
+        logger.info(f"Keywords updated: {new_keywords}")
+        return jsonify({'status': 'success', 'message': 'Keywords updated', 'keywords': new_keywords})
 
     return jsonify({'status': 'error', 'message': 'No keywords provided'})
 
 
+@app.route('/api/rules', methods=['GET'])
+def list_rules():
+    snapshot = config.snapshot
+    return jsonify({'rules': get_rules(snapshot), 'generation': snapshot.generation})
+
+
+@app.route('/api/rules', methods=['POST'])
+def save_rules():
+    """Replace the whole rule list."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('rules'), list):
+        return jsonify({'status': 'error', 'message': 'No rules provided'})
+    try:
+        rules = [rule_engine.validate_rule(rule) for rule in data['rules']]
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    # Keep the legacy keyword list in step with the keyword rules that act;
+    # an allow rule's terms must not turn into block keywords
+    keywords = list(dict.fromkeys(
+        keyword for rule in rules
+        if rule['match'] == 'keywords' and rule['enabled'] and rule['action'] != 'allow'
+        for keyword in rule['value']))
+    snapshot = config.update(rules=rules, keywords=keywords)
+    logger.info(f"Rules updated: {len(rules)} rule(s), generation {snapshot.generation}")
+    return jsonify({'status': 'success', 'message': 'Rules saved',
+                    'rules': rules, 'generation': snapshot.generation})
+
+
+@app.route('/api/schedules', methods=['GET'])
+def list_schedules():
+    """Block windows, daily limits and how much of each limit is used up today."""
+    windows, quotas = get_schedules()
+    return jsonify({'schedules': windows, 'quotas': quotas, **schedules.scheduler.status()})
+
+
+@app.route('/api/schedules', methods=['POST'])
+def save_schedules():
+    """Replace the block windows and daily limits."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('schedules', []), list) or not isinstance(data.get('quotas', []), list):
+        return jsonify({'status': 'error', 'message': 'Schedules and limits must be lists'})
+    try:
+        windows = [schedules.validate_window(window) for window in data.get('schedules', [])]
+        quotas = [schedules.validate_quota(quota) for quota in data.get('quotas', [])]
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    snapshot = config.update(schedules=windows, quotas=quotas)
+    logger.info(f"Schedules updated: {len(windows)} window(s), {len(quotas)} limit(s)")
+    return jsonify({'status': 'success', 'message': 'Schedules saved', 'schedules': windows,
+                    'quotas': quotas, 'generation': snapshot.generation})
+
+
+def time_arg(name):
+    """A time query parameter as Unix seconds; accepts seconds or ISO 8601."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    Detections, mutes, app changes and titles, newest first. Filter with
+    since/until, kind (comma-separated) and device; pass next_cursor back as
+    cursor for the next page.
+    """
+    try:
+        kinds = [kind.strip() for kind in request.args.get('kind', '').split(',') if kind.strip()]
+        events, next_cursor = history.store.query(
+            since=time_arg('since'), until=time_arg('until'), kinds=kinds or None,
+            device=request.args.get('device') or None, cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', history.PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Bad history query: {e}'})
+    return jsonify({'events': events, 'next_cursor': next_cursor})
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Play time, blocks and matched terms by app, device, hour and day, e.g. ?range=30d."""
+    try:
+        days = analytics.parse_range(request.args.get('range'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Bad range: {e}'})
+    return jsonify(analytics.rollups.stats(days))
+
+
 @app.route('/api/info', methods=['GET'])
 def get_system_info():
     """Return system information"""
@@ -309,25 +528,196 @@ def get_system_info():
     }
 
     try:
-        info['hostname'] = socket.gethostname()
+        info['hostname'] = get_hostname()
         info['ip_address'] = socket.gethostbyname(info['hostname'])
     except Exception as e:
         logger.error(f"Error getting network info: {e}")
 
-    if chromecast_instance:
+    if device_supervisor:
+        names = device_supervisor.device_names()
+        info['chromecast'] = ', '.join(names) if names else 'Discovering devices...'
+    elif chromecast_instance:
         try:
             info['chromecast'] = chromecast_instance.name
         except:
             info['chromecast'] = 'Connected but name unavailable'
 
+    # Uptime, reconnects and time spent disconnected for each device
+    # Imported here: it pulls in pychromecast, which main.py loads in the background
+    import connection_manager
+    info['connections'] = connection_manager.all_stats()
+    # How often a status was answered without running the rules
+    info['verdict_cache'] = verdict_cache.cache.stats()
+    info['metadata'] = enrichment.enricher.stats()
+    info['history'] = history.store.stats()
+
     return jsonify(info)
 
 
-def get_keywords():
-    return keywords
+def get_debug_token():
+    """
+    The token every /api/debug/ endpoint asks for: $BLOCKER_DEBUG_TOKEN, or
+    else the one in debug_token, which is created readable only by us the
+    first time.
+    """
+    global debug_token
+    if debug_token is None:
+        # An empty token counts as unset; it would let an empty header in
+        token = os.environ.get('BLOCKER_DEBUG_TOKEN', '').strip()
+        if not token:
+            try:
+                with open(debug_token_file) as f:
+                    token = f.read().strip()
+            except FileNotFoundError:
+                pass
+        if not token:
+            token = secrets.token_urlsafe(24)
+            tmp = debug_token_file + '.tmp'
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(token + '\n')
+            os.replace(tmp, debug_token_file)
+            logger.info(f"Created a debug token in {os.path.abspath(debug_token_file)}")
+        debug_token = token
+    return debug_token
+
+
+def debug_authorized():
+    expected = get_debug_token()
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    token = token.strip()
+    return (scheme.lower() == 'bearer' and bool(token) and bool(expected)
+            and hmac.compare_digest(token.encode(), expected.encode()))
+
+
+@app.route('/api/debug/memory', methods=['GET'])
+def get_memory():
+    """
+    Where the memory goes: RSS, garbage collector, threads and buffer fill
+    levels, plus top allocators by line and subsystem while tracing is on.
+    Needs "Authorization: Bearer <debug token>".
+    """
+    if not debug_authorized():
+        return jsonify({'status': 'error', 'message': 'Send the debug token as a Bearer token'}), 401
+    try:
+        return jsonify(memory_profile.report(request.args.get('top', memory_profile.TOP)))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Bad memory query: {e}'})
+
+
+@app.route('/api/debug/memory', methods=['POST'])
+def trace_memory():
+    """Turn allocation tracing on or off; it costs memory and CPU while on."""
+    if not debug_authorized():
+        return jsonify({'status': 'error', 'message': 'Send the debug token as a Bearer token'}), 401
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('trace'), bool):
+        return jsonify({'status': 'error', 'message': 'Send {"trace": true} or {"trace": false}'})
+    if data['trace']:
+        memory_profile.start_tracing()
+    else:
+        memory_profile.stop_tracing()
+    return jsonify({'status': 'success', 'tracing': data['trace']})
+
+
+@app.route('/api/debug/profile')
+def get_profile():
+    """
+    Sample every thread for ?seconds= (10) and return collapsed stacks and
+    CPU per thread; ?format=collapsed gives just the stacks, ready for
+    flamegraph.pl. Needs "Authorization: Bearer <debug token>".
+    """
+    if not debug_authorized():
+        return jsonify({'status': 'error', 'message': 'Send the debug token as a Bearer token'}), 401
+    try:
+        result = profiler.profile(request.args.get('seconds', profiler.DEFAULT_SECONDS),
+                                  request.args.get('interval_ms', profiler.DEFAULT_INTERVAL_MS),
+                                  wall=request.args.get('mode') == 'wall')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Bad profile query: {e}'}), 400
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+    if request.args.get('format') == 'collapsed':
+        return Response('\n'.join(result['collapsed']) + '\n', mimetype='text/plain')
+    return jsonify(result)
+
+
+@app.route('/api/debug/recording', methods=['GET'])
+def get_recording():
+    """Whether status messages are being recorded, where to and how many so far."""
+    if not debug_authorized():
+        return jsonify({'status': 'error', 'message': 'Send the debug token as a Bearer token'}), 401
+    return jsonify(recording.recorder.status())
+
+
+@app.route('/api/debug/recording', methods=['POST'])
+def set_recording():
+    """Start or stop recording status messages to a new file under recordings/."""
+    if not debug_authorized():
+        return jsonify({'status': 'error', 'message': 'Send the debug token as a Bearer token'}), 401
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('record'), bool):
+        return jsonify({'status': 'error', 'message': 'Send {"record": true} or {"record": false}'})
+    if data['record']:
+        try:
+            recording.recorder.start()
+        except (OSError, RuntimeError) as e:
+            return jsonify({'status': 'error', 'message': str(e)})
+        return jsonify({'status': 'success', **recording.recorder.status()})
+    return jsonify({'status': 'success', **recording.recorder.stop()})
 
 
-def run_server(host='0.0.0.0', port=8080):
+def get_keywords():
+    """Keywords from the config, used when matching titles outside the rules."""
+    return config.snapshot.keywords
+
+
+def serve(host, port, production):
+    """
+    Serve with waitress when installed (and production is on), else Flask's
+    own server. Sets ready once the port is listening and returns after
+    shutdown().
+    """
+    global stop_serving
+    if production:
+        try:
+            import waitress
+            from waitress import wasyncore
+            import event_streams
+        except ImportError:
+            logger.warning("waitress is not installed; using Flask's development server")
+        else:
+            # One process: the monitor, event bus and caches live in it
+            server = waitress.create_server(app, host=host, port=port, threads=WEB_THREADS,
+                                            ident='chromecast-blocker')
+            if event_streams.supported():
+                event_streams.EventStreams(server, '/api/events', status_snapshot)
+            else:
+                logger.warning(f"Event streams were tested with waitress {event_streams.TESTED_WAITRESS}, "
+                               f"not {event_streams.waitress_version()}; each open page will hold a thread")
+            # Closing every socket from the server's own loop makes run() return
+            stop_serving = lambda: server.trigger.pull_trigger(
+                lambda: wasyncore.close_all(server._map))
+            ready.set()
+            server.run()
+            server.task_dispatcher.shutdown(timeout=lifecycle.SHUTDOWN_TIMEOUT)
+            return
+    from werkzeug.serving import make_server
+    server = make_server(host, port, app, threaded=True)
+    stop_serving = server.shutdown
+    ready.set()
+    server.serve_forever(poll_interval=0.1)
+    server.server_close()
+
+
+def shutdown():
+    """End every event stream and stop serving, so run_server() returns."""
+    event_bus.bus.close()
+    if stop_serving:
+        stop_serving()
+
+
+def run_server(host='0.0.0.0', port=8080, production=True):
     try:
         logger.info(f"Starting Flask web server on {host}:{port}")
         print(f"* Starting web server on {host}:{port}")
@@ -343,7 +733,9 @@ def run_server(host='0.0.0.0', port=8080):
         except Exception as e:
             logger.error(f"Could not determine local IP: {e}")
 
-        app.run(host=host, port=port, threaded=True)
+        # So the token is there to read before the first profile
+        get_debug_token()
+        serve(host, port, production)
     except Exception as e:
         logger.error(f"Error running server on port {port}: {e}")
         print(f"Error running server on port {port}: {e}")
@@ -354,7 +746,7 @@ def run_server(host='0.0.0.0', port=8080):
         print(f"Attempting to run on fallback port {fallback_port}...")
 
         try:
-            app.run(host=host, port=fallback_port, threaded=True)
+            serve(host, fallback_port, production)
         except Exception as e2:
             logger.error(
                 f"Error running server on fallback port {fallback_port}: {e2}")